@@ -28,6 +28,12 @@ grades_colors = (
     "#FF0000",
 )
 
+# The grade point of every grade in every point scale, used by `score_to_gpa()`.
+grade_points = {
+    5: (5.0, 4.75, 4.5, 4.0, 3.5, 3.0, 2.5, 2.0, 1.0),
+    4: (4.0, 3.75, 3.5, 3.0, 2.5, 2.0, 1.5, 1.0, 0.0),
+}
+
 
 class NotSupportedPointScaleError(ValueError):
     """Error to be raised when uncompatable point scale is passes to function."""
@@ -126,46 +132,9 @@ def get_score_from_grade(grade: int) -> int:
     return 0
 
 
-def score_to_gpa(point_scale: int, score: float) -> float:  # noqa: C901
+def score_to_gpa(point_scale: int, score: float) -> float:
     """Convert the score to GPA based on the points scale value."""
-    if point_scale == 5:
-        if 100 >= score >= 95:
-            return 5.0
-        if score >= 90:
-            return 4.75
-        if score >= 85:
-            return 4.5
-        if score >= 80:
-            return 4.0
-        if score >= 75:
-            return 3.5
-        if score >= 70:
-            return 3.0
-        if score >= 65:
-            return 2.5
-        if score >= 60:
-            return 2.0
-
-        return 1.0
+    if point_scale not in grade_points:
+        raise NotSupportedPointScaleError(point_scale)
 
-    if point_scale == 4:
-        if 100 >= score >= 95:
-            return 4.0
-        if score >= 90:
-            return 3.75
-        if score >= 85:
-            return 3.5
-        if score >= 80:
-            return 3.0
-        if score >= 75:
-            return 2.5
-        if score >= 70:
-            return 2.0
-        if score >= 65:
-            return 1.5
-        if score >= 60:
-            return 1.0
-
-        return 0
-
-    raise NotSupportedPointScaleError(point_scale)
+    return grade_points[point_scale][get_grade_from_score(score) - 1]
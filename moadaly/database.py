@@ -1,19 +1,43 @@
 """Deal with the database."""
 
 import json
+import re
 import sqlite3
-from dataclasses import asdict, dataclass
+from collections import abc
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from itertools import chain, groupby
+from operator import itemgetter
 from os import environ
 from pathlib import Path
-from time import time
-from typing import Optional
+from time import perf_counter, sleep, time
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    TextIO,
+    TypeVar,
+    Union,
+    cast,
+)
 from uuid import uuid4
 
-from . import __about__
+from . import __about__, common_conversions
+from .database_stats import DatabaseStats, get_environment_stats
 
+T = TypeVar("T")
 
-@dataclass
-class ProfileData:
+# The values SQLite stores, and passes to the functions used in the statements.
+SQLiteValue = Union[str, bytes, int, float, None]
+
+
+# The data classes are named tuples, so rows can be turned into them without
+# copying their values, and they don't need a __dict__ for every record.
+class ProfileData(NamedTuple):
     """Data class for profile data."""
 
     id: str
@@ -22,28 +46,1164 @@ class ProfileData:
     point_scale: int
 
 
-@dataclass
-class SemesterData:
+class SemesterData(NamedTuple):
     """Data class for semester data."""
 
     id: str
 
 
-@dataclass
-class CourseData:
+class CourseData(NamedTuple):
     """Data class for course data."""
 
+    id: str
+    # They are NULL until they are entered.
+    name: Optional[str]
+    score: Optional[float]
+    credit_units: Optional[int]
+
+
+class TotalsData(NamedTuple):
+    """Data class for the sum of points and credit units."""
+
+    points: float
+    credit_units: int
+
+
+class SemesterSummary(NamedTuple):
+    """Data class for the totals and the GPA of a semester."""
+
+    id: str
+    points: float
+    credit_units: int
+    gpa: float
+
+
+class ProfileSummary(NamedTuple):
+    """
+    Data class for the totals and the CGPA of a profile, with it's semesters.
+
+    The totals include the archived semesters, but `semesters` doesn't.
+    """
+
     id: str
     name: str
-    score: float
+    point_scale: int
+    points: float
+    credit_units: int
+    cgpa: float
+    semesters: tuple[SemesterSummary, ...]
+
+
+class ProfilesPage(NamedTuple):
+    """Data class for a page of the profiles, with the key of the next page."""
+
+    profiles: tuple[ProfileData, ...]
+    # The number of the profiles in all the pages.
+    total_count: int
+    # Pass it as `after` to read the next page, it's None for the last page.
+    next_page: Optional[tuple[float, str]]
+
+
+class CatalogCourseData(NamedTuple):
+    """Data class for a course name in the catalog, with it's usual credit units."""
+
+    name: str
+    credit_units: Optional[int]
+
+
+class CourseSearchResult(NamedTuple):
+    """Data class for a course found by it's name, with it's semester and profile."""
+
+    course: CourseData
+    semester_id: str
+    profile_id: str
+    profile_name: str
+    # Lower is more relevant, it's the bm25 rank of the full-text search.
+    rank: float
+
+
+class SemesterArchiveData(NamedTuple):
+    """Data class for the stored totals of an archived semester."""
+
+    # The ID of the semester before it was archived.
+    id: str
+    points: float
     credit_units: int
+    courses_count: int
+    # If it's courses were kept, so it can be restored as a semester.
+    restorable: bool
+
+
+class MaintenanceData(NamedTuple):
+    """Data class for the metrics of a database file, to know if it needs tidying."""
+
+    page_count: int
+    # The pages left empty by the deleted rows, they aren't returned to the disk.
+    freelist_count: int
+    # 0 is NONE, 1 is FULL and 2 is INCREMENTAL.
+    auto_vacuum: int
+    # If ANALYZE was ever run, so the query planner has statistics.
+    analyzed: bool
+
+
+class ExternalChanges(NamedTuple):
+    """Data class for the IDs of the rows changed by another connection."""
+
+    profiles: frozenset[str]
+    semesters: frozenset[str]
+    courses: frozenset[str]
+    semester_archives: frozenset[str] = frozenset()
+
+
+def fetch_rows(cur: sqlite3.Cursor, batch_size: int = 1000) -> Iterator[tuple]:
+    """Iterate over the rows of an executed cursor, fetching them in batches."""
+    cur.arraysize = batch_size
+    while rows := cur.fetchmany():
+        yield from rows
+
+
+def encode_id(value: SQLiteValue) -> SQLiteValue:
+    """Return a hex UUID as it's 16 bytes, any other ID is returned as it's."""
+    if isinstance(value, str) and len(value) == 32:
+        try:
+            key = bytes.fromhex(value)
+        except ValueError:
+            return value
+        # Only the lowercase hex can be decoded back to the same ID.
+        if key.hex() == value:
+            return key
+
+    return value
+
+
+def decode_id(value: SQLiteValue) -> SQLiteValue:
+    """Return the hex UUID of an ID stored as bytes."""
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def search_query(text: str) -> str:
+    """Return a full-text search query that finds the words starting like a text."""
+    # Every word is quoted, so the user input is never parsed as a query syntax.
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+def create_id_functions(con: sqlite3.Connection) -> None:
+    """Add the functions that convert the IDs in the SQL statements."""
+    # The IDs are passed and read as hex UUIDs, but stored as 16 bytes blobs.
+    con.create_function("encode_id", 1, encode_id, deterministic=True)
+    con.create_function("decode_id", 1, decode_id, deterministic=True)
+
+
+class NotSupportedSynchronousModeError(ValueError):
+    """Error to be raised when unknown SQLite synchronous mode is passed."""
+
+    def __init__(self, synchronous: str) -> None:
+        """Error initalization function."""
+        super().__init__(f"`{synchronous}` isn't a supported synchronous mode.")
+
+
+class NotSupportedCourseColumnError(ValueError):
+    """Error to be raised when queuing an update for unknown course column."""
+
+    def __init__(self, column: str) -> None:
+        """Error initalization function."""
+        super().__init__(f"`{column}` isn't an updatable course column.")
+
+
+class InvalidImportFileError(ValueError):
+    """Error to be raised when the imported file isn't a valid exported data."""
+
+    def __init__(self, reason: str) -> None:
+        """Error initalization function."""
+        super().__init__(f"The imported file isn't valid: {reason}")
+
+
+class NotSupportedDatabaseVersionError(RuntimeError):
+    """Error to be raised when the database was created by a newer version."""
+
+    def __init__(self, version: int) -> None:
+        """Error initalization function."""
+        super().__init__(
+            f"The database schema version `{version}` is newer than the supported"
+            f" version `{len(MIGRATIONS)}`.",
+        )
+
+
+def course_points_sql(course: str, point_scale: int) -> str:
+    """
+    Return an SQL expression of a course points, like `score_to_gpa()` * credits.
+
+    `course` is the name of the row in the SQL statement, e.g. `NEW` in triggers.
+    """
+    # The grade point of every grade, from the minimum score of the grade
+    # like `get_grade_from_score()`, the first grade is limited to 100.
+    grade_points = common_conversions.grade_points[point_scale]
+    score = f"IFNULL({course}.score, 0)"
+    minimum_scores = [
+        common_conversions.get_score_from_grade(grade)
+        for grade in range(1, len(grade_points))
+    ]
+
+    return (
+        f"(CASE WHEN {score} BETWEEN {minimum_scores[0]} AND 100"
+        f" THEN {grade_points[0]} "
+        + " ".join(
+            f"WHEN {score} >= {minimum_score} THEN {grade_point}"
+            for minimum_score, grade_point in zip(
+                minimum_scores[1:],
+                grade_points[1:-1],
+            )
+        )
+        + f" ELSE {grade_points[-1]} END * IFNULL({course}.credit_units, 0))"
+    )
+
+
+def totals_change_sql(course: str, sign: str) -> str:
+    """
+    Return SQL statements that add or subtract a course from it's totals.
+
+    When the courses are deleted with their semester, the semester is already gone,
+    so it's totals are subtracted from the profile before deleting it.
+    """
+    # Only constant names and expressions are formatted into the statements.
+    return "".join(
+        f"""UPDATE {table} SET
+                points_5 = points_5 {sign} {course_points_sql(course, 5)},
+                points_4 = points_4 {sign} {course_points_sql(course, 4)},
+                credit_units = credit_units {sign} IFNULL({course}.credit_units, 0)
+            WHERE {condition};"""
+        for table, condition in (
+            ("semester_totals", f"semester_id = {course}.parent_semester_id"),
+            (
+                "profile_totals",
+                f"""profile_id = (SELECT parent_profile_id
+                        FROM semesters WHERE id = {course}.parent_semester_id)""",  # noqa: S608
+            ),
+        )
+    )
+
+
+def log_change_sql(table: str, row: str, operation: str) -> str:
+    """Return the SQL to log the latest change of a row, for the changes export."""
+    # The row's old entry is replaced with a new version, so it's only logged once.
+    # REPLACE isn't used, since an upsert that fires the trigger would override it.
+    return f"""DELETE FROM change_log
+            WHERE table_name = '{table}' AND row_id = {row}.id;
+        INSERT INTO change_log (table_name, row_id, operation)
+            VALUES ('{table}', {row}.id, '{operation}');"""  # noqa: S608
+
+
+def catalog_change_sql(course: str, sign: str) -> str:
+    """Return SQL statements that count a course name in the catalog, or uncount it."""
+    if sign == "+":
+        return f"""INSERT INTO course_catalog (name, credit_units, uses)
+                SELECT {course}.name, {course}.credit_units, 1
+                    WHERE {course}.name != ''
+            ON CONFLICT (name) DO UPDATE SET
+                credit_units = IFNULL(excluded.credit_units, credit_units),
+                uses = uses + 1;"""
+
+    return f"""UPDATE course_catalog SET uses = uses - 1 WHERE name = {course}.name;
+        DELETE FROM course_catalog WHERE name = {course}.name AND uses < 1;"""  # noqa: S608
+
+
+# Keep the points and credit units totals of every semester and profile updated.
+TOTALS_TRIGGERS = f"""
+    CREATE TRIGGER profiles_totals_insert AFTER INSERT ON profiles BEGIN
+        INSERT OR IGNORE INTO profile_totals (profile_id) VALUES (NEW.id);
+    END;
+    CREATE TRIGGER semesters_totals_insert AFTER INSERT ON semesters BEGIN
+        INSERT OR IGNORE INTO semester_totals (semester_id) VALUES (NEW.id);
+    END;
+    CREATE TRIGGER semesters_totals_delete BEFORE DELETE ON semesters BEGIN
+        UPDATE profile_totals SET
+                (points_5, points_4, credit_units) = (
+                    SELECT profile_totals.points_5 - semester_totals.points_5,
+                        profile_totals.points_4 - semester_totals.points_4,
+                        profile_totals.credit_units - semester_totals.credit_units
+                    FROM semester_totals WHERE semester_totals.semester_id = OLD.id
+                )
+            WHERE profile_id = OLD.parent_profile_id
+                AND EXISTS (SELECT 1 FROM semester_totals WHERE semester_id = OLD.id);
+    END;
+    CREATE TRIGGER courses_totals_insert AFTER INSERT ON courses BEGIN
+        {totals_change_sql("NEW", "+")}
+    END;
+    CREATE TRIGGER courses_totals_delete AFTER DELETE ON courses BEGIN
+        {totals_change_sql("OLD", "-")}
+    END;
+    CREATE TRIGGER courses_totals_update
+        AFTER UPDATE OF score, credit_units, parent_semester_id ON courses BEGIN
+            {totals_change_sql("OLD", "-")}
+            {totals_change_sql("NEW", "+")}
+    END;"""  # noqa: S608
+
+# Log the latest change of every profile, semester and course.
+CHANGE_LOG_TRIGGERS = f"""
+    CREATE TRIGGER profiles_change_log_insert AFTER INSERT ON profiles BEGIN
+        {log_change_sql("profiles", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER profiles_change_log_update
+        AFTER UPDATE OF id, name, color, point_scale ON profiles BEGIN
+            {log_change_sql("profiles", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER profiles_change_log_delete AFTER DELETE ON profiles BEGIN
+        {log_change_sql("profiles", "OLD", "delete")}
+    END;
+    CREATE TRIGGER semesters_change_log_insert AFTER INSERT ON semesters BEGIN
+        {log_change_sql("semesters", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER semesters_change_log_update AFTER UPDATE ON semesters BEGIN
+        {log_change_sql("semesters", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER semesters_change_log_delete AFTER DELETE ON semesters BEGIN
+        {log_change_sql("semesters", "OLD", "delete")}
+    END;
+    CREATE TRIGGER courses_change_log_insert AFTER INSERT ON courses BEGIN
+        {log_change_sql("courses", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER courses_change_log_update AFTER UPDATE ON courses BEGIN
+        {log_change_sql("courses", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER courses_change_log_delete AFTER DELETE ON courses BEGIN
+        {log_change_sql("courses", "OLD", "delete")}
+    END;"""
+
+# Every item upgrades the database schema by one version.
+# Don't edit an applied migration, append a new one instead.
+MIGRATIONS: tuple[str, ...] = (
+    # 1: Create the tables.
+    # The last_selected_time let us know which profile was selected most recent.
+    """CREATE TABLE IF NOT EXISTS profiles
+            (id TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                color TEXT NOT NULL,
+                point_scale INTEGER,
+                last_selected_time INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS semesters
+            (id TEXT UNIQUE NOT NULL,
+                parent_profile_id TEXT NOT NULL,
+                FOREIGN KEY (parent_profile_id)
+                REFERENCES profiles (id)
+                    ON DELETE CASCADE);
+    CREATE TABLE IF NOT EXISTS courses
+            (id TEXT UNIQUE NOT NULL,
+                parent_semester_id TEXT NOT NULL,
+                name TEXT,
+                score REAL,
+                credit_units INTEGER,
+                FOREIGN KEY (parent_semester_id)
+                REFERENCES semesters (id)
+                    ON DELETE CASCADE);""",
+    # 2: Index the foreign keys, for the lookups and the cascading deletes,
+    # and the selection time, to find the current profile.
+    """CREATE INDEX IF NOT EXISTS semesters_parent_profile_id_index
+            ON semesters (parent_profile_id);
+    CREATE INDEX IF NOT EXISTS courses_parent_semester_id_index
+            ON courses (parent_semester_id);
+    CREATE INDEX IF NOT EXISTS profiles_last_selected_time_index
+            ON profiles (last_selected_time);""",
+    # 3: Keep the points and credit units totals of every semester and profile,
+    # for every point scale, updated by triggers when the courses are changed.
+    f"""CREATE TABLE semester_totals
+            (semester_id TEXT UNIQUE NOT NULL,
+                points_5 REAL NOT NULL DEFAULT 0,
+                points_4 REAL NOT NULL DEFAULT 0,
+                credit_units INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (semester_id)
+                REFERENCES semesters (id)
+                    ON DELETE CASCADE);
+    CREATE TABLE profile_totals
+            (profile_id TEXT UNIQUE NOT NULL,
+                points_5 REAL NOT NULL DEFAULT 0,
+                points_4 REAL NOT NULL DEFAULT 0,
+                credit_units INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (profile_id)
+                REFERENCES profiles (id)
+                    ON DELETE CASCADE);
+    INSERT INTO semester_totals
+        SELECT semesters.id,
+                IFNULL(SUM({course_points_sql("courses", 5)}), 0),
+                IFNULL(SUM({course_points_sql("courses", 4)}), 0),
+                IFNULL(SUM(courses.credit_units), 0)
+            FROM semesters
+                LEFT JOIN courses ON courses.parent_semester_id = semesters.id
+            GROUP BY semesters.id;
+    INSERT INTO profile_totals
+        SELECT profiles.id,
+                IFNULL(SUM(semester_totals.points_5), 0),
+                IFNULL(SUM(semester_totals.points_4), 0),
+                IFNULL(SUM(semester_totals.credit_units), 0)
+            FROM profiles
+                LEFT JOIN semesters ON semesters.parent_profile_id = profiles.id
+                LEFT JOIN semester_totals ON semester_totals.semester_id = semesters.id
+            GROUP BY profiles.id;{TOTALS_TRIGGERS}""",  # noqa: S608
+    # 4: Log the latest change of every row with an increasing version, so only the
+    # changes after a version can be exported, see `Database.export_changes()`.
+    f"""CREATE TABLE change_log
+            (version INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                UNIQUE (table_name, row_id));
+    INSERT INTO change_log (table_name, row_id, operation)
+        SELECT 'profiles', id, 'upsert' FROM profiles;
+    INSERT INTO change_log (table_name, row_id, operation)
+        SELECT 'semesters', id, 'upsert' FROM semesters;
+    INSERT INTO change_log (table_name, row_id, operation)
+        SELECT 'courses', id, 'upsert' FROM courses;{CHANGE_LOG_TRIGGERS}""",  # noqa: S608
+    # 5: Store the hex UUIDs as 16 bytes blobs, that halves the keys and makes
+    # comparing them faster, the queries convert them with `encode_id()` and
+    # `decode_id()`. The triggers are created again after changing the IDs, so they
+    # don't change the totals or the change log while changing them.
+    f"""DROP TRIGGER profiles_totals_insert;
+    DROP TRIGGER semesters_totals_insert;
+    DROP TRIGGER semesters_totals_delete;
+    DROP TRIGGER courses_totals_insert;
+    DROP TRIGGER courses_totals_delete;
+    DROP TRIGGER courses_totals_update;
+    DROP TRIGGER profiles_change_log_insert;
+    DROP TRIGGER profiles_change_log_update;
+    DROP TRIGGER profiles_change_log_delete;
+    DROP TRIGGER semesters_change_log_insert;
+    DROP TRIGGER semesters_change_log_update;
+    DROP TRIGGER semesters_change_log_delete;
+    DROP TRIGGER courses_change_log_insert;
+    DROP TRIGGER courses_change_log_update;
+    DROP TRIGGER courses_change_log_delete;
+    UPDATE profiles SET id = encode_id(id);
+    UPDATE semesters SET
+        id = encode_id(id),
+        parent_profile_id = encode_id(parent_profile_id);
+    UPDATE courses SET
+        id = encode_id(id),
+        parent_semester_id = encode_id(parent_semester_id);
+    UPDATE semester_totals SET semester_id = encode_id(semester_id);
+    UPDATE profile_totals SET profile_id = encode_id(profile_id);
+    UPDATE change_log SET row_id = encode_id(row_id);{TOTALS_TRIGGERS}
+    {CHANGE_LOG_TRIGGERS}""",  # noqa: S608
+    # 6: Index the courses names for the full-text search, the index reads the
+    # names from the courses table by their rowid, so they aren't stored twice.
+    # The prefix indexes make searching the first letters of a word fast.
+    """CREATE VIRTUAL TABLE courses_search USING fts5
+            (name,
+                content = 'courses',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3');
+    INSERT INTO courses_search (courses_search) VALUES ('rebuild');
+    CREATE TRIGGER courses_search_insert AFTER INSERT ON courses BEGIN
+        INSERT INTO courses_search (rowid, name) VALUES (NEW.rowid, NEW.name);
+    END;
+    CREATE TRIGGER courses_search_delete AFTER DELETE ON courses BEGIN
+        INSERT INTO courses_search (courses_search, rowid, name)
+            VALUES ('delete', OLD.rowid, OLD.name);
+    END;
+    CREATE TRIGGER courses_search_update AFTER UPDATE OF name ON courses BEGIN
+        INSERT INTO courses_search (courses_search, rowid, name)
+            VALUES ('delete', OLD.rowid, OLD.name);
+        INSERT INTO courses_search (rowid, name) VALUES (NEW.rowid, NEW.name);
+    END;""",
+    # 7: Keep the distinct courses names, ignoring the case, with the last credit
+    # units used with them, for suggesting them while typing a course name.
+    # A name is counted by it's courses, and it's dropped when no course has it,
+    # so the names typed letter by letter don't stay in the catalog.
+    f"""CREATE TABLE course_catalog
+            (name TEXT PRIMARY KEY COLLATE NOCASE,
+                credit_units INTEGER,
+                uses INTEGER NOT NULL)
+            WITHOUT ROWID;
+    INSERT INTO course_catalog (name, credit_units, uses)
+        SELECT name, credit_units, uses FROM (
+            SELECT name, credit_units, COUNT(*) AS uses, MAX(rowid)
+                FROM courses WHERE name != ''
+                GROUP BY name COLLATE NOCASE
+        );
+    CREATE TRIGGER courses_catalog_insert AFTER INSERT ON courses
+        WHEN NEW.name != '' BEGIN
+            {catalog_change_sql("NEW", "+")}
+    END;
+    CREATE TRIGGER courses_catalog_delete AFTER DELETE ON courses
+        WHEN OLD.name != '' BEGIN
+            {catalog_change_sql("OLD", "-")}
+    END;
+    CREATE TRIGGER courses_catalog_update_name AFTER UPDATE OF name ON courses
+        WHEN OLD.name IS NOT NEW.name BEGIN
+            {catalog_change_sql("OLD", "-")}
+            {catalog_change_sql("NEW", "+")}
+    END;
+    CREATE TRIGGER courses_catalog_update_credit_units
+        AFTER UPDATE OF credit_units ON courses
+        WHEN NEW.name != '' AND NEW.credit_units IS NOT NULL BEGIN
+            UPDATE course_catalog SET credit_units = NEW.credit_units
+                WHERE name = NEW.name;
+    END;""",  # noqa: S608
+    # 8: Order the profiles selected at the same time by their IDs, so a page of
+    # the profiles can start after any of them, see `Database.get_profiles_page()`.
+    """CREATE INDEX profiles_last_selected_time_id_index
+            ON profiles (last_selected_time, id);
+    DROP INDEX profiles_last_selected_time_index;""",
+    # 9: The archived semesters are only kept as their totals, and their courses
+    # are moved to a table that isn't read while loading a profile, or deleted.
+    # The archives totals are added to their profile totals, so it's CGPA doesn't
+    # change when it's semesters are archived, see `Database.archive_semesters()`.
+    f"""CREATE TABLE semester_archives
+            (id TEXT UNIQUE NOT NULL,
+                parent_profile_id TEXT NOT NULL,
+                points_5 REAL NOT NULL DEFAULT 0,
+                points_4 REAL NOT NULL DEFAULT 0,
+                credit_units INTEGER NOT NULL DEFAULT 0,
+                courses_count INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (parent_profile_id)
+                REFERENCES profiles (id)
+                    ON DELETE CASCADE);
+    CREATE INDEX semester_archives_parent_profile_id_index
+            ON semester_archives (parent_profile_id);
+    CREATE TABLE archived_courses
+            (id TEXT UNIQUE NOT NULL,
+                parent_archive_id TEXT NOT NULL,
+                name TEXT,
+                score REAL,
+                credit_units INTEGER,
+                FOREIGN KEY (parent_archive_id)
+                REFERENCES semester_archives (id)
+                    ON DELETE CASCADE);
+    CREATE INDEX archived_courses_parent_archive_id_index
+            ON archived_courses (parent_archive_id);
+    CREATE TRIGGER semester_archives_totals_insert
+        AFTER INSERT ON semester_archives BEGIN
+            UPDATE profile_totals SET
+                    points_5 = points_5 + NEW.points_5,
+                    points_4 = points_4 + NEW.points_4,
+                    credit_units = credit_units + NEW.credit_units
+                WHERE profile_id = NEW.parent_profile_id;
+    END;
+    CREATE TRIGGER semester_archives_totals_delete
+        AFTER DELETE ON semester_archives BEGIN
+            UPDATE profile_totals SET
+                    points_5 = points_5 - OLD.points_5,
+                    points_4 = points_4 - OLD.points_4,
+                    credit_units = credit_units - OLD.credit_units
+                WHERE profile_id = OLD.parent_profile_id;
+    END;
+    CREATE TRIGGER semester_archives_totals_update
+        AFTER UPDATE OF points_5, points_4, credit_units, parent_profile_id
+            ON semester_archives BEGIN
+            UPDATE profile_totals SET
+                    points_5 = points_5 - OLD.points_5,
+                    points_4 = points_4 - OLD.points_4,
+                    credit_units = credit_units - OLD.credit_units
+                WHERE profile_id = OLD.parent_profile_id;
+            UPDATE profile_totals SET
+                    points_5 = points_5 + NEW.points_5,
+                    points_4 = points_4 + NEW.points_4,
+                    credit_units = credit_units + NEW.credit_units
+                WHERE profile_id = NEW.parent_profile_id;
+    END;
+    CREATE TRIGGER semester_archives_change_log_insert
+        AFTER INSERT ON semester_archives BEGIN
+            {log_change_sql("semester_archives", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER semester_archives_change_log_update
+        AFTER UPDATE ON semester_archives BEGIN
+            {log_change_sql("semester_archives", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER semester_archives_change_log_delete
+        AFTER DELETE ON semester_archives BEGIN
+            {log_change_sql("semester_archives", "OLD", "delete")}
+    END;""",
+    # 10: Order the semesters and courses by their position, instead of their
+    # rowid, so they can be moved by changing only their position to a number
+    # between their new neighbors, see `Database.get_new_position()`. The rows
+    # inserted without a position are added after their siblings. The change
+    # log triggers are created again after setting the positions, so they don't
+    # log every row as changed.
+    f"""DROP TRIGGER semesters_change_log_update;
+    DROP TRIGGER courses_change_log_update;
+    ALTER TABLE semesters ADD COLUMN position REAL;
+    ALTER TABLE courses ADD COLUMN position REAL;
+    UPDATE semesters SET position = rowid;
+    UPDATE courses SET position = rowid;
+    CREATE INDEX semesters_parent_profile_id_position_index
+            ON semesters (parent_profile_id, position);
+    CREATE INDEX courses_parent_semester_id_position_index
+            ON courses (parent_semester_id, position);
+    DROP INDEX semesters_parent_profile_id_index;
+    DROP INDEX courses_parent_semester_id_index;
+    CREATE TRIGGER semesters_change_log_update AFTER UPDATE ON semesters BEGIN
+        {log_change_sql("semesters", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER courses_change_log_update AFTER UPDATE ON courses BEGIN
+        {log_change_sql("courses", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER semesters_position_insert AFTER INSERT ON semesters
+        WHEN NEW.position IS NULL BEGIN
+            UPDATE semesters SET position = (
+                SELECT IFNULL(MAX(position), 0) + 1 FROM semesters
+                    WHERE parent_profile_id = NEW.parent_profile_id
+            ) WHERE rowid = NEW.rowid;
+    END;
+    CREATE TRIGGER courses_position_insert AFTER INSERT ON courses
+        WHEN NEW.position IS NULL BEGIN
+            UPDATE courses SET position = (
+                SELECT IFNULL(MAX(position), 0) + 1 FROM courses
+                    WHERE parent_semester_id = NEW.parent_semester_id
+            ) WHERE rowid = NEW.rowid;
+    END;""",  # noqa: S608
+    # 11: Log the changes of the archived courses too, so the exported changes can
+    # restore the archived semesters. The kept courses are logged once.
+    f"""CREATE TRIGGER archived_courses_change_log_insert
+        AFTER INSERT ON archived_courses BEGIN
+            {log_change_sql("archived_courses", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER archived_courses_change_log_update
+        AFTER UPDATE ON archived_courses BEGIN
+            {log_change_sql("archived_courses", "NEW", "upsert")}
+    END;
+    CREATE TRIGGER archived_courses_change_log_delete
+        AFTER DELETE ON archived_courses BEGIN
+            {log_change_sql("archived_courses", "OLD", "delete")}
+    END;
+    UPDATE archived_courses SET name = name;""",  # noqa: S608
+)
+
+
+def is_lazy_json(value: object) -> bool:
+    """Check if a value to be encoded as json has any iterator in it."""
+    if isinstance(value, abc.Iterator):
+        return True
+    if isinstance(value, dict):
+        return any(is_lazy_json(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(is_lazy_json(item) for item in value)
+
+    return False
+
+
+def encode_json(value: object, indent: Optional[int], level: int = 0) -> str:
+    """Encode a value with the json module, indented to it's level in the document."""
+    return json.dumps(
+        value,
+        ensure_ascii=False,
+        indent=indent,
+        separators=(",", ": ") if indent is not None else (",", ":"),
+    ).replace("\n", "\n" + " " * (indent or 0) * level)
+
+
+def iter_json_array_entries(
+    value: Iterable,
+    indent: Optional[int],
+    level: int,
+    batch_size: int,
+) -> Iterator[Iterable[str]]:
+    """Iterate over the chunks of every item, or batch of items, in a json array."""
+    item_indentation = "" if indent is None else "\n" + " " * indent * (level + 1)
+    batch: list = []
+
+    for item in value:
+        is_lazy = is_lazy_json(item)
+
+        # Items without iterators are encoded in batches, since it's faster.
+        if not is_lazy:
+            batch.append(item)
+        if batch and (is_lazy or len(batch) >= batch_size):
+            # Remove the batch brackets, to have only the items.
+            yield (encode_json(batch, indent, level)[1:-1].rstrip(),)
+            batch = []
+
+        if is_lazy:
+            yield chain(
+                (item_indentation,),
+                iter_json_chunks(item, indent, level + 1, batch_size),
+            )
+
+    if batch:
+        yield (encode_json(batch, indent, level)[1:-1].rstrip(),)
+
+
+def iter_json_chunks(
+    value: object,
+    indent: Optional[int],
+    level: int = 0,
+    batch_size: int = 1000,
+) -> Iterator[str]:
+    """
+    Encode a value to json chunks, like `json.dumps()` with the same indentation.
+
+    Any iterator is encoded as an array while it's consumed, so big nested data can
+    be encoded without building them first. When `indent` is None the json is
+    compact, without any extra white space.
+    """
+    if not is_lazy_json(value):
+        yield encode_json(value, indent, level)
+        return
+
+    entries: Iterator[Iterable[str]]
+    if isinstance(value, dict):
+        opening, closing = "{", "}"
+        key_prefix = "" if indent is None else "\n" + " " * indent * (level + 1)
+        key_separator = ": " if indent is not None else ":"
+        entries = (
+            chain(
+                (key_prefix + encode_json(key, indent) + key_separator,),
+                iter_json_chunks(item, indent, level + 1, batch_size),
+            )
+            for key, item in value.items()
+        )
+    else:
+        opening, closing = "[", "]"
+        entries = iter_json_array_entries(
+            value,  # type: ignore[arg-type]
+            indent,
+            level,
+            batch_size,
+        )
+
+    is_empty = True
+    for entry in entries:
+        yield opening if is_empty else ","
+        is_empty = False
+        yield from entry
+
+    if is_empty:
+        yield opening + closing
+    else:
+        if indent is not None:
+            yield "\n" + " " * indent * level
+        yield closing
+
+
+def write_json_chunks(
+    file: TextIO,
+    chunks: Iterable[str],
+    chunk_size: int = 64 * 1024,
+) -> None:
+    """Write json chunks to a file, joining the small ones before writing."""
+    buffer: list[str] = []
+    buffer_size = 0
+
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffer_size += len(chunk)
+
+        if buffer_size >= chunk_size:
+            file.write("".join(buffer))
+            buffer.clear()
+            buffer_size = 0
+
+    file.write("".join(buffer))
+
+
+def iter_json_array(  # noqa: C901
+    file: TextIO,
+    chunk_size: int = 64 * 1024,
+) -> Iterator[Any]:
+    """
+    Parse the items of a json array from a file one by one.
+
+    Only the current item is held in memory, the file is read in chunks and more
+    chunks are read when an item doesn't fit in the buffer.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+
+    def read_more(size: int) -> bool:
+        """Add a chunk to the buffer, return False at the end of the file."""
+        nonlocal buffer
+        chunk = file.read(size)
+        buffer += chunk
+        return bool(chunk)
+
+    def next_character() -> str:
+        """Skip the white spaces, then return the next character or an empty one."""
+        nonlocal buffer
+        buffer = buffer.lstrip()
+        while not buffer and read_more(chunk_size):
+            buffer = buffer.lstrip()
+        return buffer[:1]
+
+    def decode_item() -> object:
+        """Decode the item at the start of the buffer and remove it."""
+        nonlocal buffer
+        read_size = chunk_size
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError as error:
+                if not read_more(read_size):
+                    raise InvalidImportFileError(str(error)) from error
+            else:
+                # A number at the end of the buffer may continue in the next chunk.
+                if end < len(buffer) or not read_more(read_size):
+                    buffer = buffer[end:]
+                    return item
+
+            # Double the read size, so big items are not parsed too many times.
+            read_size *= 2
+
+    if next_character() != "[":
+        reason = "a json array was expected."
+        raise InvalidImportFileError(reason)
+    buffer = buffer[1:]
+
+    if next_character() == "]":
+        return
+
+    while True:
+        yield decode_item()
+
+        separator = next_character()
+        if separator == "]":
+            return
+        if separator != ",":
+            reason = "a `,` or `]` was expected."
+            raise InvalidImportFileError(reason)
+
+        buffer = buffer[1:]
+        next_character()
+
+
+def get_backup_dir(database_file: Path) -> Path:
+    """Return the default directory of the database backups."""
+    return database_file.parent.joinpath("backups")
+
+
+def get_backups(database_file: Path, backup_dir: Optional[Path] = None) -> list[Path]:
+    """Return the backups of a database file, the newest first."""
+    backup_dir = Path(backup_dir) if backup_dir else get_backup_dir(database_file)
+
+    # The backups names end with their time, so they are sorted by name.
+    return sorted(
+        backup_dir.glob(f"{database_file.stem}-*.sqlite3"),
+        reverse=True,
+    )
+
+
+def get_new_backup_file(database_file: Path, backup_dir: Optional[Path] = None) -> Path:
+    """Return the path of a new backup of a database file, named by the time."""
+    backup_dir = Path(backup_dir) if backup_dir else get_backup_dir(database_file)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+
+    return backup_dir.joinpath(
+        f"{database_file.stem}-{datetime.now(tz=timezone.utc):%Y%m%dT%H%M%S%f}.sqlite3",
+    )
+
+
+def copy_database_file(
+    database_file: Path,
+    backup_file: Path,
+    *,
+    pages: int = 256,
+    sleep: float = 0.005,
+) -> None:
+    """
+    Copy a database to a file while it's being used.
+
+    Only `pages` pages are copied in every step, then the database is free for
+    `sleep` seconds, so a large database never blocks the writer for long.
+    """
+    # Copy to a partial file, so a failed copy never looks like a complete one.
+    partial_file = backup_file.with_suffix(".partial")
+
+    try:
+        with closing(sqlite3.connect(database_file)) as source, closing(
+            sqlite3.connect(partial_file),
+        ) as destination:
+            source.backup(destination, pages=pages, sleep=sleep)
+    except BaseException:
+        partial_file.unlink(missing_ok=True)
+        raise
+
+    partial_file.replace(backup_file)
+
+
+def backup_database(
+    database_file: Path,
+    backup_dir: Optional[Path] = None,
+    *,
+    keep: int = 5,
+    pages: int = 256,
+    sleep: float = 0.005,
+) -> Path:
+    """
+    Copy a database to a new backup file while it's being used, and return it.
+
+    The backup uses it's own connections, so it can run in any thread.
+    Only the newest `keep` backups are kept, see `copy_database_file` for the rest.
+    """
+    backup_dir = Path(backup_dir) if backup_dir else get_backup_dir(database_file)
+    backup_file = get_new_backup_file(database_file, backup_dir)
+    copy_database_file(database_file, backup_file, pages=pages, sleep=sleep)
+
+    for old_backup_file in get_backups(database_file, backup_dir)[keep:]:
+        old_backup_file.unlink()
+
+    return backup_file
+
+
+def restore_database_file(backup_file: Path, database_file: Path) -> None:
+    """
+    Copy a backup over a database, while other connections may be using it.
+
+    It's written by the backup API in one transaction of the database, instead of
+    replacing the file, so the other connections see the restored data and never
+    write to a replaced file.
+    """
+    # Don't create an empty backup when it's missing.
+    if not Path(backup_file).is_file():
+        raise FileNotFoundError(backup_file)
+
+    with closing(
+        sqlite3.connect(f"{Path(backup_file).resolve().as_uri()}?mode=ro", uri=True),
+    ) as source, closing(sqlite3.connect(database_file)) as destination:
+        source.backup(destination)
+
+
+def migrate_database_file(database_file: Path, migrations: tuple[str, ...]) -> None:
+    """Create a database file, or upgrade it's tables with the missing migrations."""
+    con = sqlite3.connect(database_file)
+    create_id_functions(con)
+    try:
+        # The user_version is the number of migrations applied to the database.
+        version = con.execute("PRAGMA user_version;").fetchone()[0]
+
+        if version == 0:
+            # It can only be set before the first table is created, then the empty
+            # pages can be returned to the disk without rebuilding the file.
+            con.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+
+        if version > len(migrations):
+            raise NotSupportedDatabaseVersionError(version)
+
+        for new_version, script in enumerate(migrations[version:], version + 1):
+            # Apply every migration with it's version number atomically.
+            con.executescript(
+                f"BEGIN; {script} PRAGMA user_version = {new_version}; COMMIT;",
+            )
+    finally:
+        # Closing without committing will rollback a failed migration.
+        con.close()
 
 
 class Database:
     """Manage the database."""
 
-    def __init__(self, database_file: Optional[Path] = None) -> None:
-        """Initialize some important variables."""
+    synchronous_modes = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+    # The schema migrations of the database file, and it's default name.
+    migrations: ClassVar[tuple[str, ...]] = MIGRATIONS
+    default_file_name: ClassVar[str] = "database.sqlite3"
+
+    # Statements used to write the queued course updates of every column.
+    course_update_statements: ClassVar[dict[str, str]] = {
+        "name": "UPDATE courses SET name = ? WHERE id = encode_id(?);",
+        "score": "UPDATE courses SET score = ? WHERE id = encode_id(?);",
+        "credit_units": "UPDATE courses SET credit_units = ? WHERE id = encode_id(?);",
+    }
+
+    # Add a course after the other courses of it's semester, the (course_id,
+    # parent_semester_id) parameters are numbered, so they're passed as a tuple.
+    course_insert_statement: ClassVar[str] = """INSERT INTO courses
+        (id, parent_semester_id, position)
+            VALUES (encode_id(?1), encode_id(?2), (
+                SELECT IFNULL(MAX(position), 0) + 1 FROM courses
+                    WHERE parent_semester_id = encode_id(?2)
+            ));"""
+
+    # The parent column of the tables ordered by their position.
+    position_parents: ClassVar[dict[str, str]] = {
+        "semesters": "parent_profile_id",
+        "courses": "parent_semester_id",
+    }
+
+    # The maintenance only runs when this connection changed this number of rows
+    # since the last run, or when the empty pages are more than these limits.
+    maintenance_min_changes: ClassVar[int] = 1000
+    vacuum_min_free_pages: ClassVar[int] = 64
+    vacuum_min_free_ratio: ClassVar[float] = 0.1
+    # The empty pages released at once, the time budget is checked between them.
+    vacuum_step_pages: ClassVar[int] = 64
+    # The rows of every index read by ANALYZE, so it's quick on any size.
+    analysis_limit: ClassVar[int] = 400
+    # The pages copied by VACUUM in a second on a slow disk. The files created
+    # before the incremental auto vacuum are only rebuilt by the maintenance when
+    # they fit it's time budget, the bigger ones by `compact_database()`.
+    rebuild_pages_per_second: ClassVar[int] = 5000
+
+    # Methods that aren't timed when instrumented, they only manage the connection.
+    uninstrumented_methods: ClassVar[frozenset[str]] = frozenset(
+        (
+            "get_connection",
+            "get_read_cursor",
+            "tune_connection",
+            "migrate_database",
+            "transaction",
+            "call_with_retry",
+        ),
+    )
+
+    # The columns of every table in the exported changes, the parents first.
+    change_columns: ClassVar[dict[str, tuple[str, ...]]] = {
+        "profiles": ("id", "name", "color", "point_scale"),
+        "semesters": ("id", "parent_profile_id", "position"),
+        "courses": (
+            "id",
+            "parent_semester_id",
+            "name",
+            "score",
+            "credit_units",
+            "position",
+        ),
+        "semester_archives": (
+            "id",
+            "parent_profile_id",
+            "points_5",
+            "points_4",
+            "credit_units",
+            "courses_count",
+        ),
+        "archived_courses": (
+            "id",
+            "parent_archive_id",
+            "name",
+            "score",
+            "credit_units",
+        ),
+    }
+
+    # Statements used to apply the exported changes of every table.
+    change_upsert_statements: ClassVar[dict[str, str]] = {
+        "profiles": """INSERT INTO profiles
+            (id, name, color, point_scale, last_selected_time)
+                VALUES (encode_id(:id), :name, :color, :point_scale, 0)
+            ON CONFLICT (id) DO UPDATE SET
+                name = excluded.name,
+                color = excluded.color,
+                point_scale = excluded.point_scale;""",
+        "semesters": """INSERT INTO semesters (id, parent_profile_id, position)
+                VALUES (encode_id(:id), encode_id(:parent_profile_id), :position)
+            ON CONFLICT (id) DO UPDATE SET
+                parent_profile_id = excluded.parent_profile_id,
+                position = excluded.position;""",
+        "courses": """INSERT INTO courses
+            (id, parent_semester_id, name, score, credit_units, position)
+                VALUES (
+                    encode_id(:id),
+                    encode_id(:parent_semester_id),
+                    :name,
+                    :score,
+                    :credit_units,
+                    :position
+                )
+            ON CONFLICT (id) DO UPDATE SET
+                parent_semester_id = excluded.parent_semester_id,
+                name = excluded.name,
+                score = excluded.score,
+                credit_units = excluded.credit_units,
+                position = excluded.position;""",
+        "semester_archives": """INSERT INTO semester_archives
+            (id, parent_profile_id, points_5, points_4, credit_units, courses_count)
+                VALUES (
+                    encode_id(:id),
+                    encode_id(:parent_profile_id),
+                    :points_5,
+                    :points_4,
+                    :credit_units,
+                    :courses_count
+                )
+            ON CONFLICT (id) DO UPDATE SET
+                parent_profile_id = excluded.parent_profile_id,
+                points_5 = excluded.points_5,
+                points_4 = excluded.points_4,
+                credit_units = excluded.credit_units,
+                courses_count = excluded.courses_count;""",
+        "archived_courses": """INSERT INTO archived_courses
+            (id, parent_archive_id, name, score, credit_units)
+                VALUES (
+                    encode_id(:id),
+                    encode_id(:parent_archive_id),
+                    :name,
+                    :score,
+                    :credit_units
+                )
+            ON CONFLICT (id) DO UPDATE SET
+                parent_archive_id = excluded.parent_archive_id,
+                name = excluded.name,
+                score = excluded.score,
+                credit_units = excluded.credit_units;""",
+    }
+
+    def __init__(
+        self,
+        database_file: Optional[Path] = None,
+        *,
+        persistent: bool = False,
+        synchronous: str = "NORMAL",
+        cache_size: int = -8000,
+        mmap_size: int = 0,
+        busy_timeout: int = 5000,
+        busy_retries: int = 3,
+        instrumented: bool = False,
+    ) -> None:
+        """
+        Initialize some important variables.
+
+        When `persistent` is enabled, one connection is kept open until `close()`,
+        the WAL journal is used and every change is only committed, so there is
+        no need to reconnect and wait for the disk on every small update.
+        `synchronous`, `cache_size` and `mmap_size` tune that connection.
+
+        When another connection is writing, a statement waits for `busy_timeout`
+        milliseconds, then `call_with_retry()` calls it's method `busy_retries` times.
+
+        When `instrumented` is enabled, or the `MOADALY_DATABASE_STATS` variable
+        has a file path, the calls and statements are recorded in `stats`.
+        """
+        if synchronous.upper() not in self.synchronous_modes:
+            raise NotSupportedSynchronousModeError(synchronous)
+
+        self.persistent = persistent
+        self.synchronous = synchronous.upper()
+        self.cache_size = int(cache_size)
+        self.mmap_size = int(mmap_size)
+        self.busy_timeout = int(busy_timeout)
+        self.busy_retries = busy_retries
+
+        # Course updates waiting to be written, only the last value of a column stay.
+        self.pending_course_updates: dict[
+            tuple[str, str],
+            Union[str, float, None],
+        ] = {}
+
+        # How many `transaction()` blocks are currently open.
+        self.transaction_depth = 0
+
+        # Profiles and courses read from the persistent connection, they are kept
+        # until they are changed by us, or by another connection to the database.
+        self.cache: dict[Union[str, tuple[str, str]], object] = {}
+        # The profile ID of every cached semester and course, to know what to drop.
+        self.cache_owners: dict[str, str] = {}
+        # The data version of every schema of the cached keys, they change when
+        # another connection commits, see `read_cache()`.
+        self.data_versions: dict[str, object] = {}
+
+        # The last change log version and data version seen by
+        # `get_external_changes()`, and our changes count at that time.
+        self.changes_version: Optional[int] = None
+        self.changes_data_version: object = None
+        self.changes_total_changes = 0
+
+        # Our changes count when the maintenance last run.
+        self.maintenance_total_changes = 0
+
+        # The stats of the instrumented databases, the shared stats are saved to
+        # the variable file at exit.
+        self.stats: Optional[DatabaseStats] = get_environment_stats()
+        if instrumented and not self.stats:
+            self.stats = DatabaseStats()
+        if self.stats:
+            self.instrument_methods(self.stats)
+
         if database_file:
             self.database_file = database_file
         else:
@@ -54,56 +1214,46 @@ class Database:
 
             self.database_file = xdg_data_home.joinpath(
                 __about__.APP_NAME,
-                "database.sqlite3",
+                self.default_file_name,
             )
 
         if not self.database_file.parent.exists():
             Path.mkdir(self.database_file.parent, parents=True)
 
-        if not self.database_file.exists():
-            self.create_database()
+        self.migrate_database()
 
-    def create_database(self) -> None:
-        """Create the database and it's tables."""
-        con = sqlite3.connect(self.database_file)
-        cur = con.cursor()
-        # The last_selected_time let us know which profile was selected most recent.
-        cur.execute(
-            """CREATE TABLE IF NOT EXISTS profiles
-                    (id TEXT UNIQUE NOT NULL,
-                        name TEXT NOT NULL,
-                        color TEXT NOT NULL,
-                        point_scale INTEGER,
-                        last_selected_time INTEGER NOT NULL);""",
-        )
-        cur.execute(
-            """CREATE TABLE IF NOT EXISTS semesters
-                    (id TEXT UNIQUE NOT NULL,
-                        parent_profile_id TEXT NOT NULL,
-                        FOREIGN KEY (parent_profile_id)
-                        REFERENCES profiles (id)
-                            ON DELETE CASCADE);""",
-        )
-        cur.execute(
-            """CREATE TABLE IF NOT EXISTS courses
-                    (id TEXT UNIQUE NOT NULL,
-                        parent_semester_id TEXT NOT NULL,
-                        name TEXT,
-                        score REAL,
-                        credit_units INTEGER,
-                        FOREIGN KEY (parent_semester_id)
-                        REFERENCES semesters (id)
-                            ON DELETE CASCADE);""",
-        )
-        con.close()
+    def instrument_methods(self, stats: DatabaseStats) -> None:
+        """Replace the public methods of this instance with methods timed by stats."""
+        for name in dir(type(self)):
+            if name.startswith("_") or name in self.uninstrumented_methods:
+                continue
+
+            method = getattr(self, name)
+            if callable(method) and not isinstance(method, type):
+                setattr(self, name, stats.wrap(name, method))
+
+    def migrate_database(self) -> None:
+        """Create the database, or upgrade it's tables to the latest schema."""
+        migrate_database_file(self.database_file, self.migrations)
 
     def get_connection(self) -> sqlite3.Connection:
         """Check if there was a connection, then create new one if there wasn't."""
         if not hasattr(self, "connection"):
             if Path.exists(self.database_file):
-                self.connection = sqlite3.connect(self.database_file)
+                if self.stats:
+                    self.connection = self.stats.connect(self.database_file)
+                else:
+                    self.connection = sqlite3.connect(self.database_file)
+                create_id_functions(self.connection)
                 # Enable the foreign keys.
                 self.connection.cursor().execute("PRAGMA foreign_keys = ON;")
+                # Wait for the other connections writing, instead of failing.
+                self.connection.cursor().execute(
+                    f"PRAGMA busy_timeout = {self.busy_timeout};",
+                )
+
+                if self.persistent:
+                    self.tune_connection()
             else:
                 err_msg = "The database file was deleted while the app is running."
                 raise RuntimeError(err_msg)
@@ -111,13 +1261,250 @@ class Database:
 
         return self.connection
 
+    def tune_connection(self) -> None:
+        """Apply the long-lived connection settings to the current connection."""
+        cur = self.connection.cursor()
+        # With WAL readers don't block the writer, and commits are just appends.
+        cur.execute("PRAGMA journal_mode = WAL;")
+        cur.execute(f"PRAGMA synchronous = {self.synchronous};")
+        cur.execute(f"PRAGMA cache_size = {self.cache_size};")
+        cur.execute(f"PRAGMA mmap_size = {self.mmap_size};")
+
+    def commit(self) -> None:
+        """Commit the pending changes without closing the connection."""
+        if hasattr(self, "connection"):
+            self.connection.commit()
+
     def close(self) -> None:
-        """Close the current database connection."""
+        """Write the queued updates, then close the current database connection."""
+        if self.pending_course_updates:
+            self.write_course_updates()
+
         if hasattr(self, "connection"):
             self.connection.commit()
             self.connection.close()
             del self.connection
 
+        # The data version is only comparable within the same connection.
+        self.clear_cache()
+        self.changes_version = None
+        self.maintenance_total_changes = 0
+
+    def release(self) -> None:
+        """Commit after a change, and only close the connection if not persistent."""
+        if self.transaction_depth:
+            # The transaction will be committed at the end of it's block.
+            return
+
+        if self.persistent:
+            self.commit()
+        else:
+            self.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Run the changes made inside the block in one transaction.
+
+        It's committed at the end of the block, or rolled back if an error is raised.
+        Nested blocks use savepoints, so they can be rolled back alone.
+        """
+        con = self.get_connection()
+        savepoint = f"transaction_{self.transaction_depth}"
+
+        if self.transaction_depth:
+            con.execute(f"SAVEPOINT {savepoint};")
+        elif not con.in_transaction:
+            # Take the write lock first, a read transaction can't wait to become a
+            # write transaction if another connection committed after it's reads.
+            con.execute("BEGIN IMMEDIATE;")
+
+        self.transaction_depth += 1
+        try:
+            yield con.cursor()
+        except BaseException:
+            self.transaction_depth -= 1
+            if self.transaction_depth:
+                con.execute(f"ROLLBACK TO {savepoint};")
+                con.execute(f"RELEASE {savepoint};")
+            else:
+                con.rollback()
+                self.release()
+            # The cache may have the rolled back changes.
+            self.clear_cache()
+            raise
+
+        self.transaction_depth -= 1
+        if self.transaction_depth:
+            con.execute(f"RELEASE {savepoint};")
+        else:
+            self.release()
+
+    def call_with_retry(
+        self,
+        function: Callable[..., T],
+        *args: Any,  # noqa: ANN401
+    ) -> T:
+        """
+        Call a function, and call it again while the database is locked.
+
+        Every statement already waited for `busy_timeout`, so the function is only
+        called again after it's changes are rolled back and a growing delay.
+        """
+        attempt = 0
+        while True:
+            try:
+                return function(*args)
+            except sqlite3.OperationalError as error:
+                if (
+                    "locked" not in str(error)
+                    or attempt >= self.busy_retries
+                    or self.transaction_depth
+                ):
+                    raise
+
+            if hasattr(self, "connection"):
+                self.connection.rollback()
+            sleep(0.05 * 2**attempt)
+            attempt += 1
+
+    def get_read_cursor(self) -> sqlite3.Cursor:
+        """Write the queued updates so they are read too, then return a cursor."""
+        self.flush_course_updates()
+
+        return self.get_connection().cursor()
+
+    def read_cache(
+        self,
+        key: Union[str, tuple[str, str]],
+        read: Callable[[], T],
+    ) -> T:
+        """
+        Return the cached value of a key, or read it then cache it if it's missing.
+
+        The cache is only used with a persistent connection, and the keys of a
+        schema are dropped when it's `PRAGMA data_version` changes, which means
+        another connection committed to it, see `get_cache_schema()`.
+        """
+        if not self.persistent:
+            return read()
+
+        schema = self.get_cache_schema(key)
+        # The queued updates drop the keys they change when they are written.
+        data_version = (
+            self.get_read_cursor()
+            .execute(f"PRAGMA {schema}.data_version;")
+            .fetchone()[0]
+        )
+        if data_version != self.data_versions.get(schema):
+            self.clear_cache(schema)
+            self.data_versions[schema] = data_version
+
+        if key not in self.cache:
+            self.cache[key] = read()
+
+        # Every key is always read by the same function.
+        return cast(T, self.cache[key])
+
+    def get_data_version(self) -> object:
+        """Return a value that changes when another connection commits."""
+        return self.get_connection().execute("PRAGMA data_version;").fetchone()[0]
+
+    def get_cache_schema(self, key: Union[str, tuple[str, str]]) -> str:  # noqa: ARG002
+        """Return the schema of the rows of a cached key, they are all in `main`."""
+        return "main"
+
+    def clear_cache(self, schema: Optional[str] = None) -> None:
+        """Drop all the cached profiles and courses, or only the keys of a schema."""
+        if schema is None:
+            self.cache.clear()
+            self.cache_owners.clear()
+            self.data_versions.clear()
+            return
+
+        for key in [key for key in self.cache if self.get_cache_schema(key) == schema]:
+            del self.cache[key]
+            if isinstance(key, tuple):
+                # The owners of the other cached courses are found again when
+                # they are changed, see `invalidate_courses_cache()`.
+                self.cache_owners.clear()
+        self.data_versions.pop(schema, None)
+
+    def invalidate_profiles_cache(self) -> None:
+        """Drop the cached profiles data after changing them."""
+        self.cache.pop("current_profile", None)
+        self.cache.pop("profiles", None)
+
+    def invalidate_courses_cache(self, *ids: str) -> None:
+        """Drop the cached courses of the profiles owning these semesters or courses."""
+        profiles_ids = {self.cache_owners.get(id_) for id_ in ids}
+
+        if None in profiles_ids:
+            # It's not cached, so we don't know it's profile, drop all the courses.
+            profiles_ids = {key[1] for key in self.cache if isinstance(key, tuple)}
+
+        for profile_id in filter(None, profiles_ids):
+            self.cache.pop(("courses", profile_id), None)
+
+    def get_external_changes(self) -> Optional[ExternalChanges]:
+        """
+        Return the rows changed by another connection since the last call.
+
+        It's cheap enough to be polled, only `PRAGMA data_version` is read until
+        another connection commits, then the change log entries after the last
+        seen version are read. The semesters of the changed courses are included.
+        Our changes are skipped, unless both connections changed the database
+        between two calls. The first call, and the first after reconnecting, only
+        remember the current version, and it always returns None when the
+        connection isn't persistent.
+        """
+        if not self.persistent:
+            return None
+
+        con = self.get_connection()
+        data_version = self.get_data_version()
+
+        if self.changes_version is None or data_version == self.changes_data_version:
+            if (
+                self.changes_version is None
+                or con.total_changes != self.changes_total_changes
+            ):
+                # Skip our changes, no one else committed since the last call.
+                self.changes_version = con.execute(
+                    "SELECT IFNULL(MAX(version), 0) FROM change_log;",
+                ).fetchone()[0]
+                self.changes_data_version = data_version
+                self.changes_total_changes = con.total_changes
+
+            return None
+
+        changes: dict[str, set[str]] = {table: set() for table in self.change_columns}
+        for version, table, row_id, semester_id in con.execute(
+            """SELECT change_log.version,
+                    change_log.table_name,
+                    decode_id(change_log.row_id),
+                    decode_id(courses.parent_semester_id)
+                FROM change_log
+                    LEFT JOIN courses ON change_log.table_name = 'courses'
+                        AND courses.id = change_log.row_id
+                WHERE change_log.version > ?;""",
+            (self.changes_version,),
+        ):
+            changes[table].add(row_id)
+            if semester_id:
+                changes["semesters"].add(semester_id)
+            self.changes_version = max(self.changes_version, version)
+
+        self.changes_data_version = data_version
+        self.changes_total_changes = con.total_changes
+
+        return ExternalChanges(
+            frozenset(changes["profiles"]),
+            frozenset(changes["semesters"]),
+            frozenset(changes["courses"]),
+            frozenset(changes["semester_archives"]),
+        )
+
     def create_new_profile(
         self,
         profile_id: str,
@@ -129,185 +1516,1538 @@ class Database:
         self.get_connection().cursor().execute(
             """INSERT INTO profiles
                 (id, name, color, point_scale, last_selected_time)
-                    VALUES (?, ?, ?, 5, ?);""",
+                    VALUES (encode_id(?), ?, ?, 5, ?);""",
             (profile_id, profile_name, profile_color, time()),
         )
-        self.close()
+        self.invalidate_profiles_cache()
+        self.release()
 
     def delete_profile(self, profile_id: str) -> None:
         """Delete a profile with all it's semesters and courses."""
         self.get_connection().cursor().execute(
-            "DELETE FROM profiles WHERE id = ?;",
+            "DELETE FROM profiles WHERE id = encode_id(?);",
             (profile_id,),
         )
-        self.close()
+        self.invalidate_profiles_cache()
+        self.cache.pop(("courses", profile_id), None)
+        self.release()
 
-    def get_current_profile_data(self) -> ProfileData:
-        """Return the current selected profile."""
-        try:
-            data = ProfileData(
-                *(
-                    self.get_connection()
-                    .cursor()
-                    .execute(
-                        """SELECT
-                            id, name, color, point_scale
-                                FROM profiles ORDER BY last_selected_time DESC;""",
-                    )
-                    .fetchone()
-                ),
+    def clone_profile(self, profile_id: str, profile_name: str) -> str:
+        """
+        Copy a profile with all it's semesters and courses, then return the new ID.
+
+        The archived semesters are copied with their kept courses. The rows are
+        copied by a few statements in one transaction, with new IDs, and the copy
+        is the current profile like the new created profiles.
+        """
+        new_profile_id = uuid4().hex
+
+        with self.transaction() as cur:
+            # The copy has the queued changes of the courses.
+            if self.pending_course_updates:
+                self.write_course_updates()
+
+            cur.execute(
+                """INSERT INTO profiles
+                    (id, name, color, point_scale, last_selected_time)
+                    SELECT encode_id(?), ?, color, point_scale, ?
+                        FROM profiles WHERE id = encode_id(?);""",
+                (new_profile_id, profile_name, time(), profile_id),
             )
-        except TypeError:
-            # When there is no profile in the database.
-            # TODO: Use Moadaly's logo color as default.
-            data = ProfileData(uuid4().hex, "default", "#000000", 5)
-            self.create_new_profile(data.id, data.name, data.color)
+            self.copy_profile_rows(cur, profile_id, new_profile_id)
+            self.invalidate_profiles_cache()
 
-        return data
+        return new_profile_id
 
-    def update_profile_selected_time(self, selected_profile_id: str) -> None:
+    def copy_profile_rows(
+        self,
+        cur: sqlite3.Cursor,
+        profile_id: str,
+        new_profile_id: str,
+        source_schema: str = "main",
+    ) -> None:
+        """Copy the semesters, courses and archives of a profile, with new IDs."""
+        # The new IDs are random 16 bytes, like the encoded UUIDs, and the courses
+        # find the IDs of their copied semesters in this table.
+        cur.execute(
+            """CREATE TEMP TABLE IF NOT EXISTS semesters_copies
+                (id BLOB PRIMARY KEY, new_id BLOB NOT NULL, position REAL);""",
+        )
+        cur.execute(
+            f"""INSERT INTO temp.semesters_copies (id, new_id, position)
+                SELECT id, randomblob(16), position FROM {source_schema}.semesters
+                    WHERE parent_profile_id = encode_id(?);""",  # noqa: S608
+            (profile_id,),
+        )
+        # The copies have the same positions, so they are in the same order.
+        cur.execute(
+            """INSERT INTO semesters (id, parent_profile_id, position)
+                SELECT new_id, encode_id(?), position FROM temp.semesters_copies;""",
+            (new_profile_id,),
+        )
+        cur.execute(
+            f"""INSERT INTO courses
+                (id, parent_semester_id, name, score, credit_units, position)
+                SELECT randomblob(16), semesters_copies.new_id,
+                        courses.name, courses.score, courses.credit_units,
+                        courses.position
+                    FROM {source_schema}.courses AS courses
+                        JOIN temp.semesters_copies
+                            ON semesters_copies.id = courses.parent_semester_id;""",  # noqa: S608
+        )
+        cur.execute("DELETE FROM temp.semesters_copies;")
+
+        # The archived semesters, with their kept courses.
+        cur.execute(
+            f"""INSERT INTO temp.semesters_copies (id, new_id)
+                SELECT id, randomblob(16) FROM {source_schema}.semester_archives
+                    WHERE parent_profile_id = encode_id(?);""",  # noqa: S608
+            (profile_id,),
+        )
+        cur.execute(
+            f"""INSERT INTO semester_archives
+                (id, parent_profile_id, points_5, points_4, credit_units, courses_count)
+                SELECT semesters_copies.new_id, encode_id(?),
+                        semester_archives.points_5, semester_archives.points_4,
+                        semester_archives.credit_units, semester_archives.courses_count
+                    FROM {source_schema}.semester_archives AS semester_archives
+                        JOIN temp.semesters_copies
+                            ON semesters_copies.id = semester_archives.id
+                    ORDER BY semester_archives.rowid;""",  # noqa: S608
+            (new_profile_id,),
+        )
+        cur.execute(
+            f"""INSERT INTO archived_courses
+                (id, parent_archive_id, name, score, credit_units)
+                SELECT randomblob(16), semesters_copies.new_id,
+                        archived_courses.name, archived_courses.score,
+                        archived_courses.credit_units
+                    FROM {source_schema}.archived_courses AS archived_courses
+                        JOIN temp.semesters_copies
+                            ON semesters_copies.id = archived_courses.parent_archive_id
+                    ORDER BY archived_courses.rowid;""",  # noqa: S608
+        )
+        cur.execute("DELETE FROM temp.semesters_copies;")
+
+    def get_current_profile_data(self) -> ProfileData:
+        """Return the current selected profile."""
+        try:
+            data = ProfileData(
+                *self.read_cache(
+                    "current_profile",
+                    lambda: self.get_connection()
+                    .cursor()
+                    .execute(
+                        """SELECT
+                            decode_id(id), name, color, point_scale
+                                FROM profiles
+                                ORDER BY last_selected_time DESC LIMIT 1;""",
+                    )
+                    .fetchone(),
+                ),
+            )
+        except TypeError:
+            # When there is no profile in the database.
+            # TODO: Use Moadaly's logo color as default.
+            data = ProfileData(uuid4().hex, "default", "#000000", 5)
+            self.create_new_profile(data.id, data.name, data.color)
+
+        return data
+
+    def update_profile_selected_time(self, selected_profile_id: str) -> None:
         """Update last_selected_time when selecting another profile."""
         self.get_connection().cursor().execute(
-            "UPDATE profiles SET last_selected_time = ? WHERE id = ?",
+            "UPDATE profiles SET last_selected_time = ? WHERE id = encode_id(?)",
             (time(), selected_profile_id),
         )
-        self.close()
+
+        # Move the selected profile to the top of the cached profiles,
+        # instead of reading them again just to reorder them.
+        profiles = cast(
+            Optional[tuple[ProfileData, ...]],
+            self.cache.pop("profiles", None),
+        )
+        self.cache.pop("current_profile", None)
+        selected = [
+            profile for profile in profiles or () if profile.id == selected_profile_id
+        ]
+        if profiles and selected:
+            self.cache["current_profile"] = selected[0]
+            self.cache["profiles"] = (
+                *selected,
+                *(profile for profile in profiles if profile.id != selected_profile_id),
+            )
+
+        self.release()
 
     def get_profiles_data(self) -> tuple[ProfileData, ...]:
         """Return a list with the profiles data from the database."""
-        self.get_connection().row_factory = lambda _cursor, row: ProfileData(*row)
-        return tuple(
+        return self.read_cache("profiles", self.read_profiles_data)
+
+    def read_profiles_data(self) -> tuple[ProfileData, ...]:
+        """Read the profiles data from the database without the cache."""
+        return tuple(self.iter_profiles_data())
+
+    def iter_profiles_data(self) -> Iterator[ProfileData]:
+        """Iterate over the profiles data lazily, without the cache."""
+        cur = self.get_connection().cursor()
+        cur.execute(
+            """SELECT decode_id(id), name, color, point_scale
+                    FROM profiles ORDER BY last_selected_time DESC;""",
+        )
+        return map(ProfileData._make, fetch_rows(cur))
+
+    def get_profiles_page(
+        self,
+        *,
+        name_prefix: str = "",
+        after: Optional[tuple[float, str]] = None,
+        limit: int = 50,
+    ) -> ProfilesPage:
+        """
+        Return a page of the profiles, the most recently selected first.
+
+        The page starts after the `next_page` key of the previous page, so it's
+        read from the index without skipping the previous pages. Only the profiles
+        with names starting with `name_prefix` are read, ignoring the case.
+        """
+        parameters: dict[str, object] = {"limit": limit + 1}
+        name_condition = "1"
+        if name_prefix:
+            # The LIKE wildcards in the prefix are matched as they are.
+            name_condition = "name LIKE :pattern ESCAPE '\\'"
+            parameters["pattern"] = re.sub(r"([\\%_])", r"\\\1", name_prefix) + "%"
+        page_condition = "1"
+        if after:
+            page_condition = "(last_selected_time, id) < (:time, encode_id(:id))"
+            parameters["time"], parameters["id"] = after
+
+        cur = self.get_connection().cursor()
+        # One more profile is read, to know if there is a next page.
+        rows = cur.execute(
+            f"""SELECT decode_id(id), name, color, point_scale, last_selected_time
+                    FROM profiles WHERE {name_condition} AND {page_condition}
+                    ORDER BY last_selected_time DESC, id DESC
+                    LIMIT :limit;""",  # noqa: S608
+            parameters,
+        ).fetchall()
+        # The profiles of the previous pages are counted too.
+        total_count = cur.execute(
+            f"SELECT COUNT(*) FROM profiles WHERE {name_condition};",  # noqa: S608
+            parameters,
+        ).fetchone()[0]
+
+        return ProfilesPage(
+            tuple(ProfileData._make(row[:4]) for row in rows[:limit]),
+            total_count,
+            (rows[limit - 1][4], rows[limit - 1][0]) if len(rows) > limit else None,
+        )
+
+    def get_profile_totals(self, profile_id: str) -> TotalsData:
+        """Return the points and credit units of a profile, with it's point scale."""
+        return TotalsData(
+            *self.get_connection()
+            .cursor()
+            .execute(
+                """SELECT
+                    CASE profiles.point_scale
+                        WHEN 4 THEN profile_totals.points_4
+                        ELSE profile_totals.points_5
+                    END,
+                    profile_totals.credit_units
+                        FROM profile_totals
+                            JOIN profiles ON profiles.id = profile_totals.profile_id
+                        WHERE profile_totals.profile_id = encode_id(?);""",
+                (profile_id,),
+            )
+            .fetchone()
+            or (0.0, 0),
+        )
+
+    def get_semester_totals(self, semester_id: str, point_scale: int) -> TotalsData:
+        """Return the points and credit units of a semester, with a point scale."""
+        return TotalsData(
+            *self.get_connection()
+            .cursor()
+            .execute(
+                """SELECT
+                    CASE ? WHEN 4 THEN points_4 ELSE points_5 END, credit_units
+                        FROM semester_totals WHERE semester_id = encode_id(?);""",
+                (point_scale, semester_id),
+            )
+            .fetchone()
+            or (0.0, 0),
+        )
+
+    def get_profiles_cgpa(self) -> dict[str, float]:
+        """Return the CGPA of every profile, from the profiles totals."""
+        return dict(
             self.get_connection()
             .cursor()
             .execute(
-                """SELECT id, name, color, point_scale
-                        FROM profiles ORDER BY last_selected_time DESC;""",
+                """SELECT decode_id(profiles.id),
+                    IFNULL(
+                        CASE profiles.point_scale
+                            WHEN 4 THEN profile_totals.points_4
+                            ELSE profile_totals.points_5
+                        END / NULLIF(profile_totals.credit_units, 0),
+                        0.0
+                    )
+                        FROM profiles
+                            JOIN profile_totals
+                                ON profile_totals.profile_id = profiles.id;""",
             )
             .fetchall(),
         )
 
+    def iter_profile_summaries(
+        self,
+        profile_id: Optional[str] = None,
+    ) -> Iterator[ProfileSummary]:
+        """
+        Iterate over the totals of every profile and it's semesters lazily.
+
+        They are read from the totals tables in one query, so no course is read.
+        Only the summary of `profile_id` is read when it's passed.
+        """
+        cur = self.get_read_cursor()
+        # Every row is a profile with one of it's semesters, they are NULL for a
+        # profile without semesters, since the LEFT JOIN still returns the profile.
+        cur.execute(
+            f"""SELECT decode_id(profiles.id), profiles.name, profiles.point_scale,
+                    CASE profiles.point_scale
+                        WHEN 4 THEN profile_totals.points_4
+                        ELSE profile_totals.points_5
+                    END,
+                    profile_totals.credit_units,
+                    decode_id(semesters.id),
+                    CASE profiles.point_scale
+                        WHEN 4 THEN semester_totals.points_4
+                        ELSE semester_totals.points_5
+                    END,
+                    semester_totals.credit_units
+                FROM profiles
+                    JOIN profile_totals ON profile_totals.profile_id = profiles.id
+                    LEFT JOIN semesters ON semesters.parent_profile_id = profiles.id
+                    LEFT JOIN semester_totals
+                        ON semester_totals.semester_id = semesters.id
+                {"WHERE profiles.id = encode_id(?)" if profile_id else ""}
+                ORDER BY profiles.last_selected_time DESC,
+                    profiles.rowid, semesters.position, semesters.rowid;""",  # noqa: S608
+            (profile_id,) if profile_id else (),
+        )
+
+        # Rows are ordered by profile, so they can be grouped in a single pass.
+        for _, group in groupby(fetch_rows(cur), key=itemgetter(0)):
+            rows = tuple(group)
+            profile_id, name, point_scale, points, credit_units = rows[0][:5]
+            yield ProfileSummary(
+                profile_id,
+                name,
+                point_scale,
+                points,
+                credit_units,
+                points / credit_units if credit_units else 0.0,
+                tuple(
+                    SemesterSummary(
+                        row[5],
+                        row[6],
+                        row[7],
+                        row[6] / row[7] if row[7] else 0.0,
+                    )
+                    for row in rows
+                    if row[5] is not None
+                ),
+            )
+
+    def search_courses(
+        self,
+        text: str,
+        limit: int = 20,
+    ) -> tuple[CourseSearchResult, ...]:
+        """
+        Find the courses of every profile that have words starting like the text.
+
+        The full-text index returns the most relevant courses first, so only the
+        `limit` best of them are read, however many courses are found.
+        """
+        query = search_query(text)
+        if not query:
+            return ()
+
+        return tuple(
+            CourseSearchResult(CourseData._make(row[:4]), *row[4:])
+            for row in self.get_read_cursor().execute(
+                """SELECT decode_id(courses.id),
+                        courses.name, courses.score, courses.credit_units,
+                        decode_id(semesters.id),
+                        decode_id(profiles.id),
+                        profiles.name,
+                        hits.rank
+                    FROM (SELECT rowid, rank FROM courses_search
+                            WHERE courses_search MATCH ?
+                            ORDER BY rank LIMIT ?) AS hits
+                        JOIN courses ON courses.rowid = hits.rowid
+                        JOIN semesters ON semesters.id = courses.parent_semester_id
+                        JOIN profiles ON profiles.id = semesters.parent_profile_id
+                    ORDER BY hits.rank;""",
+                (query, limit),
+            )
+        )
+
+    def search_course_catalog(
+        self,
+        prefix: str,
+        limit: int = 10,
+    ) -> tuple[CatalogCourseData, ...]:
+        """
+        Return the catalog courses names starting with a prefix, ignoring the case.
+
+        Only the first `limit` names of the catalog index range are read, however
+        many names start with the prefix.
+        """
+        if not prefix:
+            return ()
+
+        return tuple(
+            map(
+                CatalogCourseData._make,
+                self.get_connection()
+                .cursor()
+                .execute(
+                    # The range has every name starting with the prefix, since the
+                    # last unicode character is after any next character.
+                    """SELECT name, credit_units FROM course_catalog
+                        WHERE name >= :prefix AND name < :prefix || char(1114111)
+                        ORDER BY name LIMIT :limit;""",
+                    {"prefix": prefix, "limit": limit},
+                ),
+            ),
+        )
+
+    def get_profile_summary(self, profile_id: str) -> Optional[ProfileSummary]:
+        """Return the totals of a profile and it's semesters, without it's courses."""
+        return next(self.iter_profile_summaries(profile_id), None)
+
+    def get_all_profile_summaries(self) -> tuple[ProfileSummary, ...]:
+        """Return the totals of every profile and it's semesters, in one query."""
+        return tuple(self.iter_profile_summaries())
+
     def create_new_semester(self, semester_id: str, parent_profile_id: str) -> None:
-        """Add new semester in the semesters table."""
+        """Add new semester in the semesters table, after the other semesters."""
         self.get_connection().cursor().execute(
-            """INSERT INTO semesters (id, parent_profile_id) VALUES (?, ?);""",
-            (semester_id, parent_profile_id),
+            """INSERT INTO semesters (id, parent_profile_id, position)
+                    VALUES (encode_id(:id), encode_id(:parent_id), (
+                        SELECT IFNULL(MAX(position), 0) + 1 FROM semesters
+                            WHERE parent_profile_id = encode_id(:parent_id)
+                    ));""",
+            {"id": semester_id, "parent_id": parent_profile_id},
         )
-        self.close()
+        self.cache.pop(("courses", parent_profile_id), None)
+        self.release()
 
     def delete_semester(self, semester_id: str) -> None:
         """Delete a semester and it's courses from the semesters table."""
         self.get_connection().cursor().execute(
-            """DELETE FROM semesters WHERE id = ?;""",
+            """DELETE FROM semesters WHERE id = encode_id(?);""",
             (semester_id,),
         )
-        self.close()
+        self.invalidate_courses_cache(semester_id)
+        self.release()
+
+    def move_semester(
+        self,
+        semester_id: str,
+        before_semester_id: Optional[str] = None,
+    ) -> None:
+        """Move a semester before another one, or after the last one by default."""
+        with self.transaction() as cur:
+            (profile_id,) = cur.execute(
+                """SELECT decode_id(parent_profile_id)
+                    FROM semesters WHERE id = encode_id(?);""",
+                (semester_id,),
+            ).fetchone() or (None,)
+            if profile_id is None:
+                return
+
+            cur.execute(
+                "UPDATE semesters SET position = ? WHERE id = encode_id(?);",
+                (
+                    self.get_new_position(
+                        cur,
+                        "semesters",
+                        profile_id,
+                        semester_id,
+                        before_semester_id,
+                    ),
+                    semester_id,
+                ),
+            )
+            self.invalidate_courses_cache(semester_id)
+
+    def move_course(
+        self,
+        course_id: str,
+        parent_semester_id: str,
+        before_course_id: Optional[str] = None,
+    ) -> None:
+        """Move a course before another one of a semester, or after the last one."""
+        # The queued changes of the course are kept, they are written by it's ID.
+        with self.transaction() as cur:
+            # Moving it to another semester moves it's totals by their trigger, it's
+            # only fired when the course is moved to another semester.
+            cur.execute(
+                """UPDATE courses SET parent_semester_id = encode_id(:parent_id)
+                    WHERE id = encode_id(:id)
+                        AND parent_semester_id != encode_id(:parent_id);""",
+                {"id": course_id, "parent_id": parent_semester_id},
+            )
+            cur.execute(
+                "UPDATE courses SET position = ? WHERE id = encode_id(?);",
+                (
+                    self.get_new_position(
+                        cur,
+                        "courses",
+                        parent_semester_id,
+                        course_id,
+                        before_course_id,
+                    ),
+                    course_id,
+                ),
+            )
+            self.invalidate_courses_cache(course_id, parent_semester_id)
+
+    def get_new_position(
+        self,
+        cur: sqlite3.Cursor,
+        table: str,
+        parent_id: str,
+        row_id: str,
+        before_id: Optional[str],
+    ) -> float:
+        """
+        Return the position of a row moved before another row of the same parent.
+
+        It's between the positions of that row and the row before it, so only the
+        moved row is changed. When the numbers between them are used up, their
+        siblings are numbered again first. It's after the last row when `before_id`
+        is None, or isn't a row of that parent.
+        """
+        parent_column = self.position_parents[table]
+        parameters = {"parent_id": parent_id, "id": row_id, "before_id": before_id}
+
+        # The table and column names are constants from `position_parents`.
+        (before, previous, last) = cur.execute(
+            f"""SELECT before.position,
+                    (SELECT MAX(position) FROM {table}
+                        WHERE {parent_column} = encode_id(:parent_id)
+                            AND position < before.position
+                            AND id != encode_id(:id)),
+                    (SELECT MAX(position) FROM {table}
+                        WHERE {parent_column} = encode_id(:parent_id)
+                            AND id != encode_id(:id))
+                FROM (SELECT NULL) LEFT JOIN {table} AS before
+                    ON before.id = encode_id(:before_id)
+                        AND before.{parent_column} = encode_id(:parent_id)
+                        AND before.id != encode_id(:id);""",  # noqa: S608
+            parameters,
+        ).fetchone()
+
+        if before is None:
+            return (last or 0) + 1
+        if previous is None:
+            return before - 1
+
+        position = (previous + before) / 2
+        if previous < position < before:
+            return position
+
+        cur.execute(
+            f"""UPDATE {table} SET position = numbered.number
+                FROM (
+                    SELECT rowid AS row,
+                            ROW_NUMBER() OVER (ORDER BY position, rowid) AS number
+                        FROM {table} WHERE {parent_column} = encode_id(?)
+                ) AS numbered
+                WHERE {table}.rowid = numbered.row;""",  # noqa: S608
+            (parent_id,),
+        )
+
+        return self.get_new_position(cur, table, parent_id, row_id, before_id)
+
+    def archive_semesters(
+        self,
+        semesters_ids: Iterable[str],
+        *,
+        keep_courses: bool = True,
+    ) -> None:
+        """
+        Replace semesters with their stored totals, in one transaction.
+
+        The courses are moved to the archived courses when `keep_courses` is
+        enabled, so the semesters can be restored by `restore_semester_archives()`,
+        otherwise only their count is kept.
+        """
+        semesters_ids = list(semesters_ids)
+        ids_json = json.dumps(semesters_ids)
+
+        with self.transaction() as cur:
+            # The archived totals have the queued changes of the courses.
+            if self.pending_course_updates:
+                self.write_course_updates()
+
+            cur.execute(
+                """INSERT INTO semester_archives
+                    (id, parent_profile_id,
+                        points_5, points_4, credit_units, courses_count)
+                    SELECT semesters.id, semesters.parent_profile_id,
+                            semester_totals.points_5,
+                            semester_totals.points_4,
+                            semester_totals.credit_units,
+                            (SELECT COUNT(*) FROM courses
+                                WHERE parent_semester_id = semesters.id)
+                        FROM semesters
+                            JOIN semester_totals
+                                ON semester_totals.semester_id = semesters.id
+                        WHERE semesters.id IN (
+                            SELECT encode_id(value) FROM json_each(?)
+                        )
+                        ORDER BY semesters.position;""",
+                (ids_json,),
+            )
+            if keep_courses:
+                # The archived courses are kept in the order of their positions,
+                # then they are added after each other when they're restored.
+                cur.execute(
+                    """INSERT INTO archived_courses
+                        (id, parent_archive_id, name, score, credit_units)
+                        SELECT id, parent_semester_id, name, score, credit_units
+                            FROM courses
+                            WHERE parent_semester_id IN (
+                                SELECT encode_id(value) FROM json_each(?)
+                            )
+                            ORDER BY parent_semester_id, position;""",
+                    (ids_json,),
+                )
+            # Their totals are subtracted from their profiles, after the archives
+            # totals were added, so the profiles totals don't change.
+            cur.execute(
+                """DELETE FROM semesters WHERE id IN (
+                    SELECT encode_id(value) FROM json_each(?)
+                );""",
+                (ids_json,),
+            )
+            self.invalidate_courses_cache(*semesters_ids)
+
+    def restore_semester_archives(self, semesters_ids: Iterable[str]) -> None:
+        """Restore archived semesters with their kept courses, in one transaction."""
+        semesters_ids = list(semesters_ids)
+        ids_json = json.dumps(semesters_ids)
+
+        with self.transaction() as cur:
+            # Only the archives that all their courses were kept are restored.
+            cur.execute(
+                """CREATE TEMP TABLE IF NOT EXISTS restored_archives
+                    (id BLOB PRIMARY KEY, parent_profile_id BLOB NOT NULL);""",
+            )
+            cur.execute(
+                """INSERT INTO temp.restored_archives (id, parent_profile_id)
+                    SELECT id, parent_profile_id FROM semester_archives
+                        WHERE id IN (SELECT encode_id(value) FROM json_each(?))
+                            AND courses_count = (
+                                SELECT COUNT(*) FROM archived_courses
+                                    WHERE parent_archive_id = semester_archives.id
+                            )
+                        ORDER BY rowid;""",
+                (ids_json,),
+            )
+            cur.execute(
+                """INSERT INTO semesters (id, parent_profile_id)
+                    SELECT id, parent_profile_id FROM temp.restored_archives
+                        ORDER BY rowid;""",
+            )
+            cur.execute(
+                """INSERT INTO courses
+                    (id, parent_semester_id, name, score, credit_units)
+                    SELECT archived_courses.id, archived_courses.parent_archive_id,
+                            archived_courses.name,
+                            archived_courses.score,
+                            archived_courses.credit_units
+                        FROM temp.restored_archives
+                            JOIN archived_courses
+                                ON archived_courses.parent_archive_id
+                                    = restored_archives.id
+                        ORDER BY archived_courses.rowid;""",
+            )
+            # Their totals are subtracted from their profiles after the courses
+            # totals were added, and their archived courses are deleted with them.
+            cur.execute(
+                """DELETE FROM semester_archives
+                    WHERE id IN (SELECT id FROM temp.restored_archives);""",
+            )
+            cur.execute("DELETE FROM temp.restored_archives;")
+            self.invalidate_courses_cache(*semesters_ids)
+
+    def iter_semester_archives_items(self, profile_id: str) -> Iterator[dict]:
+        """Iterate over the archived semesters of a profile as exported items."""
+        cur = self.get_connection().cursor()
+        # The archived courses columns are NULL for an archive without courses.
+        cur.execute(
+            """SELECT decode_id(semester_archives.id),
+                    semester_archives.points_5,
+                    semester_archives.points_4,
+                    semester_archives.credit_units,
+                    semester_archives.courses_count,
+                    decode_id(archived_courses.id),
+                    archived_courses.name,
+                    archived_courses.score,
+                    archived_courses.credit_units
+                FROM semester_archives
+                    LEFT JOIN archived_courses
+                        ON archived_courses.parent_archive_id = semester_archives.id
+                WHERE semester_archives.parent_profile_id = encode_id(?)
+                ORDER BY semester_archives.rowid, archived_courses.rowid;""",
+            (profile_id,),
+        )
+
+        for archive, rows in groupby(fetch_rows(cur), key=itemgetter(0, 1, 2, 3, 4)):
+            yield {
+                "id": archive[0],
+                "points_5": archive[1],
+                "points_4": archive[2],
+                "credit_units": archive[3],
+                "courses_count": archive[4],
+                "courses": (
+                    CourseData._make(row[5:])._asdict()
+                    for row in rows
+                    if row[5] is not None
+                ),
+            }
+
+    def get_semester_archives(self, profile_id: str) -> tuple[SemesterArchiveData, ...]:
+        """Return the archived semesters of a profile, with it's point scale."""
+        return tuple(self.iter_semester_archives(profile_id))
+
+    def iter_semester_archives(
+        self,
+        profile_id: str,
+    ) -> Iterator[SemesterArchiveData]:
+        """Iterate over the archived semesters of a profile lazily."""
+        cur = self.get_connection().cursor()
+        cur.execute(
+            """SELECT decode_id(semester_archives.id),
+                    CASE profiles.point_scale
+                        WHEN 4 THEN semester_archives.points_4
+                        ELSE semester_archives.points_5
+                    END,
+                    semester_archives.credit_units,
+                    semester_archives.courses_count,
+                    semester_archives.courses_count = (
+                        SELECT COUNT(*) FROM archived_courses
+                            WHERE parent_archive_id = semester_archives.id
+                    )
+                FROM semester_archives
+                    JOIN profiles ON profiles.id = semester_archives.parent_profile_id
+                WHERE semester_archives.parent_profile_id = encode_id(?)
+                ORDER BY semester_archives.rowid;""",
+            (profile_id,),
+        )
+
+        return (
+            SemesterArchiveData(row[0], row[1], row[2], row[3], bool(row[4]))
+            for row in fetch_rows(cur)
+        )
 
     def create_new_course(self, course_id: str, parent_semester_id: str) -> None:
-        """Add new course in the courses table."""
+        """Add new course in the courses table, after the other semester courses."""
         self.get_connection().cursor().execute(
-            """INSERT INTO courses (id, parent_semester_id) VALUES (?, ?);""",
+            self.course_insert_statement,
             (course_id, parent_semester_id),
         )
-        self.close()
+        self.invalidate_courses_cache(parent_semester_id)
+        self.release()
 
     def delete_course(self, course_id: str) -> None:
         """Delete a course from the courses table."""
         self.get_connection().cursor().execute(
-            """DELETE FROM courses WHERE id = ?;""",
+            """DELETE FROM courses WHERE id = encode_id(?);""",
             (course_id,),
         )
-        self.close()
+        self.invalidate_courses_cache(course_id)
+        self.release()
 
-    def get_courses_data(self, profile_id: str) -> dict[str, tuple[CourseData, ...]]:
-        """Get courses data from a profile id."""
-        self.get_connection().row_factory = lambda _cursor, row: SemesterData(*row)
-        semesters = tuple(
-            self.get_connection()
-            .cursor()
-            .execute(
-                """SELECT id FROM semesters WHERE parent_profile_id = ?;""",
-                (profile_id,),
-            )
-            .fetchall(),
+    def create_new_courses(self, courses: Iterable[tuple[str, str]]) -> None:
+        """Add many courses, from (course_id, parent_semester_id) pairs."""
+        courses = list(courses)
+        self.get_connection().cursor().executemany(
+            self.course_insert_statement,
+            courses,
         )
+        self.invalidate_courses_cache(*(semester_id for _, semester_id in courses))
+        self.release()
 
-        # TODO: Figure a way to do the same thing with only one query.
+    def delete_courses(self, courses_ids: Iterable[str]) -> None:
+        """Delete many courses from the courses table."""
+        courses_ids = list(courses_ids)
+        self.get_connection().cursor().executemany(
+            """DELETE FROM courses WHERE id = encode_id(?);""",
+            ((course_id,) for course_id in courses_ids),
+        )
+        self.invalidate_courses_cache(*courses_ids)
+        self.release()
 
-        self.get_connection().row_factory = lambda _cursor, row: CourseData(*row)
-        return {
-            semester.id: tuple(
-                self.get_connection()
-                .cursor()
-                .execute(
-                    """SELECT id, name, score, credit_units
-                            FROM courses WHERE parent_semester_id = ?;""",
-                    (semester.id,),
+    def update_courses_data(self, courses_data: Iterable[CourseData]) -> None:
+        """Update the name, score and credit units of many courses."""
+        courses_data = list(courses_data)
+        self.get_connection().cursor().executemany(
+            """UPDATE courses SET name = ?, score = ?, credit_units = ?
+                    WHERE id = encode_id(?);""",
+            (
+                (
+                    course_data.name,
+                    course_data.score,
+                    course_data.credit_units,
+                    course_data.id,
                 )
-                .fetchall(),
+                for course_data in courses_data
+            ),
+        )
+        self.invalidate_courses_cache(
+            *(course_data.id for course_data in courses_data),
+        )
+        self.release()
+
+    def iter_semesters_courses(
+        self,
+        profile_id: str,
+    ) -> Iterator[tuple[str, Iterator[CourseData]]]:
+        """Iterate over the semesters of a profile with their courses lazily."""
+        cur = self.get_read_cursor()
+        # Every row is the semester ID with the course columns, they are NULL for an
+        # empty semester, since the LEFT JOIN still returns the semester.
+        # The rowids are in the (parent, position) indexes too, they make the order
+        # unique, so the rows are read in the indexes order without sorting them.
+        cur.execute(
+            """SELECT decode_id(semesters.id),
+                    decode_id(courses.id),
+                    courses.name, courses.score, courses.credit_units
+                FROM semesters
+                    LEFT JOIN courses ON courses.parent_semester_id = semesters.id
+                WHERE semesters.parent_profile_id = encode_id(?)
+                ORDER BY semesters.position, semesters.rowid,
+                    courses.position, courses.rowid;""",
+            (profile_id,),
+        )
+
+        # Rows are ordered by semester, so they can be grouped in a single pass.
+        for semester_id, rows in groupby(fetch_rows(cur), key=itemgetter(0)):
+            yield (
+                semester_id,
+                (CourseData._make(row[1:]) for row in rows if row[1] is not None),
             )
-            for semester in semesters
+
+    def iter_courses_data(self, profile_id: str) -> Iterator[CourseData]:
+        """Iterate over all the courses of a profile lazily, without the cache."""
+        cur = self.get_read_cursor()
+        cur.execute(
+            """SELECT decode_id(courses.id),
+                    courses.name, courses.score, courses.credit_units
+                FROM courses
+                    JOIN semesters ON semesters.id = courses.parent_semester_id
+                WHERE semesters.parent_profile_id = encode_id(?)
+                ORDER BY semesters.position, semesters.rowid,
+                    courses.position, courses.rowid;""",
+            (profile_id,),
+        )
+        return map(CourseData._make, fetch_rows(cur))
+
+    def get_courses_data(self, profile_id: str) -> dict[str, tuple[CourseData, ...]]:
+        """Get courses data from a profile id."""
+        # A copy is returned, so changing it won't change the cached courses.
+        return dict(
+            self.read_cache(
+                ("courses", profile_id),
+                lambda: self.read_courses_data(profile_id),
+            ),
+        )
+
+    def read_courses_data(self, profile_id: str) -> dict[str, tuple[CourseData, ...]]:
+        """Read the courses data of a profile without the cache."""
+        courses_data = {
+            semester_id: tuple(courses)
+            for semester_id, courses in self.iter_semesters_courses(profile_id)
         }
 
-    def update_course_name(self, course_id: str, course_name: str) -> None:
+        for semester_id, courses in courses_data.items():
+            self.cache_owners[semester_id] = profile_id
+            for course_data in courses:
+                self.cache_owners[course_data.id] = profile_id
+
+        return courses_data
+
+    def update_course_name(self, course_id: str, course_name: Optional[str]) -> None:
         """Update course name."""
         self.get_connection().cursor().execute(
-            "UPDATE courses SET name = ? WHERE id = ?",
+            "UPDATE courses SET name = ? WHERE id = encode_id(?)",
             (course_name, course_id),
         )
-        self.close()
+        self.invalidate_courses_cache(course_id)
+        self.release()
 
-    def update_course_score(self, course_id: str, course_score: float) -> None:
+    def update_course_score(
+        self,
+        course_id: str,
+        course_score: Optional[float],
+    ) -> None:
         """Update course score."""
         self.get_connection().cursor().execute(
-            "UPDATE courses SET score = ? WHERE id = ?",
+            "UPDATE courses SET score = ? WHERE id = encode_id(?)",
             (course_score, course_id),
         )
-        self.close()
+        self.invalidate_courses_cache(course_id)
+        self.release()
 
     def update_course_credit_units(
         self,
         course_id: str,
-        course_credit_units: int,
+        course_credit_units: Optional[int],
     ) -> None:
         """Update course credit units."""
         self.get_connection().cursor().execute(
-            "UPDATE courses SET credit_units = ? WHERE id = ?",
+            "UPDATE courses SET credit_units = ? WHERE id = encode_id(?)",
             (course_credit_units, course_id),
         )
-        self.close()
+        self.invalidate_courses_cache(course_id)
+        self.release()
+
+    def queue_course_update(
+        self,
+        course_id: str,
+        column: str,
+        value: Union[str, float, None],
+    ) -> None:
+        """
+        Queue a course update to be written later with the other queued updates.
+
+        An update replaces any queued update for the same course column, so typing
+        a name will only write the last text when `flush_course_updates()` is called.
+        """
+        if column not in self.course_update_statements:
+            raise NotSupportedCourseColumnError(column)
+
+        self.pending_course_updates[(course_id, column)] = value
+
+    def write_course_updates(self) -> None:
+        """Execute the queued course updates without committing them."""
+        # Group the parameters by column, to execute every statement once.
+        parameters: dict[str, list[tuple[Union[str, float, None], str]]] = {
+            column: [] for column in self.course_update_statements
+        }
+        for (course_id, column), value in self.pending_course_updates.items():
+            parameters[column].append((value, course_id))
 
-    def export_to_json(self, file_path: Path) -> None:
-        """Convert the database to json format and save it to a file."""
-        data = [
-            {
-                "profile_data": asdict(profile),
-                "semesters": tuple(
+        cur = self.get_connection().cursor()
+        for column, column_parameters in parameters.items():
+            if column_parameters:
+                cur.executemany(
+                    self.course_update_statements[column],
+                    column_parameters,
+                )
+
+        self.invalidate_courses_cache(
+            *(course_id for course_id, _ in self.pending_course_updates),
+        )
+        self.pending_course_updates.clear()
+
+    def flush_course_updates(self) -> None:
+        """Write all the queued course updates in one transaction."""
+        if self.pending_course_updates:
+            self.write_course_updates()
+            self.release()
+
+    def export_to_json(self, file_path: Path, *, compact: bool = False) -> None:
+        """
+        Convert the database to json format and save it to a file.
+
+        The data are read with cursors and written in chunks while walking through
+        the profiles, so the whole database is never held in memory.
+        Use `compact` to write it without indentation and spaces.
+        """
+        # Export the queued updates too.
+        self.flush_course_updates()
+
+        # Iterators are encoded as json arrays while they are consumed.
+        with Path(file_path).open("w", encoding="utf-8") as file:
+            write_json_chunks(
+                file,
+                iter_json_chunks(self.iter_export_items(), None if compact else 2),
+            )
+
+        self.release()
+
+    def iter_export_items(self) -> Iterator[dict]:
+        """Iterate over the exported items of the profiles, with lazy values."""
+        for profile in self.iter_profiles_data():
+            profile_item = {
+                "profile_data": profile._asdict(),
+                "semesters": (
                     {
                         # This key is for further functionalities of the app.
                         "semester_data": None,
-                        "courses": tuple(
-                            asdict(course_data) for course_data in courses_data
-                        ),
+                        "courses": (course_data._asdict() for course_data in courses),
                     }
-                    for semester_id, courses_data in self.get_courses_data(
+                    for _semester_id, courses in self.iter_semesters_courses(
                         profile.id,
-                    ).items()
+                    )
                 ),
             }
-            for profile in self.get_profiles_data()
+
+            # Only the profiles with archived semesters have this key, so the other
+            # profiles are exported like they were before the archives.
+            archives_items = self.iter_semester_archives_items(profile.id)
+            if (first_archive_item := next(archives_items, None)) is not None:
+                profile_item["semester_archives"] = chain(
+                    (first_archive_item,),
+                    archives_items,
+                )
+
+            yield profile_item
+
+    def import_from_json(self, file_path: Path, *, replace: bool = False) -> None:
+        """
+        Import json file data to the database.
+
+        Profiles are parsed one by one from the file, and inserted with their
+        semesters and courses in batches, all in one transaction.
+        Existing profiles and courses with the same IDs are merged with the imported
+        data, or deleted then replaced with them when `replace` is enabled.
+        """
+        # Don't let the queued updates overwrite the imported data latter.
+        self.flush_course_updates()
+
+        try:
+            with Path(file_path).open(encoding="utf-8") as file:
+                self.import_profiles(iter_json_array(file), replace=replace)
+        except InvalidImportFileError:
+            raise
+        except (KeyError, TypeError, ValueError, sqlite3.IntegrityError) as error:
+            # The items don't have the exported data structure.
+            raise InvalidImportFileError(repr(error)) from error
+
+    def import_profiles(
+        self,
+        profiles_items: Iterable[dict],
+        *,
+        replace: bool,
+    ) -> None:
+        """Insert the exported profiles items in one transaction."""
+        with self.transaction() as cur:
+            for profile_item in profiles_items:
+                self.import_profile(cur, profile_item, replace=replace)
+            # Any profile may be changed by the imported data.
+            self.clear_cache()
+
+    def import_profile(
+        self,
+        cur: sqlite3.Cursor,
+        profile_item: dict,
+        *,
+        replace: bool,
+    ) -> None:
+        """Insert one exported profile item with it's semesters and courses."""
+        profile_data = ProfileData(**profile_item["profile_data"])
+        semesters_items = profile_item["semesters"]
+
+        courses_ids = [
+            course["id"]
+            for semester_item in semesters_items
+            for course in semester_item["courses"]
         ]
 
+        if replace:
+            cur.execute(
+                "DELETE FROM profiles WHERE id = encode_id(?);",
+                (profile_data.id,),
+            )
+            existing_semesters_ids = {}
+            empty_semesters_ids = []
+        else:
+            # Semesters IDs are not exported, so use the IDs of the semesters that
+            # have the imported courses, to merge them instead of duplicating them.
+            existing_semesters_ids = dict(
+                cur.execute(
+                    """SELECT
+                        decode_id(courses.id), decode_id(courses.parent_semester_id)
+                        FROM courses
+                            JOIN semesters ON semesters.id = courses.parent_semester_id
+                        WHERE semesters.parent_profile_id = encode_id(?)
+                            AND courses.id IN (
+                                SELECT encode_id(value) FROM json_each(?)
+                            );""",
+                    (profile_data.id, json.dumps(courses_ids)),
+                ).fetchall(),
+            )
+            # The empty semesters have no courses to match them, so they are
+            # merged with the empty semesters of the profile in order.
+            empty_semesters_ids = [
+                row[0]
+                for row in cur.execute(
+                    """SELECT decode_id(id) FROM semesters
+                        WHERE parent_profile_id = encode_id(?)
+                            AND NOT EXISTS (
+                                SELECT 1 FROM courses
+                                    WHERE courses.parent_semester_id = semesters.id
+                            )
+                        ORDER BY position, rowid;""",
+                    (profile_data.id,),
+                )
+            ]
+
+        # New profiles are the least recent selected, to keep the current one.
+        cur.execute(
+            """INSERT INTO profiles
+                (id, name, color, point_scale, last_selected_time)
+                    VALUES (encode_id(?), ?, ?, ?, 0)
+                ON CONFLICT (id) DO UPDATE SET
+                    name = excluded.name,
+                    color = excluded.color,
+                    point_scale = excluded.point_scale;""",
+            (
+                profile_data.id,
+                profile_data.name,
+                profile_data.color,
+                profile_data.point_scale,
+            ),
+        )
+
+        semesters_rows = []
+        courses_rows: list[
+            tuple[str, str, Optional[str], Optional[float], Optional[int]]
+        ] = []
+        for semester_item in semesters_items:
+            courses_data = [CourseData(**course) for course in semester_item["courses"]]
+
+            if courses_data:
+                semester_id = next(
+                    (
+                        existing_semesters_ids[course_data.id]
+                        for course_data in courses_data
+                        if course_data.id in existing_semesters_ids
+                    ),
+                    uuid4().hex,
+                )
+            elif empty_semesters_ids:
+                semester_id = empty_semesters_ids.pop(0)
+            else:
+                semester_id = uuid4().hex
+
+            semesters_rows.append((semester_id, profile_data.id))
+            courses_rows.extend(
+                (
+                    course_data.id,
+                    semester_id,
+                    course_data.name,
+                    course_data.score,
+                    course_data.credit_units,
+                )
+                for course_data in courses_data
+            )
+
+        cur.executemany(
+            """INSERT INTO semesters (id, parent_profile_id)
+                    VALUES (encode_id(?), encode_id(?))
+                ON CONFLICT (id) DO NOTHING;""",
+            semesters_rows,
+        )
+        cur.executemany(
+            """INSERT INTO courses
+                (id, parent_semester_id, name, score, credit_units)
+                    VALUES (encode_id(?), encode_id(?), ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    parent_semester_id = excluded.parent_semester_id,
+                    name = excluded.name,
+                    score = excluded.score,
+                    credit_units = excluded.credit_units;""",
+            courses_rows,
+        )
+
+        # The files exported before archiving the semesters don't have them.
+        self.import_semester_archives(
+            cur,
+            profile_data.id,
+            profile_item.get("semester_archives", ()),
+        )
+
+    def import_semester_archives(
+        self,
+        cur: sqlite3.Cursor,
+        profile_id: str,
+        archives_items: Iterable[dict],
+    ) -> None:
+        """Insert the exported archived semesters of a profile, with their courses."""
+        archives_rows = []
+        courses_rows: list[
+            tuple[str, str, Optional[str], Optional[float], Optional[int]]
+        ] = []
+        for archive_item in archives_items:
+            archives_rows.append(
+                {
+                    **{
+                        column: archive_item[column]
+                        for column in self.change_columns["semester_archives"]
+                        if column != "parent_profile_id"
+                    },
+                    "parent_profile_id": profile_id,
+                },
+            )
+            courses_rows.extend(
+                (
+                    course_data.id,
+                    archive_item["id"],
+                    course_data.name,
+                    course_data.score,
+                    course_data.credit_units,
+                )
+                for course_data in (
+                    CourseData(**course) for course in archive_item["courses"]
+                )
+            )
+
+        # An archive replaces it's semester, if it wasn't archived here.
+        cur.executemany(
+            "DELETE FROM semesters WHERE id = encode_id(:id);",
+            archives_rows,
+        )
+        cur.executemany(
+            self.change_upsert_statements["semester_archives"],
+            archives_rows,
+        )
+        cur.executemany(
+            """INSERT INTO archived_courses
+                (id, parent_archive_id, name, score, credit_units)
+                    VALUES (encode_id(?), encode_id(?), ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    parent_archive_id = excluded.parent_archive_id,
+                    name = excluded.name,
+                    score = excluded.score,
+                    credit_units = excluded.credit_units;""",
+            courses_rows,
+        )
+
+    def export_changes(
+        self,
+        file_path: Path,
+        *,
+        since: int = 0,
+        compact: bool = False,
+    ) -> int:
+        """
+        Save the rows changed after the `since` version to a json file.
+
+        Only the change log entries after that version are read, so the export is
+        as small and as fast as the changes. The returned version is the `since` of
+        the next export, and the file can be applied with `import_changes()`.
+        """
+        # Export the queued updates too.
+        self.flush_course_updates()
+
+        version = (
+            self.get_connection()
+            .execute("SELECT IFNULL(MAX(version), 0) FROM change_log;")
+            .fetchone()[0]
+        )
+
+        data = {
+            "since": since,
+            "version": version,
+            "deleted": {
+                table: (
+                    row_id
+                    for (row_id,) in self.get_connection().execute(
+                        """SELECT decode_id(row_id) FROM change_log
+                            WHERE version > ? AND version <= ?
+                                AND +table_name = ? AND operation = 'delete'
+                            ORDER BY version;""",
+                        (since, version, table),
+                    )
+                )
+                for table in self.change_columns
+            },
+            **{
+                table: self.iter_changed_rows(table, since, version)
+                for table in self.change_columns
+            },
+        }
+
+        with Path(file_path).open("w", encoding="utf-8") as file:
+            write_json_chunks(file, iter_json_chunks(data, None if compact else 2))
+
+        self.release()
+
+        return version
+
+    def iter_changed_rows(
+        self,
+        table: str,
+        since: int,
+        version: int,
+    ) -> Iterator[dict[str, Union[str, float, None]]]:
+        """Iterate over the rows of a table changed between two versions."""
+        columns = self.change_columns[table]
+        columns_sql = (
+            f"decode_id({table}.{column})"
+            if column.endswith("id")
+            else f"{table}.{column}"
+            for column in columns
+        )
+        cur = self.get_connection().cursor()
+        # The unary + stops SQLite from searching all the entries of the table by
+        # it's name, instead of searching only the versions range.
+        cur.execute(
+            f"""SELECT {", ".join(columns_sql)}
+                FROM change_log JOIN {table} ON {table}.id = change_log.row_id
+                WHERE change_log.version > ? AND change_log.version <= ?
+                    AND +change_log.table_name = ?
+                ORDER BY change_log.version;""",  # noqa: S608
+            (since, version, table),
+        )
+
+        return (dict(zip(columns, row)) for row in fetch_rows(cur))
+
+    def import_changes(self, file_path: Path) -> int:
+        """Apply the changes saved by `export_changes()`, and return their version."""
+        # Don't let the queued updates overwrite the imported changes latter.
+        self.flush_course_updates()
+
+        try:
+            with self.transaction() as cur, Path(file_path).open(
+                encoding="utf-8",
+            ) as file:
+                changes = json.load(file)
+
+                # Delete the children first, then insert the parents first. The
+                # files exported before a table was logged don't have it's key.
+                for table in reversed(self.change_columns):
+                    cur.executemany(
+                        f"DELETE FROM {table} WHERE id = encode_id(?);",  # noqa: S608
+                        ((row_id,) for row_id in changes["deleted"].get(table, ())),
+                    )
+                for table, statement in self.change_upsert_statements.items():
+                    cur.executemany(statement, changes.get(table, ()))
+
+                # Any profile may be changed by the imported changes.
+                self.clear_cache()
+        except (
+            KeyError,
+            TypeError,
+            ValueError,
+            sqlite3.IntegrityError,
+            sqlite3.ProgrammingError,
+        ) as error:
+            # The file doesn't have the exported changes structure.
+            raise InvalidImportFileError(repr(error)) from error
+
+        return changes["version"]
+
+    def backup(
+        self,
+        backup_dir: Optional[Path] = None,
+        *,
+        keep: int = 5,
+        pages: int = 256,
+        sleep: float = 0.005,
+    ) -> Path:
+        """Write the queued updates, then back up the database to a new file."""
+        self.flush_course_updates()
+
+        return self.backup_files(backup_dir, keep=keep, pages=pages, sleep=sleep)
+
+    def backup_files(
+        self,
+        backup_dir: Optional[Path] = None,
+        *,
+        keep: int = 5,
+        pages: int = 256,
+        sleep: float = 0.005,
+    ) -> Path:
+        """
+        Back up the database file to a new backup file, see `backup_database`.
+
+        Only the files paths are used, so it can run in another thread.
+        """
+        return backup_database(
+            self.database_file,
+            backup_dir,
+            keep=keep,
+            pages=pages,
+            sleep=sleep,
+        )
+
+    def restore_backup(self, backup_file: Path) -> None:
+        """Restore the database from a backup file, the queued updates are dropped."""
+        self.pending_course_updates.clear()
         self.close()
+        restore_database_file(backup_file, self.database_file)
+
+        # The backup may be from an older version of the app.
+        self.migrate_database()
+
+    def get_maintenance_schemas(self) -> tuple[str, ...]:
+        """Return the schemas of the database files tidied by `run_maintenance()`."""
+        return ("main",)
+
+    def get_maintenance_data(self, schema: str = "main") -> MaintenanceData:
+        """Return the pages and statistics metrics of a database file."""
+        con = self.get_connection()
+
+        return MaintenanceData(
+            con.execute(f"PRAGMA {schema}.page_count;").fetchone()[0],
+            con.execute(f"PRAGMA {schema}.freelist_count;").fetchone()[0],
+            con.execute(f"PRAGMA {schema}.auto_vacuum;").fetchone()[0],
+            bool(
+                con.execute(
+                    f"""SELECT COUNT(*) FROM {schema}.sqlite_master
+                        WHERE name = 'sqlite_stat1';""",  # noqa: S608
+                ).fetchone()[0],
+            ),
+        )
+
+    def run_maintenance(self, time_budget: float = 0.5) -> int:
+        """
+        Update the query planner statistics and release the empty pages, if needed.
+
+        The statistics are updated after `maintenance_min_changes` changed rows,
+        ANALYZE reads at most `analysis_limit` rows of every index, then
+        `PRAGMA optimize` only analyzes the tables that changed a lot. The empty
+        pages are released in steps until `time_budget` seconds pass, when they
+        are more than the `vacuum_min_*` limits. It returns the released pages.
+        The files that need to be rebuilt first are skipped when they are too big
+        for the time budget, see `compact_database()`.
+        """
+        deadline = perf_counter() + time_budget
+
+        # VACUUM can't run inside a transaction.
+        self.flush_course_updates()
+        con = self.get_connection()
+        con.commit()
+
+        schemas = self.get_maintenance_schemas()
+        if con.total_changes - self.maintenance_total_changes >= (
+            self.maintenance_min_changes
+        ):
+            con.execute(f"PRAGMA analysis_limit = {self.analysis_limit};")
+            for schema in schemas:
+                if not self.get_maintenance_data(schema).analyzed:
+                    con.execute(f"ANALYZE {schema};")
+            con.execute("PRAGMA optimize;")
+            con.commit()
+
+        released_pages = 0
+        for schema in schemas:
+            maintenance_data = self.get_maintenance_data(schema)
+            if self.is_worth_vacuuming(maintenance_data, deadline):
+                released_pages += self.vacuum_schema(schema, maintenance_data, deadline)
+
+        self.maintenance_total_changes = con.total_changes
+        self.release()
+
+        return released_pages
+
+    def is_worth_vacuuming(
+        self,
+        maintenance_data: MaintenanceData,
+        deadline: float,
+    ) -> bool:
+        """Check if a file has enough empty pages to release before the deadline."""
+        time_left = deadline - perf_counter()
+        if time_left <= 0 or maintenance_data.freelist_count < max(
+            self.vacuum_min_free_pages,
+            maintenance_data.page_count * self.vacuum_min_free_ratio,
+        ):
+            return False
+
+        # 2 is INCREMENTAL, the other files are copied by VACUUM first.
+        return (
+            maintenance_data.auto_vacuum == 2
+            or maintenance_data.page_count <= time_left * self.rebuild_pages_per_second
+        )
+
+    def vacuum_schema(
+        self,
+        schema: str,
+        maintenance_data: MaintenanceData,
+        deadline: float,
+    ) -> int:
+        """Release the empty pages of a database file until the deadline."""
+        con = self.get_connection()
+
+        # 2 is INCREMENTAL.
+        if maintenance_data.auto_vacuum != 2:
+            self.rebuild_schema(schema)
+        else:
+            freelist_count = maintenance_data.freelist_count
+            while freelist_count and perf_counter() < deadline:
+                # `execute()` only releases one page, it doesn't step the pragma
+                # until it's done like `executescript()`.
+                con.executescript(
+                    f"PRAGMA {schema}.incremental_vacuum({self.vacuum_step_pages});",
+                )
+                freelist_count = con.execute(
+                    f"PRAGMA {schema}.freelist_count;",
+                ).fetchone()[0]
+
+        return (
+            maintenance_data.freelist_count
+            - con.execute(f"PRAGMA {schema}.freelist_count;").fetchone()[0]
+        )
+
+    def rebuild_schema(self, schema: str) -> None:
+        """Copy a database file by VACUUM, with the incremental auto vacuum enabled."""
+        con = self.get_connection()
+        # The files created before the incremental auto vacuum need to be rebuilt
+        # once to enable it, it releases all the empty pages.
+        con.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL;")
+        con.execute(f"VACUUM {schema};")
+
+        # VACUUM may change the courses rowids used by the full-text index.
+        if con.execute(
+            f"""SELECT COUNT(*) FROM {schema}.sqlite_master
+                WHERE name = 'courses_search';""",  # noqa: S608
+        ).fetchone()[0]:
+            con.execute(
+                f"""INSERT INTO {schema}.courses_search (courses_search)
+                    VALUES ('rebuild');""",  # noqa: S608
+            )
+            con.commit()
+
+    def compact_database(self) -> int:
+        """
+        Rebuild the database files to release all their empty pages, and return them.
+
+        It converts the files created before the incremental auto vacuum that are
+        too big for `run_maintenance()`, it may take a while, every page is copied.
+        """
+        # VACUUM can't run inside a transaction.
+        self.flush_course_updates()
+        self.get_connection().commit()
+
+        released_pages = 0
+        for schema in self.get_maintenance_schemas():
+            freelist_count = self.get_maintenance_data(schema).freelist_count
+            self.rebuild_schema(schema)
+            released_pages += (
+                freelist_count - self.get_maintenance_data(schema).freelist_count
+            )
 
-        json.dump(data, Path.open(file_path, "w"), ensure_ascii=False, indent=2)
+        self.release()
 
-    def import_from_json(self, file_path: Path) -> None:
-        """Import json file data to the database."""
-        # TODO: Implement import from json file to database.
+        return released_pages
 
     def change_point_scale(self, profile_id: str, new_point_scale: int) -> None:
         """Update the point scale in a profile."""
         self.get_connection().cursor().execute(
-            """UPDATE profiles SET point_scale = ? WHERE id = ?""",
+            """UPDATE profiles SET point_scale = ? WHERE id = encode_id(?)""",
             (new_point_scale, profile_id),
         )
+        self.invalidate_profiles_cache()
+        self.release()
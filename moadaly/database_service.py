@@ -0,0 +1,165 @@
+"""Run the database operations in a background thread."""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from queue import SimpleQueue
+from threading import Thread
+from typing import Any, Callable, Optional, TypeVar
+
+from .database import Database
+
+T = TypeVar("T")
+
+
+class DatabaseClosedError(RuntimeError):
+    """Error to be raised when submitting an operation after closing the service."""
+
+    def __init__(self) -> None:
+        """Error initalization function."""
+        super().__init__("The database service was closed.")
+
+
+class DatabaseService:
+    """
+    Own a database in one writer thread, and run the submitted operations on it.
+
+    The SQLite connection can only be used from the thread that created it, so the
+    database is created inside the thread, and only touched there. Operations are
+    run one by one in the same order they were submitted.
+    """
+
+    def __init__(
+        self,
+        *args: Any,  # noqa: ANN401
+        on_error: Optional[Callable[[BaseException], None]] = None,
+        database_class: type[Database] = Database,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Start the thread, the arguments are passed to the created `Database`.
+
+        `database_class` can be a subclass of `Database`, like `ShardedDatabase`.
+        """
+        self.on_error = on_error
+        self.database_class = database_class
+        self.operations: SimpleQueue[
+            Optional[tuple[Future, Callable[..., Any], tuple[Any, ...]]]
+        ] = SimpleQueue()
+        self.is_closed = False
+
+        # Backups use their own connections, so they run in another thread,
+        # and the submitted operations don't wait for them.
+        self.backups = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="moadaly-backup",
+        )
+
+        started: Future[None] = Future()
+        self.thread = Thread(
+            target=self.run,
+            args=(started, args, kwargs),
+            name="moadaly-database",
+            daemon=True,
+        )
+        self.thread.start()
+
+        # Raise any error from creating the database here.
+        started.result()
+
+    def run(
+        self,
+        started: "Future[None]",
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+    ) -> None:
+        """Create the database, then run the operations until the service is closed."""
+        try:
+            database = self.database_class(*args, **kwargs)
+        except Exception as error:  # noqa: BLE001
+            started.set_exception(error)
+            return
+        # They are the only attributes of the database used outside of this thread,
+        # the backups only use the files paths, so they can run in another thread.
+        self.database_file = database.database_file
+        self.backup_files = database.backup_files
+        started.set_result(None)
+
+        while (operation := self.operations.get()) is not None:
+            future, function, function_args = operation
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            # Call the method of the database instead of the submitted function,
+            # since it may be overridden by a subclass of `Database`.
+            name = getattr(function, "__name__", None)
+            if name and getattr(Database, name, None) is function:
+                call = getattr(database, name)
+            else:
+                call = partial(function, database)
+
+            try:
+                # Called again if another connection keeps the database locked.
+                result = database.call_with_retry(call, *function_args)
+            except Exception as error:  # noqa: BLE001
+                if self.on_error:
+                    self.on_error(error)
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        # Write any queued updates before stopping.
+        database.close()
+
+    def submit(
+        self,
+        function: Callable[..., T],
+        *args: Any,  # noqa: ANN401
+    ) -> "Future[T]":
+        """
+        Queue a function to be called with the database and the arguments.
+
+        e.g. `submit(Database.delete_course, course_id)`, the result is available
+        from the returned future when it's done.
+        """
+        if self.is_closed:
+            raise DatabaseClosedError
+
+        future: Future[T] = Future()
+        self.operations.put((future, function, args))
+
+        return future
+
+    def backup(
+        self,
+        backup_dir: Optional[Path] = None,
+        *,
+        keep: int = 5,
+    ) -> "Future[Path]":
+        """
+        Back up the database in the backups thread, see `Database.backup_files`.
+
+        The queued course updates that weren't written yet aren't in the backup.
+        """
+        if self.is_closed:
+            raise DatabaseClosedError
+
+        future = self.backups.submit(self.backup_files, backup_dir, keep=keep)
+        if self.on_error:
+            future.add_done_callback(self.report_error)
+
+        return future
+
+    def report_error(self, future: "Future") -> None:
+        """Report the error of a finished future, if it has one."""
+        if self.on_error and (error := future.exception()):
+            self.on_error(error)
+
+    def close(self) -> None:
+        """Wait for the submitted operations and backups, then close the database."""
+        if not self.is_closed:
+            self.is_closed = True
+            self.backups.shutdown()
+            self.operations.put(None)
+            self.thread.join()
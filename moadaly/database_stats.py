@@ -0,0 +1,344 @@
+"""Record how much time the database methods and statements take."""
+
+import atexit
+import json
+import re
+import sqlite3
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict, dataclass, field
+from functools import wraps
+from os import environ
+from pathlib import Path
+from threading import Lock, local
+from time import perf_counter
+from typing import Any, Callable, Optional, TypeVar, cast, overload
+
+T = TypeVar("T")
+CursorT = TypeVar("CursorT", bound=sqlite3.Cursor)
+
+# The upper limits of the latency histogram buckets in seconds, the last bucket
+# has the slower calls.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+# The literal values in the traced statements, to group the same statements.
+SQL_LITERALS_PATTERN = re.compile(
+    r"[Xx]'[0-9A-Fa-f]*'|'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b",
+)
+
+# The environment variable with the file to dump the stats of every database to.
+STATS_FILE_VARIABLE = "MOADALY_DATABASE_STATS"
+
+
+def normalize_sql(statement: str) -> str:
+    """Replace the values in a statement with `?`, and collapse the white space."""
+    return " ".join(SQL_LITERALS_PATTERN.sub("?", statement).split())
+
+
+@dataclass
+class CallStats:
+    """Data class for the calls of a method or a statement."""
+
+    calls: int = 0
+    rows: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    histogram: list[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1),
+    )
+
+    def add(self, latency: float, rows: int = 0) -> None:
+        """Count a call with it's latency and rows."""
+        self.calls += 1
+        self.rows += rows
+        self.total_time += latency
+        self.max_time = max(self.max_time, latency)
+        self.histogram[
+            next(
+                (i for i, bucket in enumerate(LATENCY_BUCKETS) if latency <= bucket),
+                len(LATENCY_BUCKETS),
+            )
+        ] += 1
+
+
+class StatsCursor(sqlite3.Cursor):
+    """Cursor that adds the rows it changes or fetches to it's statement stats."""
+
+    # The method and the statement that the rows are added to.
+    statement_key: Optional[tuple[str, str]] = None
+
+    def execute(self, sql: str, parameters: Any = (), /) -> "StatsCursor":  # noqa: ANN401
+        """Execute a statement, then count the rows it changed."""
+        super().execute(sql, parameters)
+        self.count_changed_rows()
+        return self
+
+    def executemany(
+        self,
+        sql: str,
+        seq_of_parameters: Iterable[Any],
+        /,
+    ) -> "StatsCursor":
+        """Execute a statement for every parameters, then count the changed rows."""
+        super().executemany(sql, seq_of_parameters)
+        self.count_changed_rows()
+        return self
+
+    def count_changed_rows(self) -> None:
+        """Keep the running statement, and add the rows it changed to it's stats."""
+        self.statement_key = self.get_stats().get_running_statement()
+        # It's -1 for the statements that don't change rows.
+        self.add_rows(max(self.rowcount, 0))
+
+    def add_rows(self, rows: int) -> None:
+        """Add rows to the stats of the statement of this cursor."""
+        if self.statement_key is not None and rows:
+            self.get_stats().add_statement_rows(self.statement_key, rows)
+
+    def get_stats(self) -> "DatabaseStats":
+        """Return the stats of the connection of this cursor."""
+        return cast(StatsConnection, self.connection).stats
+
+    def fetchone(self) -> Any:  # noqa: ANN401
+        """Fetch the next row, and count it."""
+        row = super().fetchone()
+        self.add_rows(row is not None)
+        return row
+
+    def fetchmany(self, size: Optional[int] = None) -> list[Any]:
+        """Fetch the next rows, and count them."""
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.add_rows(len(rows))
+        return rows
+
+    def fetchall(self) -> list[Any]:
+        """Fetch the remaining rows, and count them."""
+        rows = super().fetchall()
+        self.add_rows(len(rows))
+        return rows
+
+    def __next__(self) -> Any:  # noqa: ANN401
+        """Fetch the next row while iterating, and count it."""
+        row = super().__next__()
+        self.add_rows(1)
+        return row
+
+
+class StatsConnection(sqlite3.Connection):
+    """Connection that creates cursors counting the rows of their statements."""
+
+    stats: "DatabaseStats"
+
+    @overload
+    def cursor(self, factory: None = None) -> sqlite3.Cursor: ...
+
+    @overload
+    def cursor(self, factory: Callable[[sqlite3.Connection], CursorT]) -> CursorT: ...
+
+    def cursor(
+        self,
+        factory: Optional[Callable[[sqlite3.Connection], sqlite3.Cursor]] = None,
+    ) -> sqlite3.Cursor:
+        """Create a cursor that counts it's rows, unless another factory is passed."""
+        return super().cursor(factory or StatsCursor)
+
+
+class DatabaseStats:
+    """
+    Record the calls of the database methods and the statements they execute.
+
+    Methods are timed by wrapping them with `wrap()`, and statements are recorded by
+    setting `trace()` as the connection trace callback. A statement's latency is
+    the time until the next statement starts, or until it's method returns. The
+    connections created by `connect()` add the rows of every statement too.
+    """
+
+    def __init__(self) -> None:
+        """Initialize some important variables."""
+        self.methods: dict[str, CallStats] = {}
+        # The statements with their values replaced, by the method executed them.
+        self.statements: dict[tuple[str, str], CallStats] = {}
+        self.lock = Lock()
+        # The running methods of every thread, the last one executes the statements.
+        self.threads = local()
+
+    def connect(self, database_file: Path) -> sqlite3.Connection:
+        """Return a connection that records it's statements and their rows."""
+        connection = sqlite3.connect(database_file, factory=StatsConnection)
+        connection.stats = self
+        connection.set_trace_callback(self.trace)
+        return connection
+
+    def wrap(self, name: str, method: Callable[..., T]) -> Callable[..., T]:
+        """Return the method that records it's calls, rows and latency."""
+
+        @wraps(method)
+        def wrapper(*args: Any, **kwargs: Any) -> T:  # noqa: ANN401
+            running = self.get_running_methods()
+            # [method name, current statement, the statement start time]
+            frame = [name, None, 0.0]
+            running.append(frame)
+            result: Any = None
+            start = perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                running.pop()
+                # The statement of a returned iterator runs while it's consumed.
+                if not isinstance(result, Iterator):
+                    self.end_statement(frame, end)
+
+            if isinstance(result, Iterator):
+                return cast(T, self.wrap_iterator(frame, result, end - start, end))
+
+            # The number of the returned rows, when the data are returned at once.
+            if hasattr(result, "_fields"):
+                rows = 1
+            elif isinstance(result, (tuple, list, dict)):
+                rows = len(result)
+            else:
+                rows = 0
+            with self.lock:
+                self.methods.setdefault(name, CallStats()).add(end - start, rows)
+
+            return result
+
+        return wrapper
+
+    def wrap_iterator(
+        self,
+        frame: list,
+        iterator: Iterator[T],
+        latency: float,
+        paused: float,
+    ) -> Iterator[T]:
+        """
+        Return an iterator that records the statements of a method while consumed.
+
+        The method is running only while an item is produced, so the time between
+        the items isn't added to it's latency, and it's rows are the items.
+        """
+        rows = 0
+        try:
+            while True:
+                running = self.get_running_methods()
+                running.append(frame)
+                start = perf_counter()
+                frame[2] += start - paused
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    paused = perf_counter()
+                    latency += paused - start
+                    running.pop()
+
+                rows += 1
+                yield item
+        finally:
+            self.end_statement(frame, paused)
+            with self.lock:
+                self.methods.setdefault(frame[0], CallStats()).add(latency, rows)
+
+    def get_running_methods(self) -> list[list]:
+        """Return the methods running in the current thread."""
+        if not hasattr(self.threads, "running"):
+            self.threads.running = []
+
+        return self.threads.running
+
+    def trace(self, statement: str) -> None:
+        """Record a statement executed by the running method."""
+        now = perf_counter()
+        running = self.get_running_methods()
+        if not running:
+            return
+
+        # The statements of the virtual tables, like the full-text index, are
+        # reported as comments, they are a part of the running statement.
+        if statement.startswith("--"):
+            return
+
+        frame = running[-1]
+        statement = normalize_sql(statement)
+        # SQLite reports every statement of the fired triggers with the text of the
+        # statement that fired them, so it's counted once until another one starts.
+        if statement == frame[1]:
+            return
+
+        self.end_statement(frame, now)
+        frame[1] = statement
+        frame[2] = now
+
+    def get_running_statement(self) -> Optional[tuple[str, str]]:
+        """Return the running method and it's current statement, if there is one."""
+        running = self.get_running_methods()
+        if running and running[-1][1] is not None:
+            return running[-1][0], running[-1][1]
+
+        return None
+
+    def add_statement_rows(self, statement_key: tuple[str, str], rows: int) -> None:
+        """Add the rows changed or fetched by a statement to it's stats."""
+        with self.lock:
+            self.statements.setdefault(statement_key, CallStats()).rows += rows
+
+    def end_statement(self, frame: list, end: float) -> None:
+        """Record the latency of the current statement of a method."""
+        if frame[1] is not None:
+            with self.lock:
+                self.statements.setdefault((frame[0], frame[1]), CallStats()).add(
+                    end - frame[2],
+                )
+            frame[1] = None
+
+    def get_slowest_statements(
+        self,
+        count: int = 10,
+    ) -> list[tuple[str, str, CallStats]]:
+        """Return the method, the statement and the stats of the slowest statements."""
+        with self.lock:
+            return sorted(
+                (
+                    (method, statement, stats)
+                    for (method, statement), stats in self.statements.items()
+                ),
+                key=lambda item: item[2].total_time,
+                reverse=True,
+            )[:count]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the stats as a json serializable dict."""
+        with self.lock:
+            return {
+                "latency_buckets": LATENCY_BUCKETS,
+                "methods": {
+                    name: asdict(stats) for name, stats in self.methods.items()
+                },
+                "statements": [
+                    {"method": method, "statement": statement, **asdict(stats)}
+                    for (method, statement), stats in self.statements.items()
+                ],
+            }
+
+    def dump(self, file_path: Path) -> None:
+        """Save the stats to a json file."""
+        with Path(file_path).open("w", encoding="utf-8") as file:
+            json.dump(self.as_dict(), file, indent=2)
+
+
+# The stats of all the databases when the stats file environment variable is set.
+environment_stats: Optional[DatabaseStats] = None
+
+
+def get_environment_stats() -> Optional[DatabaseStats]:
+    """Return the shared stats that are saved at exit, if the variable is set."""
+    global environment_stats
+
+    stats_file = environ.get(STATS_FILE_VARIABLE)
+    if stats_file and environment_stats is None:
+        environment_stats = DatabaseStats()
+        atexit.register(environment_stats.dump, Path(stats_file))
+
+    return environment_stats if stats_file else None
@@ -0,0 +1,542 @@
+"""Keep every profile in it's own database file."""
+
+import shutil
+import sqlite3
+from operator import attrgetter
+from pathlib import Path
+from time import time
+from typing import Any, ClassVar, Iterable, Iterator, Optional, Union
+from uuid import uuid4
+
+from .database import (
+    MIGRATIONS,
+    CourseData,
+    CourseSearchResult,
+    Database,
+    ExternalChanges,
+    ProfileData,
+    ProfileSummary,
+    SemesterArchiveData,
+    copy_database_file,
+    get_backups,
+    get_new_backup_file,
+    migrate_database_file,
+    restore_database_file,
+)
+
+# The catalog only has the profiles and their totals, so the semesters and courses
+# tables are only found in the attached profile file.
+CATALOG_MIGRATIONS: tuple[str, ...] = (
+    # 1: The profiles, with their totals copied from their files.
+    """CREATE TABLE profiles
+            (id TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                color TEXT NOT NULL,
+                point_scale INTEGER,
+                last_selected_time INTEGER NOT NULL);
+    CREATE INDEX profiles_last_selected_time_index
+            ON profiles (last_selected_time);
+    CREATE TABLE profile_totals
+            (profile_id TEXT UNIQUE NOT NULL,
+                points_5 REAL NOT NULL DEFAULT 0,
+                points_4 REAL NOT NULL DEFAULT 0,
+                credit_units INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (profile_id)
+                REFERENCES profiles (id)
+                    ON DELETE CASCADE);
+    CREATE TRIGGER profiles_totals_insert AFTER INSERT ON profiles BEGIN
+        INSERT OR IGNORE INTO profile_totals (profile_id) VALUES (NEW.id);
+    END;""",
+    # 2: Store the hex UUIDs as 16 bytes blobs, like the profiles files.
+    """UPDATE profiles SET id = encode_id(id);
+    UPDATE profile_totals SET profile_id = encode_id(profile_id);""",
+    # 3: Order the profiles selected at the same time by their IDs, for the pages.
+    """CREATE INDEX profiles_last_selected_time_id_index
+            ON profiles (last_selected_time, id);
+    DROP INDEX profiles_last_selected_time_index;""",
+)
+
+
+class InvalidProfileIDError(ValueError):
+    """Error to be raised when a profile ID can't be used as a file name."""
+
+    def __init__(self, profile_id: str) -> None:
+        """Error initalization function."""
+        super().__init__(f"`{profile_id}` isn't a valid profile ID.")
+
+
+class ProfileSelectedInTransactionError(ValueError):
+    """Error to be raised when another profile is selected inside a transaction."""
+
+    def __init__(self, profile_id: str) -> None:
+        """Error initalization function."""
+        super().__init__(
+            f"The profile `{profile_id}` can't be selected inside a transaction,"
+            " it's file can't be attached until the transaction ends.",
+        )
+
+
+def get_profiles_backup_dir(backup_file: Path) -> Path:
+    """Return the directory of the profiles files backed up with a catalog backup."""
+    return backup_file.with_name(f"{backup_file.stem}-profiles")
+
+
+def delete_database_file(database_file: Path) -> None:
+    """Delete a closed database file with it's WAL files."""
+    for path in (
+        database_file,
+        Path(f"{database_file}-wal"),
+        Path(f"{database_file}-shm"),
+    ):
+        path.unlink(missing_ok=True)
+
+
+class ShardedDatabase(Database):
+    """
+    Keep the profiles in a small catalog, and every profile data in it's own file.
+
+    The catalog is the main database, and only the file of the selected profile is
+    attached to the connection as `profile`, it has the same schema of `Database`,
+    so the semesters and courses queries find their tables in it. A profile is
+    selected when it's data is read, and the semesters and courses changes by
+    their IDs are applied to the selected profile.
+    """
+
+    migrations: ClassVar[tuple[str, ...]] = CATALOG_MIGRATIONS
+    default_file_name: ClassVar[str] = "catalog.sqlite3"
+
+    def __init__(
+        self,
+        database_file: Optional[Path] = None,
+        *,
+        profiles_dir: Optional[Path] = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Initialize some important variables.
+
+        The profiles files are saved in `profiles_dir`, next to the catalog by
+        default, the other arguments are passed to `Database`.
+        """
+        # The profile that it's file is attached.
+        self.profile_id: Optional[str] = None
+
+        super().__init__(database_file, **kwargs)
+
+        self.profiles_dir = (
+            Path(profiles_dir)
+            if profiles_dir
+            else self.database_file.parent.joinpath("profiles")
+        )
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_profile_file(self, profile_id: str) -> Path:
+        """Return the database file of a profile."""
+        # Don't let an imported ID be a path to another file.
+        if not isinstance(profile_id, str) or not profile_id.isalnum():
+            raise InvalidProfileIDError(profile_id)
+
+        return self.profiles_dir.joinpath(f"{profile_id}.sqlite3")
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Create a new connection if there wasn't, with the profile file attached."""
+        if not hasattr(self, "connection"):
+            super().get_connection()
+            if self.profile_id:
+                self.attach_profile_file()
+
+        return self.connection
+
+    def attach_profile_file(self) -> None:
+        """Attach the file of the selected profile to the current connection."""
+        if not self.profile_id:
+            return
+
+        profile_file = self.get_profile_file(self.profile_id)
+        # The file is only created, or upgraded, when it's profile is selected.
+        migrate_database_file(profile_file, MIGRATIONS)
+
+        self.connection.execute("ATTACH DATABASE ? AS profile;", (str(profile_file),))
+        if self.persistent:
+            self.connection.execute("PRAGMA profile.journal_mode = WAL;")
+            self.connection.execute(f"PRAGMA profile.synchronous = {self.synchronous};")
+
+        # The semesters reference the profile in the same file, it's data are only
+        # in the catalog, so it's only a placeholder.
+        self.connection.execute(
+            """INSERT OR IGNORE INTO profile.profiles
+                (id, name, color, point_scale, last_selected_time)
+                    VALUES (encode_id(?), '', '', NULL, 0);""",
+            (self.profile_id,),
+        )
+        self.connection.commit()
+
+    def select_profile(self, profile_id: str) -> None:
+        """Attach the file of a profile, instead of the selected profile file."""
+        if profile_id == self.profile_id:
+            return
+
+        # Attaching the file commits, that would end the transaction in the middle.
+        if self.transaction_depth:
+            raise ProfileSelectedInTransactionError(profile_id)
+
+        if hasattr(self, "connection"):
+            # Finish the changes of the previous profile before detaching it's file.
+            if self.pending_course_updates:
+                self.write_course_updates()
+            self.sync_profile_totals()
+            self.connection.commit()
+
+            if self.profile_id:
+                self.connection.execute("DETACH DATABASE profile;")
+
+            self.profile_id = profile_id
+            self.attach_profile_file()
+            # The change log versions of the other file aren't comparable, and
+            # it's data version can't tell if the cached courses changed.
+            self.changes_version = None
+            self.clear_cache("profile")
+        else:
+            self.get_profile_file(profile_id)
+            self.profile_id = profile_id
+
+    def sync_profile_totals(self) -> None:
+        """Copy the totals of the selected profile from it's file to the catalog."""
+        if self.profile_id:
+            self.connection.execute(
+                """UPDATE main.profile_totals SET
+                    (points_5, points_4, credit_units) = (
+                        SELECT points_5, points_4, credit_units
+                            FROM profile.profile_totals
+                            WHERE profile_id = encode_id(:id)
+                    )
+                    WHERE profile_id = encode_id(:id) AND EXISTS (
+                        SELECT 1 FROM profile.profile_totals
+                            WHERE profile_id = encode_id(:id)
+                    );""",
+                {"id": self.profile_id},
+            )
+
+    def get_data_version(self) -> object:
+        """Return a value that changes when another connection commits."""
+        con = self.get_connection()
+
+        return (
+            con.execute("PRAGMA main.data_version;").fetchone()[0],
+            self.profile_id,
+            self.profile_id
+            and con.execute("PRAGMA profile.data_version;").fetchone()[0],
+        )
+
+    def get_cache_schema(self, key: Union[str, tuple[str, str]]) -> str:
+        """Return the catalog for the cached profiles, or the profile file."""
+        # The courses of a profile are only cached while it's file is attached.
+        return "profile" if isinstance(key, tuple) else "main"
+
+    def get_external_changes(self) -> Optional[ExternalChanges]:
+        """Return the rows changed by another connection in the profile file."""
+        # The change log is only in the profiles files.
+        if not self.profile_id:
+            return None
+
+        return super().get_external_changes()
+
+    def release(self) -> None:
+        """Copy the profile totals to the catalog, then commit or close."""
+        if not self.transaction_depth and hasattr(self, "connection"):
+            self.sync_profile_totals()
+
+        super().release()
+
+    def close(self) -> None:
+        """Write the queued updates and the totals, then close the connection."""
+        if hasattr(self, "connection"):
+            if self.pending_course_updates:
+                self.write_course_updates()
+            self.sync_profile_totals()
+
+        super().close()
+
+    def get_maintenance_schemas(self) -> tuple[str, ...]:
+        """Return the catalog schema, and the selected profile file schema."""
+        # The profile file is attached with the connection.
+        self.get_connection()
+
+        return ("main", "profile") if self.profile_id else ("main",)
+
+    def delete_profile(self, profile_id: str) -> None:
+        """Delete a profile from the catalog, then delete it's file."""
+        profile_file = self.get_profile_file(profile_id)
+
+        if profile_id == self.profile_id:
+            if hasattr(self, "connection"):
+                if self.pending_course_updates:
+                    self.write_course_updates()
+                self.connection.commit()
+                self.connection.execute("DETACH DATABASE profile;")
+            self.profile_id = None
+
+        super().delete_profile(profile_id)
+        delete_database_file(profile_file)
+
+    def backup_files(
+        self,
+        backup_dir: Optional[Path] = None,
+        *,
+        keep: int = 5,
+        pages: int = 256,
+        sleep: float = 0.005,
+    ) -> Path:
+        """
+        Back up the catalog and every profile file, then return the catalog backup.
+
+        The profiles files are copied to a directory next to the catalog backup,
+        see `get_profiles_backup_dir`, they are deleted with it.
+        """
+        backup_file = get_new_backup_file(self.database_file, backup_dir)
+        profiles_backup_dir = get_profiles_backup_dir(backup_file)
+        profiles_backup_dir.mkdir()
+
+        try:
+            for profile_file in self.profiles_dir.glob("*.sqlite3"):
+                copy_database_file(
+                    profile_file,
+                    profiles_backup_dir.joinpath(profile_file.name),
+                    pages=pages,
+                    sleep=sleep,
+                )
+            # The backups are found by their catalog files, so it's copied last.
+            copy_database_file(
+                self.database_file,
+                backup_file,
+                pages=pages,
+                sleep=sleep,
+            )
+        except BaseException:
+            shutil.rmtree(profiles_backup_dir, ignore_errors=True)
+            raise
+
+        for old_backup_file in get_backups(
+            self.database_file,
+            backup_file.parent,
+        )[keep:]:
+            old_backup_file.unlink()
+            shutil.rmtree(get_profiles_backup_dir(old_backup_file), ignore_errors=True)
+
+        return backup_file
+
+    def restore_backup(self, backup_file: Path) -> None:
+        """Restore the catalog and the profiles files from a backup of them."""
+        backup_file = Path(backup_file)
+        profiles_backup_dir = get_profiles_backup_dir(backup_file)
+        # Don't delete any profile when the backup is missing.
+        if not backup_file.is_file():
+            raise FileNotFoundError(backup_file)
+
+        self.pending_course_updates.clear()
+        self.close()
+        # The selected profile may not be in the backup.
+        self.profile_id = None
+
+        profiles_files = [
+            (profile_file, self.profiles_dir.joinpath(profile_file.name))
+            for profile_file in profiles_backup_dir.glob("*.sqlite3")
+        ]
+
+        # The profiles created after the backup, the older backups didn't have
+        # the profiles files, so they are kept.
+        if profiles_backup_dir.is_dir():
+            for profile_file in self.profiles_dir.glob("*.sqlite3"):
+                if not profiles_backup_dir.joinpath(profile_file.name).exists():
+                    delete_database_file(profile_file)
+
+        # They are restored in place, so the other connections using them see the
+        # restored data. The catalog is restored last, so it never lists a profile
+        # before it's file is restored.
+        for source_file, database_file in profiles_files:
+            restore_database_file(source_file, database_file)
+        restore_database_file(backup_file, self.database_file)
+
+        # The backup may be from an older version of the app, the profiles files
+        # are upgraded when they are attached.
+        self.migrate_database()
+
+    def clone_profile(self, profile_id: str, profile_name: str) -> str:
+        """Copy a profile from it's file to a new profile file, then select it."""
+        source_file = self.get_profile_file(profile_id)
+        new_profile_id = uuid4().hex
+        selected_profile_id = self.profile_id
+        # The file of a profile that wasn't selected yet isn't created or upgraded.
+        migrate_database_file(source_file, MIGRATIONS)
+
+        try:
+            # The files are attached first, that can't be done in a transaction.
+            self.get_connection()
+            self.select_profile(new_profile_id)
+            self.connection.execute(
+                "ATTACH DATABASE ? AS clone_source;",
+                (str(source_file),),
+            )
+            try:
+                with self.transaction() as cur:
+                    cur.execute(
+                        """INSERT INTO main.profiles
+                            (id, name, color, point_scale, last_selected_time)
+                            SELECT encode_id(?), ?, color, point_scale, ?
+                                FROM main.profiles WHERE id = encode_id(?);""",
+                        (new_profile_id, profile_name, time(), profile_id),
+                    )
+                    self.copy_profile_rows(
+                        cur,
+                        profile_id,
+                        new_profile_id,
+                        source_schema="clone_source",
+                    )
+                    self.invalidate_profiles_cache()
+            finally:
+                # The failed transactions close the connections that aren't
+                # persistent, with their attached files.
+                if hasattr(self, "connection"):
+                    self.connection.execute("DETACH DATABASE clone_source;")
+        except BaseException:
+            # Don't leave the file of the profile that wasn't created.
+            if self.profile_id == new_profile_id:
+                if hasattr(self, "connection"):
+                    self.connection.execute("DETACH DATABASE profile;")
+                self.profile_id = None
+            delete_database_file(self.get_profile_file(new_profile_id))
+            if selected_profile_id:
+                self.select_profile(selected_profile_id)
+            raise
+
+        return new_profile_id
+
+    def get_current_profile_data(self) -> ProfileData:
+        """Return the current selected profile, and attach it's file."""
+        data = super().get_current_profile_data()
+        self.select_profile(data.id)
+
+        return data
+
+    def create_new_semester(self, semester_id: str, parent_profile_id: str) -> None:
+        """Add new semester to the file of it's profile."""
+        self.select_profile(parent_profile_id)
+        super().create_new_semester(semester_id, parent_profile_id)
+
+    def iter_semesters_courses(
+        self,
+        profile_id: str,
+    ) -> Iterator[tuple[str, Iterator[CourseData]]]:
+        """Attach the file of a profile, then iterate over it's semesters lazily."""
+        self.select_profile(profile_id)
+
+        return super().iter_semesters_courses(profile_id)
+
+    def get_courses_data(self, profile_id: str) -> dict[str, tuple[CourseData, ...]]:
+        """Attach the file of a profile, then get it's cached courses data."""
+        self.select_profile(profile_id)
+
+        return super().get_courses_data(profile_id)
+
+    def iter_courses_data(self, profile_id: str) -> Iterator[CourseData]:
+        """Attach the file of a profile, then iterate over it's courses lazily."""
+        self.select_profile(profile_id)
+
+        return super().iter_courses_data(profile_id)
+
+    def iter_semester_archives(
+        self,
+        profile_id: str,
+    ) -> Iterator[SemesterArchiveData]:
+        """Attach the file of a profile, then iterate over it's archives lazily."""
+        self.select_profile(profile_id)
+
+        return super().iter_semester_archives(profile_id)
+
+    def iter_semester_archives_items(self, profile_id: str) -> Iterator[dict]:
+        """Attach the file of a profile, then iterate over it's exported archives."""
+        self.select_profile(profile_id)
+
+        return super().iter_semester_archives_items(profile_id)
+
+    def iter_profile_summaries(
+        self,
+        profile_id: Optional[str] = None,
+    ) -> Iterator[ProfileSummary]:
+        """Read the semesters totals of every profile from it's file."""
+        profiles_ids = (
+            (profile_id,)
+            if profile_id
+            else tuple(data.id for data in self.read_profiles_data())
+        )
+
+        selected_profile_id = self.profile_id
+        try:
+            for summary_profile_id in profiles_ids:
+                # The semesters are only found in the attached profile file.
+                self.select_profile(summary_profile_id)
+                yield from super().iter_profile_summaries(summary_profile_id)
+        finally:
+            if selected_profile_id:
+                self.select_profile(selected_profile_id)
+
+    def search_courses(
+        self,
+        text: str,
+        limit: int = 20,
+    ) -> tuple[CourseSearchResult, ...]:
+        """Search the courses of every profile file, then return the best of them."""
+        results: list[CourseSearchResult] = []
+
+        selected_profile_id = self.profile_id
+        try:
+            for profile_data in self.read_profiles_data():
+                # The full-text index is only found in the attached profile file.
+                self.select_profile(profile_data.id)
+                results.extend(super().search_courses(text, limit))
+        finally:
+            if selected_profile_id:
+                self.select_profile(selected_profile_id)
+
+        return tuple(sorted(results, key=attrgetter("rank"))[:limit])
+
+    def export_to_json(self, file_path: Path, *, compact: bool = False) -> None:
+        """Export every profile from it's file, then attach the selected one again."""
+        profile_id = self.profile_id
+        try:
+            super().export_to_json(file_path, compact=compact)
+        finally:
+            if profile_id:
+                self.select_profile(profile_id)
+
+    def import_profiles(
+        self,
+        profiles_items: Iterable[dict],
+        *,
+        replace: bool,
+    ) -> None:
+        """Insert every exported profile item to it's file in it's own transaction."""
+        profile_id = self.profile_id
+        try:
+            for profile_item in profiles_items:
+                # The file is attached first, that can't be done in a transaction.
+                self.select_profile(profile_item["profile_data"]["id"])
+                super().import_profiles((profile_item,), replace=replace)
+        finally:
+            if profile_id:
+                self.select_profile(profile_id)
+
+    def import_profile(
+        self,
+        cur: sqlite3.Cursor,
+        profile_item: dict,
+        *,
+        replace: bool,
+    ) -> None:
+        """Insert one exported profile item to the attached profile file."""
+        if replace:
+            # The semesters aren't deleted with the profile from the catalog.
+            cur.execute("DELETE FROM profile.semesters;")
+            cur.execute("DELETE FROM profile.semester_archives;")
+
+        super().import_profile(cur, profile_item, replace=replace)
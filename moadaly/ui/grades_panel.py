@@ -1,12 +1,13 @@
 """A Grades panel where you can create semesters, courses and insert the scores."""
 
 from gettext import gettext as _
-from typing import Optional
+from typing import Iterable, Optional
 from uuid import uuid4
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
 from moadaly import common_conversions
+from moadaly.database import CatalogCourseData, CourseData, SemesterArchiveData
 
 
 class GradesPanel(QtWidgets.QWidget):
@@ -20,6 +21,12 @@ class GradesPanel(QtWidgets.QWidget):
     course_name_updated = QtCore.Signal(str, str)
     course_score_updated = QtCore.Signal(str, float)
     course_credits_updated = QtCore.Signal(str, int)
+    course_names_requested = QtCore.Signal(str)
+    semesters_archived = QtCore.Signal(list, bool)
+    # The moved ID, (it's semester ID), and the ID after it, or None for the last.
+    semester_moved = QtCore.Signal(str, object)
+    course_moved = QtCore.Signal(str, str, object)
+    semester_archives_restored = QtCore.Signal(list)
 
     def __init__(self, parent_profile_id: str, point_scale: int) -> None:
         """Initialize base components of the panel."""
@@ -28,6 +35,12 @@ class GradesPanel(QtWidgets.QWidget):
         self.parent_profile_id = parent_profile_id
         self.point_scale = point_scale
 
+        # The suggested courses names of every course name completer, they are
+        # requested from the catalog while typing a name, see `set_course_names`.
+        self.course_names_model = QtCore.QStringListModel(self)
+        self.course_names_credit_units: dict[str, Optional[int]] = {}
+        self.completing_course_id: Optional[str] = None
+
         self.semesters: list[SemesterWidget] = []
 
         self.total_points = 0.0
@@ -35,6 +48,10 @@ class GradesPanel(QtWidgets.QWidget):
 
         self.panel_layout = QtWidgets.QVBoxLayout(self)
 
+        # The archived semesters are only shown as their totals, above the semesters.
+        self.semester_archives = SemesterArchivesWidget(self)
+        self.panel_layout.addWidget(self.semester_archives)
+
         self.scroll_area = QtWidgets.QScrollArea()
 
         add_semester_button = QtWidgets.QPushButton(
@@ -68,8 +85,9 @@ class GradesPanel(QtWidgets.QWidget):
 
     def calculate_panel(self) -> None:
         """Calculate the sum of the semesters points and credit units."""
-        self.total_points = 0.0
-        self.total_credits = 0
+        # The archived semesters are a part of the CGPA.
+        self.total_points = self.semester_archives.total_points
+        self.total_credits = self.semester_archives.total_credits
 
         for semester in self.semesters:
             self.total_points += semester.total_points.value()
@@ -83,11 +101,139 @@ class GradesPanel(QtWidgets.QWidget):
         semester = SemesterWidget(self, semester_id)
         semester.semester_calculation_updated.connect(self.calculate_panel)
         self.semesters.append(semester)
-        self.panel_layout.insertWidget(len(self.semesters) - 1, semester)
+        # The semesters are after the archived semesters widget.
+        self.panel_layout.insertWidget(len(self.semesters), semester)
 
         if not semester_id:
             self.semester_created.emit(semester.semester_id, self.parent_profile_id)
 
+    def update_semesters(
+        self,
+        courses_data: dict[str, tuple[CourseData, ...]],
+        semesters_ids: Iterable[str],
+        courses_ids: Iterable[str] = (),
+    ) -> None:
+        """Show the new courses data of some semesters, and of some courses."""
+        semesters_ids = set(semesters_ids)
+        for course_id in courses_ids:
+            # The semester of a deleted course is only known from it's widget.
+            if semester := self.get_course_semester(course_id):
+                semesters_ids.add(semester.semester_id)
+
+        for semester_id in semesters_ids:
+            semester = self.get_semester(semester_id)
+            if semester_id in courses_data:
+                if not semester:
+                    self.add_new_semester(semester_id)
+                    semester = self.semesters[-1]
+                semester.set_courses(courses_data[semester_id])
+            elif semester:
+                semester.remove_from_panel()
+
+        # The semesters may be moved too.
+        self.order_semesters(courses_data)
+
+    def order_semesters(self, semesters_ids: Iterable[str]) -> None:
+        """Order the semesters widgets like the semesters IDs, if they aren't."""
+        order = {semester_id: i for i, semester_id in enumerate(semesters_ids)}
+        semesters = sorted(
+            self.semesters,
+            key=lambda semester: order.get(semester.semester_id, len(order)),
+        )
+        if semesters == self.semesters:
+            return
+
+        self.semesters = semesters
+        for i, semester in enumerate(self.semesters):
+            # The semesters are after the archived semesters widget.
+            self.panel_layout.removeWidget(semester)
+            self.panel_layout.insertWidget(i + 1, semester)
+            semester.title.setText(_("<h2>Semester %d</h2>") % (i + 1))
+
+    def move_semester(self, semester: "SemesterWidget", offset: int) -> None:
+        """Move a semester widget up or down, then save it's new position."""
+        index = self.semesters.index(semester)
+        new_index = index + offset
+        if not 0 <= new_index < len(self.semesters):
+            return
+
+        self.semesters.insert(new_index, self.semesters.pop(index))
+        self.panel_layout.removeWidget(semester)
+        self.panel_layout.insertWidget(new_index + 1, semester)
+        # Only the titles of the moved semester and the one it passed are changed.
+        for i in (index, new_index):
+            self.semesters[i].title.setText(_("<h2>Semester %d</h2>") % (i + 1))
+
+        self.semester_moved.emit(
+            semester.semester_id,
+            self.semesters[new_index + 1].semester_id
+            if new_index + 1 < len(self.semesters)
+            else None,
+        )
+
+    def archive_semester(
+        self, semester: "SemesterWidget", *, keep_courses: bool
+    ) -> None:
+        """Replace a semester widget with it's totals in the archived semesters."""
+        self.semester_archives.set_archives(
+            (
+                *self.semester_archives.archives,
+                SemesterArchiveData(
+                    semester.semester_id,
+                    semester.total_points.value(),
+                    semester.total_credits.value(),
+                    len(semester.courses),
+                    keep_courses,
+                ),
+            ),
+        )
+        semester.remove_from_panel()
+        self.semesters_archived.emit([semester.semester_id], keep_courses)
+
+    def get_semester(self, semester_id: str) -> Optional["SemesterWidget"]:
+        """Return the semester widget of a semester ID, if it's in the panel."""
+        for semester in self.semesters:
+            if semester.semester_id == semester_id:
+                return semester
+
+        return None
+
+    def request_course_names(self, course_id: str, prefix: str) -> None:
+        """Ask for the catalog courses names starting with the typed name."""
+        self.completing_course_id = course_id
+        self.course_names_requested.emit(prefix)
+
+    def set_course_names(self, catalog_courses: Iterable[CatalogCourseData]) -> None:
+        """Suggest the catalog courses names to the course being typed."""
+        self.course_names_credit_units = {
+            catalog_course.name: catalog_course.credit_units
+            for catalog_course in catalog_courses
+        }
+        self.course_names_model.setStringList(list(self.course_names_credit_units))
+
+        # Show the new suggestions, if the course name is still being typed.
+        if (
+            self.completing_course_id
+            and (course := self.get_course(self.completing_course_id))
+            and course.name.hasFocus()
+        ):
+            course.name_completer.complete()
+
+    def get_course(self, course_id: str) -> Optional["CourseWidget"]:
+        """Return the course widget of a course ID, if it's in the panel."""
+        for semester in self.semesters:
+            for course in semester.courses:
+                if course.course_id == course_id:
+                    return course
+
+        return None
+
+    def get_course_semester(self, course_id: str) -> Optional["SemesterWidget"]:
+        """Return the semester widget that has a course ID, if it's in the panel."""
+        course = self.get_course(course_id)
+
+        return course.parent_semester if course else None
+
 
 class SemesterWidget(QtWidgets.QWidget):
     """A semester that contain a list of corses, to be added to the grades panel."""
@@ -140,6 +286,33 @@ class SemesterWidget(QtWidgets.QWidget):
         delete_semester_button.clicked.connect(self.delete_semester)
         title_layout.addWidget(delete_semester_button)
 
+        archive_semester_button = QtWidgets.QPushButton(
+            QtGui.QIcon().fromTheme("archive-insert"),
+            "",
+        )
+        archive_semester_button.setToolTip(_("Archive Semester"))
+        archive_semester_button.setFixedSize(35, 35)
+        archive_semester_button.clicked.connect(self.archive_semester)
+        title_layout.addWidget(archive_semester_button)
+
+        for icon, tool_tip, offset in (
+            ("go-up", _("Move Semester Up"), -1),
+            ("go-down", _("Move Semester Down"), 1),
+        ):
+            move_semester_button = QtWidgets.QPushButton(
+                QtGui.QIcon().fromTheme(icon),
+                "",
+            )
+            move_semester_button.setToolTip(tool_tip)
+            move_semester_button.setFixedSize(35, 35)
+            move_semester_button.clicked.connect(
+                lambda _checked=None, _offset=offset: self.parent_panel.move_semester(
+                    self,
+                    _offset,
+                ),
+            )
+            title_layout.addWidget(move_semester_button)
+
         self.semester_layout.addLayout(title_layout)
 
         #  TODO: Create a header for the courses.
@@ -237,18 +410,52 @@ class SemesterWidget(QtWidgets.QWidget):
         )
 
         if confirm_dialog.exec() == QtWidgets.QMessageBox.Yes:
-            self.parent_panel.semesters.pop(semester_index)
-            self.deleteLater()
+            self.remove_from_panel()
+            self.parent_panel.semester_deleted.emit(self.semester_id)
 
-            for i in range(semester_index, len(self.parent_panel.semesters)):
-                self.parent_panel.semesters[i].title.setText(
-                    _("<h2>Semester %d</h2>") % (i + 1),
-                )
+    def archive_semester(self) -> None:
+        """Confirm then replace the semester with it's totals."""
+        semester_index = self.parent_panel.semesters.index(self)
 
-            # Send signal to recalculate panel.
-            # FIX: If it is the last semester in the panel, results not be updated.
-            self.semester_calculation_updated.emit()
-            self.parent_panel.semester_deleted.emit(self.semester_id)
+        confirm_dialog = QtWidgets.QMessageBox(
+            QtWidgets.QMessageBox.Icon.Question,
+            _("Archive Semester | Moadaly"),
+            _("Do you want to archive <b>Semester %d</b>?") % (semester_index + 1),
+            buttons=QtWidgets.QMessageBox.StandardButton.Yes
+            | QtWidgets.QMessageBox.StandardButton.No,
+        )
+        confirm_dialog.setInformativeText(
+            _(
+                "It's courses will be hidden and can't be changed, "
+                "only it's points and credit units are kept in the CGPA.",
+            ),
+        )
+        keep_courses_check_box = QtWidgets.QCheckBox(
+            _("Keep the courses, to restore the semester later"),
+        )
+        keep_courses_check_box.setChecked(True)
+        confirm_dialog.setCheckBox(keep_courses_check_box)
+
+        if confirm_dialog.exec() == QtWidgets.QMessageBox.StandardButton.Yes:
+            self.parent_panel.archive_semester(
+                self,
+                keep_courses=keep_courses_check_box.isChecked(),
+            )
+
+    def remove_from_panel(self) -> None:
+        """Remove the semester widget from the grades panel, the data aren't deleted."""
+        semester_index = self.parent_panel.semesters.index(self)
+        self.parent_panel.semesters.pop(semester_index)
+        self.deleteLater()
+
+        for i in range(semester_index, len(self.parent_panel.semesters)):
+            self.parent_panel.semesters[i].title.setText(
+                _("<h2>Semester %d</h2>") % (i + 1),
+            )
+
+        # Send signal to recalculate panel.
+        # FIX: If it is the last semester in the panel, results not be updated.
+        self.semester_calculation_updated.emit()
 
     def add_new_course(
         self,
@@ -276,6 +483,111 @@ class SemesterWidget(QtWidgets.QWidget):
         if course_credit_units:
             course.credit.setValue(course_credit_units)
 
+    def move_course(self, course: "CourseWidget", offset: int) -> None:
+        """Move a course widget up or down, then save it's new position."""
+        index = self.courses.index(course)
+        new_index = index + offset
+        if not 0 <= new_index < len(self.courses):
+            return
+
+        self.courses.insert(new_index, self.courses.pop(index))
+        # The courses are after the title and the headers layouts.
+        self.semester_layout.removeWidget(course)
+        self.semester_layout.insertWidget(new_index + 2, course)
+        # Only the titles of the moved course and the one it passed are changed.
+        for i in (index, new_index):
+            self.courses[i].title.setText(_("<h4>Course %d</h4>") % (i + 1))
+
+        self.parent_panel.course_moved.emit(
+            course.course_id,
+            self.semester_id,
+            self.courses[new_index + 1].course_id
+            if new_index + 1 < len(self.courses)
+            else None,
+        )
+
+    def set_courses(self, courses_data: Iterable[CourseData]) -> None:
+        """Replace the courses widgets with new ones of the courses data."""
+        for course in self.courses:
+            course.deleteLater()
+        self.courses.clear()
+
+        for course_data in courses_data:
+            self.add_new_course(
+                course_data.id,
+                course_data.name,
+                course_data.score,
+                course_data.credit_units,
+            )
+
+        self.calculate_semester()
+
+
+class SemesterArchivesWidget(QtWidgets.QWidget):
+    """The totals of the archived semesters, it's hidden when there is none."""
+
+    def __init__(self, parent_panel: GradesPanel) -> None:
+        """Initialize the archived semesters totals components."""
+        super().__init__()
+
+        self.parent_panel = parent_panel
+        self.archives: tuple[SemesterArchiveData, ...] = ()
+        self.total_points = 0.0
+        self.total_credits = 0
+
+        archives_layout = QtWidgets.QHBoxLayout(self)
+
+        self.title = QtWidgets.QLabel()
+        self.title.setFixedHeight(35)
+        archives_layout.addWidget(self.title)
+
+        archives_layout.addStretch()
+
+        self.totals = QtWidgets.QLabel()
+        archives_layout.addWidget(self.totals)
+
+        archives_layout.addStretch()
+
+        self.restore_button = QtWidgets.QPushButton(
+            QtGui.QIcon().fromTheme("archive-extract"),
+            _("Restore Semesters"),
+        )
+        self.restore_button.setToolTip(
+            _("Restore the archived semesters that their courses were kept"),
+        )
+        self.restore_button.clicked.connect(self.restore_archives)
+        archives_layout.addWidget(self.restore_button)
+
+        self.hide()
+
+    def set_archives(self, archives: Iterable[SemesterArchiveData]) -> None:
+        """Show the totals of the archived semesters."""
+        self.archives = tuple(archives)
+        self.total_points = sum(archive.points for archive in self.archives)
+        self.total_credits = sum(archive.credit_units for archive in self.archives)
+
+        self.title.setText(
+            _("<h3>%d Archived Semesters</h3>") % len(self.archives),
+        )
+        self.totals.setText(
+            _("%d courses, %d credit units, %.3f points")
+            % (
+                sum(archive.courses_count for archive in self.archives),
+                self.total_credits,
+                self.total_points,
+            ),
+        )
+        self.restore_button.setEnabled(
+            any(archive.restorable for archive in self.archives),
+        )
+        self.setVisible(bool(self.archives))
+
+    def restore_archives(self) -> None:
+        """Ask to restore the archived semesters that their courses were kept."""
+        self.parent_panel.semester_archives_restored.emit(
+            [archive.id for archive in self.archives if archive.restorable],
+        )
+
 
 class CourseWidget(QtWidgets.QWidget):
     """A course that can be added inside a semester."""
@@ -303,8 +615,20 @@ class CourseWidget(QtWidgets.QWidget):
 
         self.name = QtWidgets.QLineEdit()
         self.name.textChanged.connect(self.name_changed)
+        self.name.textEdited.connect(self.name_edited)
         self.course_layout.addWidget(self.name)
 
+        # Suggest the names of the catalog, they are only read while typing.
+        self.name_completer = QtWidgets.QCompleter(
+            self.parent_semester.parent_panel.course_names_model,
+            self,
+        )
+        self.name_completer.setCaseSensitivity(
+            QtCore.Qt.CaseSensitivity.CaseInsensitive
+        )
+        self.name_completer.activated.connect(self.name_completed)
+        self.name.setCompleter(self.name_completer)
+
         self.score = QtWidgets.QDoubleSpinBox()
         # TODO: Change range accourding to the selected calculation system.
         self.score.setRange(0.0, 100.0)
@@ -340,6 +664,24 @@ class CourseWidget(QtWidgets.QWidget):
         self.delete_course_button.clicked.connect(self.delete_course)
         self.course_layout.addWidget(self.delete_course_button)
 
+        for icon, tool_tip, offset in (
+            ("go-up", _("Move Course Up"), -1),
+            ("go-down", _("Move Course Down"), 1),
+        ):
+            move_course_button = QtWidgets.QPushButton(
+                QtGui.QIcon().fromTheme(icon),
+                "",
+            )
+            move_course_button.setToolTip(tool_tip)
+            move_course_button.setFixedSize(30, 30)
+            move_course_button.clicked.connect(
+                lambda _checked=None, _offset=offset: self.parent_semester.move_course(
+                    self,
+                    _offset,
+                ),
+            )
+            self.course_layout.addWidget(move_course_button)
+
     def update_points(self) -> None:
         """Update the points when the score or the credit units are changed."""
         self.points.setValue(
@@ -383,6 +725,22 @@ class CourseWidget(QtWidgets.QWidget):
             self.name.text(),
         )
 
+    def name_edited(self, name: str) -> None:
+        """Ask for the catalog names starting with the typed name."""
+        if name:
+            self.parent_semester.parent_panel.request_course_names(
+                self.course_id,
+                name,
+            )
+
+    def name_completed(self, name: str) -> None:
+        """Use the usual credit units of a chosen catalog name, if there are none."""
+        credit_units = self.parent_semester.parent_panel.course_names_credit_units.get(
+            name,
+        )
+        if credit_units and not self.credit.value():
+            self.credit.setValue(credit_units)
+
     def grade_changed(self) -> None:
         """Change the score when the grade is changed."""
         try:
@@ -1,14 +1,26 @@
 """Main file for the GUI."""
 
 import gettext
+from functools import partial
 from html import escape as html_escape
-from typing import Sequence
+from os import environ
+from typing import TYPE_CHECKING, Optional, Sequence, Union
 from webbrowser import open as open_url
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
 from moadaly.__about__ import APP_ID, BUG_REPORT_URL, PROJECT_HOME_PAGE_URL
-from moadaly.database import Database
+from moadaly.database import (
+    CourseData,
+    Database,
+    ExternalChanges,
+    ProfileData,
+    ProfilesPage,
+    SemesterArchiveData,
+    get_backup_dir,
+)
+from moadaly.database_service import DatabaseService
+from moadaly.sharded_database import ShardedDatabase
 from moadaly.ui import (
     calculation_system_options_box,
     grades_panel,
@@ -19,16 +31,32 @@ from moadaly.ui import (
 )
 from moadaly.ui.extra_tools import extra_tools_classes
 
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
 # TODO: Configure it to use the "/usr/share/locale" directory.
 gettext.bindtextdomain("moadaly", "locale")
 gettext.textdomain("moadaly")
 _ = gettext.gettext
 
+# The most recently selected profiles shown in the "change profile" menu, the others
+# are found by their names.
+PROFILES_MENU_SIZE = 20
+PROFILES_PAGE_SIZE = 50
+
+# The milliseconds without changing the courses before tidying the database.
+MAINTENANCE_IDLE_TIME = 5 * 60 * 1000
+
 
 class MainWindow(QtWidgets.QMainWindow):
     """Main window."""
 
     window_resized = QtCore.Signal(tuple)
+    # Those are emitted from the database thread, Qt will queue them to this thread.
+    profile_data_loaded = QtCore.Signal(object)
+    external_changes_read = QtCore.Signal(object)
+    course_names_read = QtCore.Signal(object)
+    database_error_raised = QtCore.Signal(object)
 
     def __init__(self) -> None:
         """Initialize main components of the window."""
@@ -39,7 +67,53 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setWindowTitle(_("Moadaly"))
         self.setWindowIcon(QtGui.QIcon.fromTheme(APP_ID))
 
-        self.database = Database()
+        # The database runs in it's own thread, with one tuned connection open while
+        # the app is running, so the window never waits for the disk.
+        # Every profile is saved in it's own file when MOADALY_PROFILE_FILES is set,
+        # then only the file of the selected profile is opened.
+        self.database = DatabaseService(
+            persistent=True,
+            on_error=self.database_error_raised.emit,
+            database_class=(
+                ShardedDatabase if environ.get("MOADALY_PROFILE_FILES") else Database
+            ),
+        )
+        if application := QtWidgets.QApplication.instance():
+            application.aboutToQuit.connect(self.database.close)
+        self.database_error_raised.connect(self.show_database_error)
+        self.profile_data_loaded.connect(self.show_data)
+        self.external_changes_read.connect(self.show_external_changes)
+        self.course_names_read.connect(self.show_course_names)
+
+        # Courses updates are queued, then written together when this timer ends.
+        self.course_updates_timer = QtCore.QTimer(self)
+        self.course_updates_timer.setSingleShot(True)
+        self.course_updates_timer.setInterval(500)
+        self.course_updates_timer.timeout.connect(
+            partial(self.database.submit, Database.flush_course_updates),
+        )
+
+        # Back up the database every 15 minutes, the backups run in their own thread.
+        self.backup_timer = QtCore.QTimer(self)
+        self.backup_timer.setInterval(15 * 60 * 1000)
+        self.backup_timer.timeout.connect(self.database.backup)
+        self.backup_timer.start()
+
+        # Update the query planner statistics and release the empty pages when the
+        # app is idle, it's restarted by every course update.
+        self.maintenance_timer = QtCore.QTimer(self)
+        self.maintenance_timer.setInterval(MAINTENANCE_IDLE_TIME)
+        self.maintenance_timer.timeout.connect(
+            partial(self.database.submit, Database.run_maintenance),
+        )
+        self.maintenance_timer.start()
+
+        # Look for the changes of the other windows, only the data version is read
+        # until one of them commits.
+        self.external_changes_timer = QtCore.QTimer(self)
+        self.external_changes_timer.setInterval(2000)
+        self.external_changes_timer.timeout.connect(self.check_external_changes)
+        self.external_changes_timer.start()
 
         main_window_layout = QtWidgets.QVBoxLayout()
 
@@ -95,22 +169,131 @@ class MainWindow(QtWidgets.QMainWindow):
             + self.previous_cgpa_box.previous_credit.value(),
         )
 
+    @staticmethod
+    def read_profile_data(
+        database: Database,
+    ) -> tuple[
+        ProfileData,
+        ProfilesPage,
+        dict[str, tuple[CourseData, ...]],
+        tuple[SemesterArchiveData, ...],
+        dict[str, float],
+    ]:
+        """Read the current profile, the recent profiles, the courses and the CGPAs."""
+        # Everything is read again, so the earlier external changes are skipped.
+        database.get_external_changes()
+        current_profile_data = database.get_current_profile_data()
+
+        return (
+            current_profile_data,
+            database.get_profiles_page(limit=PROFILES_MENU_SIZE),
+            database.get_courses_data(current_profile_data.id),
+            database.get_semester_archives(current_profile_data.id),
+            database.get_profiles_cgpa(),
+        )
+
     def load_data(self) -> None:
         """
         Load data from the database then push them to the UI.
 
         It will run after starting the app,
         when switching profiles and deleting or creating them.
+        The data are read in the database thread, then `show_data` is called.
         """
-        self.current_profile_data = self.database.get_current_profile_data()
+        self.database.submit(self.read_profile_data).add_done_callback(
+            self.profile_data_loaded.emit,
+        )
+
+    @staticmethod
+    def read_external_changes(
+        database: Database,
+        profile_id: str,
+    ) -> tuple[
+        str,
+        Optional[ExternalChanges],
+        Optional[dict[str, tuple[CourseData, ...]]],
+    ]:
+        """Read the changes of the other windows, and the courses if they changed."""
+        # Our queued updates are written first, so they aren't shown as lost.
+        database.flush_course_updates()
+        changes = database.get_external_changes()
+
+        if (
+            not changes
+            or changes.profiles
+            or not (changes.semesters or changes.courses)
+        ):
+            return profile_id, changes, None
+
+        return profile_id, changes, database.get_courses_data(profile_id)
+
+    def check_external_changes(self) -> None:
+        """Read the changes of the other windows, then `show_external_changes`."""
+        if not hasattr(self, "grades_panel"):
+            return
+
+        self.database.submit(
+            self.read_external_changes,
+            self.grades_panel.parent_profile_id,
+        ).add_done_callback(self.external_changes_read.emit)
+
+    def show_external_changes(self, future: "Future") -> None:
+        """Update only the semesters changed by another window."""
+        if future.exception():
+            return
+
+        profile_id, changes, courses_data = future.result()
+        if (
+            not changes
+            or not hasattr(self, "grades_panel")
+            # Another profile was loaded while reading the changes.
+            or profile_id != self.grades_panel.parent_profile_id
+        ):
+            return
+
+        if changes.profiles or changes.semester_archives:
+            # The profiles are in the menu and the settings, and the archives totals
+            # are only read with the profile, load everything again.
+            self.load_data()
+            return
+
+        if courses_data is None:
+            return
+
+        # Don't write the shown data back to the database.
+        self.grades_panel.blockSignals(True)  # noqa: FBT003
+        try:
+            self.grades_panel.update_semesters(
+                courses_data,
+                changes.semesters,
+                changes.courses,
+            )
+        finally:
+            self.grades_panel.blockSignals(False)  # noqa: FBT003
+
+        self.grades_panel.calculate_panel()
+
+    def show_data(self, future: "Future") -> None:
+        """Push the data loaded from the database to the UI."""
+        if future.exception():
+            # It was already reported by the database service.
+            return
+
+        (
+            self.current_profile_data,
+            profiles_page,
+            courses_data,
+            semester_archives,
+            profiles_cgpa,
+        ) = future.result()
 
         # Delete all the actions in the "change profile" menu.
         for action in self.change_profile_menu.actions():
             action.deleteLater()
 
-        # Add every available profiles to the "change profile" menu as an action.
-        # Exclude the first item, which is the current profile.
-        for profile in self.database.get_profiles_data():
+        # Add the recently selected profiles to the "change profile" menu as actions.
+        # The current profile is disabled, it's the most recently selected.
+        for profile in profiles_page.profiles:
             # Create a pixmap with the profile color, to be used as an icon.
             pixmap = QtGui.QPixmap(16, 16)
             # No need for converting to QtGui.QColor; it accepts hex RBG color string.
@@ -121,17 +304,29 @@ class MainWindow(QtWidgets.QMainWindow):
                 profile.name,
                 self,
             )
+            # The CGPA is read from the profile totals, without loading it's courses.
+            select_profile_action.setToolTip(
+                _("CGPA: %.3f") % profiles_cgpa.get(profile.id, 0.0),
+            )
             select_profile_action.triggered.connect(
-                lambda _checked=None,
-                _id=profile.id: self.database.update_profile_selected_time(_id),
+                lambda _checked=None, _id=profile.id: self.select_profile(_id),
             )
-            select_profile_action.triggered.connect(self.load_data)
 
             if profile.id == self.current_profile_data.id:
                 select_profile_action.setDisabled(True)
 
             self.change_profile_menu.addAction(select_profile_action)
 
+        # The other profiles aren't read, they are found by their names.
+        if profiles_page.next_page is not None:
+            self.change_profile_menu.addSeparator()
+            find_profile_action = QtGui.QAction(
+                _("&Find Profile... (%d profiles)") % profiles_page.total_count,
+                self,
+            )
+            find_profile_action.triggered.connect(self.find_profile)
+            self.change_profile_menu.addAction(find_profile_action)
+
         # Fill the calculation system settings.
         self.calculation_system_box.point_scale_button_group.button(
             self.current_profile_data.point_scale,
@@ -167,23 +362,58 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Listen to the grades panel signals.
         self.grades_panel.panel_calculation_changed.connect(self.update_results)
-        self.grades_panel.semester_created.connect(self.database.create_new_semester)
-        self.grades_panel.semester_deleted.connect(self.database.delete_semester)
-        self.grades_panel.course_created.connect(self.database.create_new_course)
-        self.grades_panel.course_deleted.connect(self.database.delete_course)
-        self.grades_panel.course_name_updated.connect(self.database.update_course_name)
+        self.grades_panel.semester_created.connect(
+            partial(self.database.submit, Database.create_new_semester),
+        )
+        self.grades_panel.semester_deleted.connect(
+            partial(self.database.submit, Database.delete_semester),
+        )
+        self.grades_panel.course_created.connect(
+            partial(self.database.submit, Database.create_new_course),
+        )
+        self.grades_panel.course_deleted.connect(
+            partial(self.database.submit, Database.delete_course),
+        )
+        self.grades_panel.course_name_updated.connect(
+            lambda course_id, name: self.queue_course_update(course_id, "name", name),
+        )
         self.grades_panel.course_score_updated.connect(
-            self.database.update_course_score,
+            lambda course_id, score: self.queue_course_update(
+                course_id,
+                "score",
+                score,
+            ),
+        )
+        self.grades_panel.course_names_requested.connect(self.read_course_names)
+        self.grades_panel.semesters_archived.connect(
+            lambda semesters_ids, keep_courses: self.database.submit(
+                lambda database: database.archive_semesters(
+                    semesters_ids,
+                    keep_courses=keep_courses,
+                ),
+            ),
+        )
+        self.grades_panel.semester_moved.connect(
+            partial(self.database.submit, Database.move_semester),
+        )
+        self.grades_panel.course_moved.connect(
+            partial(self.database.submit, Database.move_course),
+        )
+        self.grades_panel.semester_archives_restored.connect(
+            self.restore_semester_archives,
         )
         self.grades_panel.course_credits_updated.connect(
-            self.database.update_course_credit_units,
+            lambda course_id, credit_units: self.queue_course_update(
+                course_id,
+                "credit_units",
+                credit_units,
+            ),
         )
 
-        for semester_id, courses_data in self.database.get_courses_data(
-            self.current_profile_data.id,
-        ).items():
+        self.grades_panel.semester_archives.set_archives(semester_archives)
+        for semester_id, semester_courses_data in courses_data.items():
             self.grades_panel.add_new_semester(semester_id)
-            for course_data in courses_data:
+            for course_data in semester_courses_data:
                 self.grades_panel.semesters[-1].add_new_course(
                     course_data.id,
                     course_data.name,
@@ -191,8 +421,22 @@ class MainWindow(QtWidgets.QMainWindow):
                     course_data.credit_units,
                 )
 
-        # Close the database, since function used here don't close it.
-        self.database.close()
+        # Commit, since function used here don't release the connection.
+        self.database.submit(Database.commit)
+
+    def queue_course_update(
+        self,
+        course_id: str,
+        column: str,
+        value: Union[str, float],
+    ) -> None:
+        """Queue a course update, and make sure it will be written soon."""
+        self.database.submit(Database.queue_course_update, course_id, column, value)
+
+        # Not restarting an active timer, so updates never wait more than it's interval.
+        if not self.course_updates_timer.isActive():
+            self.course_updates_timer.start()
+        self.maintenance_timer.start()
 
     def create_menu_bar(self) -> None:
         """Create all the menu bar components and actions."""
@@ -205,6 +449,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.change_profile_menu.setIcon(
             QtGui.QIcon().fromTheme("system-switch-user-symbolic"),
         )
+        self.change_profile_menu.setToolTipsVisible(True)
 
         profile_menu.addMenu(self.change_profile_menu)
 
@@ -218,6 +463,15 @@ class MainWindow(QtWidgets.QMainWindow):
         new_profile_action.triggered.connect(self.create_new_profile)
         profile_menu.addAction(new_profile_action)
 
+        # Action to copy the current profile, to try other grades on the copy.
+        clone_profile_action = QtGui.QAction(
+            QtGui.QIcon().fromTheme("edit-copy"),
+            _("Du&plicate Current Profile"),
+            self,
+        )
+        clone_profile_action.triggered.connect(self.clone_profile)
+        profile_menu.addAction(clone_profile_action)
+
         # Action to delete current profile.
         delete_current_profile_action = QtGui.QAction(
             QtGui.QIcon().fromTheme("delete"),
@@ -245,11 +499,28 @@ class MainWindow(QtWidgets.QMainWindow):
             self,
         )
         import_action.setShortcut("Ctrl+I")
-        # import_action.triggered.connect()  # noqa: ERA001
-        # TODO: Enable when the import functionality get implemented.
-        import_action.setDisabled(True)
+        import_action.triggered.connect(self.import_data_file)
         profile_menu.addAction(import_action)
 
+        # Action to restore the database from a backup.
+        restore_backup_action = QtGui.QAction(
+            QtGui.QIcon().fromTheme("document-revert"),
+            _("&Restore Backup"),
+            self,
+        )
+        restore_backup_action.triggered.connect(self.restore_backup_file)
+        profile_menu.addAction(restore_backup_action)
+
+        # Action to release the space of the deleted data, the maintenance only
+        # releases it from the big files created by the older versions this way.
+        compact_database_action = QtGui.QAction(
+            QtGui.QIcon().fromTheme("edit-clear-all"),
+            _("Co&mpact Database"),
+            self,
+        )
+        compact_database_action.triggered.connect(self.compact_database)
+        profile_menu.addAction(compact_database_action)
+
         # Action to exit the application.
         exit_action = QtGui.QAction(
             QtGui.QIcon().fromTheme("application-exit"),
@@ -306,12 +577,68 @@ class MainWindow(QtWidgets.QMainWindow):
         new_profile_dialog = manage_profiles_dialogs.NewProfileDialog()
 
         new_profile_dialog.new_profile_creation.connect(
-            self.database.create_new_profile,
+            partial(self.database.submit, Database.create_new_profile),
         )
 
         if new_profile_dialog.exec():
             self.load_data()
 
+    def clone_profile(self) -> None:
+        """Ask for a name, then copy the current profile and switch to the copy."""
+        profile_name, accepted = QtWidgets.QInputDialog.getText(
+            self,
+            _("Duplicate Profile | Moadaly"),
+            _("Profile Name"),
+            text=_("%s (Copy)") % self.current_profile_data.name,
+        )
+        if accepted:
+            self.database.submit(
+                Database.clone_profile,
+                self.current_profile_data.id,
+                profile_name,
+            )
+            self.load_data()
+
+    def restore_semester_archives(self, semesters_ids: list[str]) -> None:
+        """Restore archived semesters, then load them with their courses."""
+        self.database.submit(Database.restore_semester_archives, semesters_ids)
+        self.load_data()
+
+    def select_profile(self, profile_id: str) -> None:
+        """Switch to another profile, then load it's data."""
+        self.database.submit(Database.update_profile_selected_time, profile_id)
+        self.load_data()
+
+    def find_profile(self) -> None:
+        """Show the dialog to find a profile by it's name, and switch to it."""
+        find_profile_dialog = manage_profiles_dialogs.FindProfileDialog(
+            self.current_profile_data.id,
+        )
+        find_profile_dialog.profiles_page_requested.connect(
+            lambda name_prefix, after: self.database.submit(
+                self.read_profiles_page,
+                name_prefix,
+                after,
+            ).add_done_callback(find_profile_dialog.profiles_page_read.emit),
+        )
+        find_profile_dialog.profile_selected.connect(self.select_profile)
+
+        find_profile_dialog.request_profiles()
+        find_profile_dialog.exec()
+
+    @staticmethod
+    def read_profiles_page(
+        database: Database,
+        name_prefix: str,
+        after: Optional[tuple[float, str]],
+    ) -> tuple[str, ProfilesPage]:
+        """Read a page of the profiles with names starting with a prefix."""
+        return name_prefix, database.get_profiles_page(
+            name_prefix=name_prefix,
+            after=after,
+            limit=PROFILES_PAGE_SIZE,
+        )
+
     def delete_profile(self) -> None:
         """Show a warning message, then delete the profile from the database."""
         confirm_dialog = QtWidgets.QMessageBox(
@@ -332,7 +659,7 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if confirm_dialog.exec() == QtWidgets.QMessageBox.Yes:
-            self.database.delete_profile(self.current_profile_data.id)
+            self.database.submit(Database.delete_profile, self.current_profile_data.id)
             self.load_data()
 
     def export_data_file(self) -> None:
@@ -346,7 +673,65 @@ class MainWindow(QtWidgets.QMainWindow):
         )[0]
 
         if file_path:
-            self.database.export_to_json(file_path)
+            self.database.submit(Database.export_to_json, file_path)
+
+    def import_data_file(self) -> None:
+        """Get a json file from the user then import it's data."""
+        file_path = QtWidgets.QFileDialog.getOpenFileName(
+            self,
+            "Open Moadaly Data File",
+            "~/",
+            "JSON file (*.json)",
+        )[0]
+
+        if file_path:
+            # Errors of invalid files are shown by `show_database_error`.
+            self.database.submit(Database.import_from_json, file_path)
+            self.load_data()
+
+    def restore_backup_file(self) -> None:
+        """Get a backup file from the user then replace the database with it."""
+        file_path = QtWidgets.QFileDialog.getOpenFileName(
+            self,
+            "Open Moadaly Backup File",
+            str(get_backup_dir(self.database.database_file)),
+            "SQLite database (*.sqlite3)",
+        )[0]
+
+        if file_path and (
+            QtWidgets.QMessageBox.question(
+                self,
+                _("Restore Backup | Moadaly"),
+                _("All the changes made after this backup will be lost, continue?"),
+            )
+            == QtWidgets.QMessageBox.StandardButton.Yes
+        ):
+            self.database.submit(Database.restore_backup, file_path)
+            self.load_data()
+
+    def compact_database(self) -> None:
+        """Release the space of the deleted data from the database files."""
+        self.database.submit(Database.compact_database)
+
+    def read_course_names(self, prefix: str) -> None:
+        """Read the catalog courses names starting with a prefix, to suggest them."""
+        self.database.submit(
+            Database.search_course_catalog,
+            prefix,
+        ).add_done_callback(self.course_names_read.emit)
+
+    def show_course_names(self, future: "Future") -> None:
+        """Suggest the catalog courses names read from the database."""
+        if not future.exception() and hasattr(self, "grades_panel"):
+            self.grades_panel.set_course_names(future.result())
+
+    def show_database_error(self, error: Exception) -> None:
+        """Show errors raised by the database operations."""
+        QtWidgets.QMessageBox.warning(
+            self,
+            _("Database Error | Moadaly"),
+            html_escape(str(error)),
+        )
 
     def apply_point_scale_config(
         self,
@@ -358,7 +743,8 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if new_point_scale != self.current_profile_data.point_scale:
-            self.database.change_point_scale(
+            self.database.submit(
+                Database.change_point_scale,
                 self.current_profile_data.id,
                 new_point_scale,
             )
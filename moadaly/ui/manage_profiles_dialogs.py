@@ -2,10 +2,14 @@
 
 from gettext import gettext as _
 from random import randint
+from typing import TYPE_CHECKING, Optional
 from uuid import uuid4
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
 
 class NewProfileDialog(QtWidgets.QDialog):
     """A dialog to create new profile."""
@@ -129,3 +133,104 @@ class ProfileColorButton(QtWidgets.QPushButton):
             self.set_color(self._default)
 
         return super().mousePressEvent(e)
+
+
+class FindProfileDialog(QtWidgets.QDialog):
+    """A dialog to find a profile by it's name, and switch to it."""
+
+    # The name prefix and the `next_page` key of the shown page, to read the next.
+    profiles_page_requested = QtCore.Signal(str, object)
+    profile_selected = QtCore.Signal(str)
+    # Emitted from the database thread with the page future, queued to this thread.
+    profiles_page_read = QtCore.Signal(object)
+
+    def __init__(self, current_profile_id: str) -> None:
+        """Initialize main components of the dialog."""
+        super().__init__()
+
+        self.setWindowTitle(_("Find Profile | Moadaly"))
+        self.current_profile_id = current_profile_id
+        self.next_page: Optional[tuple[float, str]] = None
+        self.profiles_page_read.connect(self.show_profiles_page)
+
+        layout = QtWidgets.QVBoxLayout(self)
+
+        self.profile_name = QtWidgets.QLineEdit()
+        self.profile_name.setPlaceholderText(_("Profile Name"))
+        self.profile_name.textChanged.connect(self.request_profiles)
+        layout.addWidget(self.profile_name)
+
+        self.profiles_list = QtWidgets.QListWidget()
+        self.profiles_list.itemActivated.connect(self.select_profile)
+        layout.addWidget(self.profiles_list)
+
+        self.profiles_count = QtWidgets.QLabel()
+        layout.addWidget(self.profiles_count)
+
+        buttons_layout = QtWidgets.QHBoxLayout()
+        layout.addLayout(buttons_layout)
+
+        self.more_profiles_button = QtWidgets.QPushButton(_("More Profiles"))
+        self.more_profiles_button.setDisabled(True)
+        self.more_profiles_button.clicked.connect(self.request_more_profiles)
+        buttons_layout.addWidget(self.more_profiles_button)
+
+        switch_profile_button = QtWidgets.QPushButton(_("Switch Profile"))
+        switch_profile_button.clicked.connect(
+            lambda: self.select_profile(self.profiles_list.currentItem()),
+        )
+        buttons_layout.addWidget(switch_profile_button)
+
+        cancel_operation_button = QtWidgets.QPushButton(_("Cancel"))
+        cancel_operation_button.clicked.connect(self.cancel_operation)
+        buttons_layout.addWidget(cancel_operation_button)
+
+    def request_profiles(self) -> None:
+        """Request the first page of the profiles with the typed name."""
+        self.profiles_list.clear()
+        self.more_profiles_button.setDisabled(True)
+        self.profiles_page_requested.emit(self.profile_name.text(), None)
+
+    def request_more_profiles(self) -> None:
+        """Request the page after the shown profiles."""
+        self.more_profiles_button.setDisabled(True)
+        self.profiles_page_requested.emit(self.profile_name.text(), self.next_page)
+
+    def show_profiles_page(self, future: "Future") -> None:
+        """Add a page of the profiles read from the database to the list."""
+        if future.exception():
+            return
+
+        name_prefix, page = future.result()
+        # The name was changed while reading the page, another one was requested.
+        if name_prefix != self.profile_name.text():
+            return
+
+        for profile in page.profiles:
+            # Create a pixmap with the profile color, to be used as an icon.
+            pixmap = QtGui.QPixmap(16, 16)
+            pixmap.fill(profile.color)
+
+            item = QtWidgets.QListWidgetItem(QtGui.QIcon(pixmap), profile.name)
+            item.setData(QtCore.Qt.ItemDataRole.UserRole, profile.id)
+            if profile.id == self.current_profile_id:
+                item.setFlags(QtCore.Qt.ItemFlag.NoItemFlags)
+            self.profiles_list.addItem(item)
+
+        self.profiles_count.setText(
+            _("%d of %d profiles") % (self.profiles_list.count(), page.total_count),
+        )
+        self.next_page = page.next_page
+        self.more_profiles_button.setDisabled(page.next_page is None)
+
+    def select_profile(self, item: Optional[QtWidgets.QListWidgetItem]) -> None:
+        """Switch to the profile of an item, then close the dialog."""
+        if item is None or not item.flags() & QtCore.Qt.ItemFlag.ItemIsEnabled:
+            return
+
+        self.profile_selected.emit(item.data(QtCore.Qt.ItemDataRole.UserRole))
+        self.done(1)
+
+    def cancel_operation(self) -> None:
+        """Close the dialog without doing any thing."""
+        self.done(0)
@@ -2,14 +2,16 @@
 
 import json
 import random
+import sqlite3
 from os import environ
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from typing import Any
 from uuid import uuid4
 
 import pytest
 
-from moadaly import database
+from moadaly import common_conversions, database
 
 temp_dir = TemporaryDirectory()
 environ["HOME"] = temp_dir.name
@@ -143,10 +145,48 @@ def test_export_json() -> None:
     ]
 
 
-# def test_import_json() -> None:
-#     """Test the import from json file feature."""  # noqa: ERA001
-#     # Not yet implemented.
-#     ...
+@pytest.mark.dependency(depends=["test_course"])
+def test_import_json() -> None:
+    """Test the import from json file feature."""
+    file_path = Path.home().joinpath("exported_data.json")
+    db = database.Database(Path(temp_dir.name).joinpath("import.sqlite3"))
+
+    def get_data() -> list:
+        """Return the profiles with their courses, since semesters IDs differ."""
+        return [
+            (profile, list(db.get_courses_data(profile.id).values()))
+            for profile in db.get_profiles_data()
+        ]
+
+    db.import_from_json(file_path)
+    imported_data = get_data()
+    assert imported_data == [(profile2, [(course2,)])]
+
+    # Importing again merges the data, without duplicating them.
+    db.import_from_json(file_path)
+    assert get_data() == imported_data
+
+    # The empty semesters too, though they have no courses to match them.
+    db.create_new_semester(uuid4().hex, profile2.id)
+    export_file_path = Path(temp_dir.name).joinpath("import_export.json")
+    db.export_to_json(export_file_path)
+    exported_data = get_data()
+    for _ in range(2):
+        db.import_from_json(export_file_path)
+        assert get_data() == exported_data
+
+    # Replace the profile, after changing it.
+    db.update_course_name(course2.id, "Changed")
+    db.import_from_json(file_path, replace=True)
+    assert get_data() == imported_data
+
+    # Invalid files don't change anything.
+    invalid_file_path = Path(temp_dir.name).joinpath("invalid.json")
+    for invalid_data in ("{}", "[", '[{"profile_data": {}}]'):
+        invalid_file_path.write_text(invalid_data)
+        with pytest.raises(database.InvalidImportFileError):
+            db.import_from_json(invalid_file_path)
+        assert get_data() == imported_data
 
 
 @pytest.mark.dependency(depends=["test_profile"])
@@ -166,3 +206,1111 @@ def test_database_relationship() -> None:
     db.delete_profile(profile2.id)
     assert db.get_profiles_data() == ()
     assert db.get_courses_data(profile2.id) == {}
+
+
+def test_persistent_connection() -> None:
+    """Test keeping one tuned connection open between the operations."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("persistent.sqlite3"),
+        persistent=True,
+        synchronous="off",
+        cache_size=-1000,
+    )
+
+    profile = db.get_current_profile_data()
+    connection = db.get_connection()
+
+    db.create_new_semester(semester1_id, profile.id)
+    db.create_new_course(course1.id, semester1_id)
+    db.update_course_name(course1.id, course1.name)
+
+    # The same connection is used, and it's using the WAL journal.
+    assert db.get_connection() is connection
+    assert connection.execute("PRAGMA journal_mode;").fetchone() == ("wal",)
+    assert connection.execute("PRAGMA synchronous;").fetchone() == (0,)
+    assert connection.execute("PRAGMA cache_size;").fetchone() == (-1000,)
+
+    # Changes are committed, so other connections can see them.
+    assert database.Database(db.database_file).get_courses_data(profile.id) == {
+        semester1_id: (database.CourseData(course1.id, course1.name, None, None),),
+    }
+    assert db.get_profiles_data() == (profile,)
+    assert db.get_current_profile_data() == profile
+
+    db.close()
+    assert not hasattr(db, "connection")
+
+    with pytest.raises(database.NotSupportedSynchronousModeError):
+        database.Database(db.database_file, synchronous="sometimes")
+
+
+def test_courses_data_grouping() -> None:
+    """Test that courses are grouped under their semesters in the right order."""
+    db = database.Database(Path(temp_dir.name).joinpath("grouping.sqlite3"))
+    profile = db.get_current_profile_data()
+
+    semesters_ids = [uuid4().hex for _ in range(3)]
+    courses_ids = [uuid4().hex for _ in range(4)]
+
+    for semester_id in semesters_ids:
+        db.create_new_semester(semester_id, profile.id)
+
+    # The first semester is empty, and courses are added out of order.
+    db.create_new_course(courses_ids[0], semesters_ids[2])
+    db.create_new_course(courses_ids[1], semesters_ids[1])
+    db.create_new_course(courses_ids[2], semesters_ids[2])
+    db.create_new_course(courses_ids[3], semesters_ids[1])
+
+    courses_data = db.get_courses_data(profile.id)
+
+    assert list(courses_data) == semesters_ids
+    assert courses_data[semesters_ids[0]] == ()
+    assert [course.id for course in courses_data[semesters_ids[1]]] == [
+        courses_ids[1],
+        courses_ids[3],
+    ]
+    assert [course.id for course in courses_data[semesters_ids[2]]] == [
+        courses_ids[0],
+        courses_ids[2],
+    ]
+
+    # The lazy variants read the same data, one row at a time.
+    courses = db.iter_courses_data(profile.id)
+    assert next(courses) == courses_data[semesters_ids[1]][0]
+    assert [*courses] == [
+        *courses_data[semesters_ids[1]][1:],
+        *courses_data[semesters_ids[2]],
+    ]
+    assert tuple(db.iter_profiles_data()) == (profile,)
+    assert profile._asdict()["point_scale"] == profile.point_scale
+
+
+def test_migrations() -> None:
+    """Test upgrading a database created before the schema versioning."""
+    database_file = Path(temp_dir.name).joinpath("old.sqlite3")
+
+    # Create the database like the first releases did, without any index.
+    con = sqlite3.connect(database_file)
+    con.executescript(database.MIGRATIONS[0])
+    con.execute(
+        "INSERT INTO profiles VALUES (?, ?, ?, 5, 0);",
+        (profile2.id, profile2.name, profile2.color),
+    )
+    con.execute("INSERT INTO semesters VALUES (?, ?);", (semester1_id, profile2.id))
+    con.execute(
+        "INSERT INTO courses VALUES (?, ?, ?, 91, 3);",
+        (course1.id, semester1_id, course1.name),
+    )
+    con.commit()
+    con.close()
+
+    db = database.Database(database_file)
+
+    # The data are kept and the schema is upgraded.
+    assert db.get_current_profile_data() == profile2
+    assert db.get_profile_totals(profile2.id) == database.TotalsData(4.75 * 3, 3)
+    assert db.get_courses_data(profile2.id) == {
+        semester1_id: (database.CourseData(course1.id, course1.name, 91.0, 3),),
+    }
+    # The existing courses are indexed and added to the catalog.
+    assert course1.name is not None
+    assert db.search_courses(course1.name)[0].course.id == course1.id
+    assert db.search_course_catalog(course1.name) == (
+        database.CatalogCourseData(course1.name, 3),
+    )
+    # The hex IDs are stored as 16 bytes.
+    assert db.get_connection().execute(
+        "SELECT typeof(id), length(id), typeof(parent_semester_id) FROM courses;",
+    ).fetchone() == ("blob", 16, "blob")
+    version = db.get_connection().execute("PRAGMA user_version;").fetchone()[0]
+    assert version == len(database.MIGRATIONS)
+
+    # Opening an up to date database again doesn't change anything.
+    assert database.Database(database_file).get_profiles_data() == (profile2,)
+
+    # Refuse to open a database from the future.
+    db.get_connection().execute(f"PRAGMA user_version = {version + 1};")
+    db.close()
+    with pytest.raises(database.NotSupportedDatabaseVersionError):
+        database.Database(database_file)
+
+
+def test_queries_use_indexes() -> None:
+    """Test that the hot queries search the indexes instead of scanning tables."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("indexes.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    # Don't read them from the cache.
+    db.clear_cache()
+
+    # Record the executed statements with their bound parameters.
+    statements: list[str] = []
+    db.get_connection().set_trace_callback(statements.append)
+    db.get_current_profile_data()
+    db.get_courses_data(profile.id)
+    db.get_semester_archives(profile.id)
+    db.get_connection().set_trace_callback(None)
+    statements = [
+        statement for statement in statements if statement.startswith("SELECT")
+    ]
+
+    plans = [
+        " ".join(
+            row[3]
+            for row in db.get_connection().execute(f"EXPLAIN QUERY PLAN {statement}")
+        )
+        for statement in statements
+    ]
+
+    assert "USING INDEX profiles_last_selected_time_id_index" in plans[0]
+    assert "USING INDEX semesters_parent_profile_id_position_index" in plans[1]
+    assert "USING INDEX courses_parent_semester_id_position_index" in plans[1]
+    # The rows are read in the order of the indexes, without sorting them.
+    assert "TEMP B-TREE" not in plans[1]
+    assert "USING INDEX semester_archives_parent_profile_id_index" in plans[2]
+    assert "USING COVERING INDEX archived_courses_parent_archive_id_index" in plans[2]
+
+    db.close()
+
+
+def test_queued_course_updates() -> None:
+    """Test merging the queued course updates, and writing them together."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("queue.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    db.create_new_semester(semester1_id, profile.id)
+    db.create_new_course(course1.id, semester1_id)
+    db.create_new_course(course2.id, semester1_id)
+
+    # Type the name letter by letter like the course widget does.
+    assert course1.name is not None
+    for i in range(1, len(course1.name) + 1):
+        db.queue_course_update(course1.id, "name", course1.name[:i])
+    db.queue_course_update(course1.id, "score", 10.0)
+    db.queue_course_update(course1.id, "score", course1.score)
+    db.queue_course_update(course2.id, "credit_units", course2.credit_units)
+
+    # Only the last value of every course column is waiting.
+    assert len(db.pending_course_updates) == 3
+
+    with pytest.raises(database.NotSupportedCourseColumnError):
+        db.queue_course_update(course1.id, "id", uuid4().hex)
+
+    statements: list[str] = []
+    db.get_connection().set_trace_callback(statements.append)
+    db.flush_course_updates()
+    db.get_connection().set_trace_callback(None)
+
+    # Three updates in one transaction, triggers statements are traced too, and
+    # the statements of the full-text index are traced as comments.
+    assert statements[0] == "BEGIN "
+    assert (
+        len({statement for statement in statements[1:-1] if statement[:2] != "--"}) == 3
+    )
+    assert statements[-1] == "COMMIT"
+    assert not db.pending_course_updates
+    assert db.get_courses_data(profile.id) == {
+        semester1_id: (
+            database.CourseData(course1.id, course1.name, course1.score, None),
+            database.CourseData(course2.id, None, None, course2.credit_units),
+        ),
+    }
+
+    # Closing the database doesn't lose the queued updates.
+    db.queue_course_update(course2.id, "name", course2.name)
+    db.close()
+    assert database.Database(db.database_file).get_courses_data(profile.id)[
+        semester1_id
+    ][1] == database.CourseData(
+        course2.id,
+        course2.name,
+        None,
+        course2.credit_units,
+    )
+
+
+def test_streaming_export_json() -> None:
+    """Test that the streamed json is the same as the json module output."""
+    db = database.Database(Path(temp_dir.name).joinpath("export.sqlite3"))
+    profile = db.get_current_profile_data()
+    empty_profile = database.ProfileData(uuid4().hex, "Empty 'ملف'", "#FFFFFF", 5)
+    db.create_new_profile(empty_profile.id, empty_profile.name, empty_profile.color)
+
+    semesters_ids = [uuid4().hex for _ in range(3)]
+    for semester_id in semesters_ids:
+        db.create_new_semester(semester_id, profile.id)
+    for course in (course1, course2):
+        db.create_new_course(course.id, semesters_ids[1])
+        db.update_course_name(course.id, course.name)
+        db.update_course_score(course.id, course.score)
+    archived_course_id = uuid4().hex
+    db.create_new_course(archived_course_id, semesters_ids[2])
+    db.update_course_credit_units(archived_course_id, 3)
+    db.archive_semesters(semesters_ids[2:])
+
+    expected_data: list[dict[str, Any]] = [
+        {
+            "profile_data": profile_data._asdict(),
+            "semesters": [
+                {
+                    "semester_data": None,
+                    "courses": [course._asdict() for course in courses],
+                }
+                for courses in db.get_courses_data(profile_data.id).values()
+            ],
+        }
+        for profile_data in db.get_profiles_data()
+    ]
+    # Only the profile with archives has their key.
+    next(
+        profile_item
+        for profile_item in expected_data
+        if profile_item["profile_data"]["id"] == profile.id
+    )["semester_archives"] = [
+        {**archive_item, "courses": list(archive_item["courses"])}
+        for archive_item in db.iter_semester_archives_items(profile.id)
+    ]
+
+    file_path = Path(temp_dir.name).joinpath("streamed.json")
+
+    db.export_to_json(file_path)
+    assert file_path.read_text(encoding="utf-8") == json.dumps(
+        expected_data,
+        ensure_ascii=False,
+        indent=2,
+    )
+
+    db.export_to_json(file_path, compact=True)
+    assert file_path.read_text(encoding="utf-8") == json.dumps(
+        expected_data,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+    # Empty arrays and objects are written like the json module does.
+    assert "".join(database.iter_json_chunks(iter(()), 2)) == "[]"
+    assert "".join(database.iter_json_chunks({"a": {}}, 2)) == '{\n  "a": {}\n}'
+
+
+def test_bulk_import_json() -> None:
+    """Test importing many courses, with items bigger than the read chunks."""
+    db = database.Database(Path(temp_dir.name).joinpath("bulk.sqlite3"))
+    file_path = Path(temp_dir.name).joinpath("bulk.json")
+
+    data: list[dict[str, Any]] = [
+        {
+            "profile_data": {
+                "id": uuid4().hex,
+                "name": f"Student {i}",
+                "color": "#000000",
+                "point_scale": 4,
+            },
+            "semesters": [
+                {
+                    "semester_data": None,
+                    "courses": [
+                        {
+                            "id": uuid4().hex,
+                            "name": f"Course {j}",
+                            "score": 90.5,
+                            "credit_units": 3,
+                        }
+                        for j in range(500)
+                    ],
+                }
+                for _ in range(4)
+            ],
+        }
+        for i in range(5)
+    ]
+    file_path.write_text(json.dumps(data, indent=2))
+
+    db.import_from_json(file_path)
+
+    assert len(db.get_profiles_data()) == len(data)
+    for profile_item in data:
+        courses_data = db.get_courses_data(profile_item["profile_data"]["id"])
+        assert [
+            [course._asdict() for course in courses]
+            for courses in courses_data.values()
+        ] == [semester_item["courses"] for semester_item in profile_item["semesters"]]
+
+
+def test_transactions() -> None:
+    """Test grouping changes in transactions, and the bulk courses methods."""
+    db = database.Database(Path(temp_dir.name).joinpath("transactions.sqlite3"))
+    profile = db.get_current_profile_data()
+    courses_data = tuple(
+        database.CourseData(uuid4().hex, f"Course {i}", 90.0, 3) for i in range(10)
+    )
+
+    # Create a semester with it's courses at once.
+    with db.transaction():
+        db.create_new_semester(semester1_id, profile.id)
+        db.create_new_courses((course.id, semester1_id) for course in courses_data)
+        db.update_courses_data(courses_data)
+
+    assert db.get_courses_data(profile.id) == {semester1_id: courses_data}
+
+    def delete_then_fail(courses_ids: list[str]) -> None:
+        """Delete courses in a transaction, then raise an error before the end."""
+        with db.transaction():
+            db.delete_courses(courses_ids)
+            raise ZeroDivisionError
+
+    # Nothing is changed when an error is raised.
+    with pytest.raises(ZeroDivisionError):
+        delete_then_fail([course.id for course in courses_data])
+    assert db.get_courses_data(profile.id) == {semester1_id: courses_data}
+
+    # A nested transaction can be rolled back alone.
+    with db.transaction():
+        db.delete_courses(course.id for course in courses_data[:2])
+
+        with pytest.raises(ZeroDivisionError):
+            delete_then_fail([course.id for course in courses_data[2:]])
+
+    assert db.get_courses_data(profile.id) == {semester1_id: courses_data[2:]}
+    assert not db.get_connection().in_transaction
+
+
+def test_totals() -> None:
+    """Test that the semesters and profiles totals follow the courses changes."""
+    db = database.Database(Path(temp_dir.name).joinpath("totals.sqlite3"))
+    profile = db.get_current_profile_data()
+    semesters_ids = [uuid4().hex, uuid4().hex]
+    courses_data = [
+        database.CourseData(
+            uuid4().hex,
+            f"Course {i}",
+            random.choice((None, 101.0, 99.5, *range(0, 100, 3))),
+            random.choice((None, *range(5))),
+        )
+        for i in range(30)
+    ]
+
+    def expected_totals(point_scale: int, *semesters: str) -> database.TotalsData:
+        """Calculate the totals like the grades panel does."""
+        courses = [
+            course
+            for semester_id, semester_courses in db.get_courses_data(
+                profile.id,
+            ).items()
+            if semester_id in semesters
+            for course in semester_courses
+        ]
+        return database.TotalsData(
+            sum(
+                common_conversions.score_to_gpa(point_scale, course.score or 0)
+                * (course.credit_units or 0)
+                for course in courses
+            ),
+            sum(course.credit_units or 0 for course in courses),
+        )
+
+    def check_totals() -> None:
+        """Compare the totals from the database with the calculated ones."""
+        for point_scale in (5, 4):
+            for semester_id in semesters_ids:
+                assert db.get_semester_totals(
+                    semester_id,
+                    point_scale,
+                ) == expected_totals(point_scale, semester_id)
+
+            db.change_point_scale(profile.id, point_scale)
+            assert db.get_profile_totals(profile.id) == expected_totals(
+                point_scale,
+                *semesters_ids,
+            )
+
+            # The summary has the same totals, without reading the courses.
+            summary = db.get_profile_summary(profile.id)
+            assert summary is not None
+            assert summary.point_scale == point_scale
+            assert (summary.points, summary.credit_units) == db.get_profile_totals(
+                profile.id,
+            )
+            assert [
+                (semester.id, semester.points, semester.credit_units)
+                for semester in summary.semesters
+            ] == [
+                (semester_id, *db.get_semester_totals(semester_id, point_scale))
+                for semester_id in semesters_ids
+            ]
+
+    for semester_id in semesters_ids:
+        db.create_new_semester(semester_id, profile.id)
+    check_totals()
+
+    db.create_new_courses(
+        (course.id, semesters_ids[i % 2]) for i, course in enumerate(courses_data)
+    )
+    db.update_courses_data(courses_data)
+    check_totals()
+
+    db.update_course_score(courses_data[0].id, 97.0)
+    db.update_course_credit_units(courses_data[1].id, 4)
+    db.delete_courses(course.id for course in courses_data[10:20])
+    check_totals()
+
+    cgpa = db.get_profiles_cgpa()[profile.id]
+    totals = db.get_profile_totals(profile.id)
+    assert cgpa == pytest.approx(totals.points / totals.credit_units)
+    assert {
+        summary.id: summary.cgpa for summary in db.get_all_profile_summaries()
+    } == db.get_profiles_cgpa()
+
+    db.delete_semester(semesters_ids[0])
+    semesters_ids.pop(0)
+    check_totals()
+
+    # The points in SQL follow `score_to_gpa()` at the edges of every grade.
+    cur = db.get_connection().cursor()
+    for point_scale in (5, 4):
+        for score in (0, 59.5, *range(60, 101, 5), 100.5, 101):
+            cur.execute(
+                f"""SELECT {database.course_points_sql("course", point_scale)}
+                    FROM (SELECT ? AS score, 1 AS credit_units) AS course""",  # noqa: S608
+                (score,),
+            )
+            assert cur.fetchone()[0] == common_conversions.score_to_gpa(
+                point_scale,
+                score,
+            )
+
+
+def test_cached_reads() -> None:
+    """Test reading the profiles and courses from the cache until they change."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("cache.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    db.create_new_profile(profile2.id, profile2.name, profile2.color)
+    db.create_new_semester(semester1_id, profile.id)
+    db.create_new_course(course1.id, semester1_id)
+    db.get_profiles_data()
+    db.get_courses_data(profile.id)
+
+    # Switching profiles back and forth only checks the data version.
+    statements: list[str] = []
+    db.get_connection().set_trace_callback(statements.append)
+    for profile_id in (profile.id, profile2.id):
+        assert db.get_profiles_data()[0].id != profile_id
+        db.update_profile_selected_time(profile_id)
+        assert db.get_current_profile_data().id == profile_id
+        assert db.get_profiles_data()[0].id == profile_id
+        db.get_courses_data(profile.id)
+    db.get_connection().set_trace_callback(None)
+    assert not [statement for statement in statements if "SELECT" in statement]
+
+    # Our own changes are read again.
+    db.update_course_name(course1.id, course1.name)
+    assert db.get_courses_data(profile.id)[semester1_id][0].name == course1.name
+    db.change_point_scale(profile2.id, 4)
+    assert db.get_current_profile_data().point_scale == 4
+
+    # And the changes committed by another connection too.
+    con = sqlite3.connect(db.database_file)
+    with con:
+        con.execute("UPDATE profiles SET name = ?;", (profile.name,))
+        con.execute("UPDATE courses SET score = ?;", (course1.score,))
+    con.close()
+    assert db.get_current_profile_data().name == profile.name
+    assert db.get_courses_data(profile.id)[semester1_id][0].score == course1.score
+    db.close()
+
+
+def test_backups() -> None:
+    """Test backing up the database while it's used, then restoring a backup."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("backups.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    db.create_new_semester(semester1_id, profile.id)
+    db.create_new_course(course1.id, semester1_id)
+    db.queue_course_update(course1.id, "name", course1.name)
+
+    # Copy one page in every step, with the queued updates.
+    backup_file = db.backup(pages=1, sleep=0)
+    assert database.get_backups(db.database_file) == [backup_file]
+    assert database.Database(backup_file).get_courses_data(profile.id) == {
+        semester1_id: (database.CourseData(course1.id, course1.name, None, None),),
+    }
+
+    # Only the newest backups are kept.
+    newer_backups = [db.backup(keep=2) for _ in range(3)]
+    assert database.get_backups(db.database_file) == newer_backups[:0:-1]
+
+    # Restoring drops the later changes, even for another open connection.
+    other_db = database.Database(db.database_file, persistent=True)
+    other_db.get_courses_data(profile.id)
+    db.delete_semester(semester1_id)
+    db.queue_course_update(course1.id, "score", course1.score)
+    db.restore_backup(newer_backups[-1])
+    assert db.get_courses_data(profile.id) == {
+        semester1_id: (database.CourseData(course1.id, course1.name, None, None),),
+    }
+    assert db.get_profile_totals(profile.id) == database.TotalsData(0.0, 0)
+
+    # The other connection writes to the restored database.
+    other_db.update_course_score(course1.id, 99.0)
+    other_db.close()
+    assert db.get_courses_data(profile.id) == {
+        semester1_id: (database.CourseData(course1.id, course1.name, 99.0, None),),
+    }
+    with pytest.raises(FileNotFoundError):
+        db.restore_backup(db.database_file.with_name("missing.sqlite3"))
+    db.close()
+
+
+def test_export_changes() -> None:
+    """Test exporting only the changes after a version, then applying them."""
+    db = database.Database(Path(temp_dir.name).joinpath("changes.sqlite3"))
+    copy_db = database.Database(Path(temp_dir.name).joinpath("changes_copy.sqlite3"))
+    changes_file = Path(temp_dir.name).joinpath("changes.json")
+
+    profile = db.get_current_profile_data()
+    db.create_new_semester(semester1_id, profile.id)
+    db.create_new_course(course1.id, semester1_id)
+    db.create_new_course(course2.id, semester1_id)
+
+    version = db.export_changes(changes_file)
+    assert copy_db.import_changes(changes_file) == version
+
+    db.update_course_score(course1.id, course1.score)
+    db.delete_course(course2.id)
+    db.create_new_semester(semester2_id, profile.id)
+    # Changing the selected profile isn't exported.
+    db.update_profile_selected_time(profile.id)
+
+    new_version = db.export_changes(changes_file, since=version)
+    changes = json.loads(changes_file.read_text(encoding="utf-8"))
+    assert changes["since"] == version
+    assert changes["version"] == new_version
+    assert changes["deleted"] == {
+        "profiles": [],
+        "semesters": [],
+        "courses": [course2.id],
+        "semester_archives": [],
+        "archived_courses": [],
+    }
+    assert changes["profiles"] == []
+    assert changes["semesters"] == [
+        {"id": semester2_id, "parent_profile_id": profile.id, "position": 2.0},
+    ]
+    assert changes["courses"] == [
+        {
+            "id": course1.id,
+            "parent_semester_id": semester1_id,
+            "name": None,
+            "score": course1.score,
+            "credit_units": None,
+            "position": 1.0,
+        },
+    ]
+
+    assert copy_db.import_changes(changes_file) == new_version
+    assert copy_db.get_courses_data(profile.id) == db.get_courses_data(profile.id)
+    assert copy_db.get_profile_totals(profile.id) == db.get_profile_totals(profile.id)
+
+    # Nothing changed after the last version.
+    assert db.export_changes(changes_file, since=new_version) == new_version
+    assert json.loads(changes_file.read_text(encoding="utf-8"))["courses"] == []
+
+    # The files exported before the archives were logged don't have their keys.
+    db.update_course_name(course1.id, course1.name)
+    db.export_changes(changes_file, since=new_version)
+    changes = json.loads(changes_file.read_text(encoding="utf-8"))
+    for table in ("semester_archives", "archived_courses"):
+        del changes[table], changes["deleted"][table]
+    changes_file.write_text(json.dumps(changes), encoding="utf-8")
+    copy_db.import_changes(changes_file)
+    assert copy_db.get_courses_data(profile.id) == db.get_courses_data(profile.id)
+
+    # The archived semesters are exported as their totals, with their kept courses.
+    db.archive_semesters((semester1_id,))
+    archive_version = db.export_changes(changes_file, since=new_version)
+    copy_db.import_changes(changes_file)
+    assert copy_db.get_courses_data(profile.id) == {semester2_id: ()}
+    assert copy_db.get_semester_archives(profile.id) == (
+        database.SemesterArchiveData(semester1_id, 0.0, 0, 1, restorable=True),
+    )
+    assert copy_db.get_profile_totals(profile.id) == db.get_profile_totals(profile.id)
+
+    # Restoring deletes the archived courses.
+    db.restore_semester_archives((semester1_id,))
+    db.export_changes(changes_file, since=archive_version)
+    assert (
+        len(
+            json.loads(changes_file.read_text(encoding="utf-8"))["deleted"][
+                "archived_courses"
+            ]
+        )
+        == 1
+    )
+    copy_db.import_changes(changes_file)
+    assert copy_db.get_courses_data(profile.id) == db.get_courses_data(profile.id)
+    assert copy_db.get_semester_archives(profile.id) == ()
+
+    changes_file.write_text('{"version": 1}', encoding="utf-8")
+    with pytest.raises(database.InvalidImportFileError):
+        copy_db.import_changes(changes_file)
+
+
+def test_ids_encoding() -> None:
+    """Test converting the hex UUIDs to bytes, and keeping the other IDs."""
+    hex_id = uuid4().hex
+    assert database.encode_id(hex_id) == bytes.fromhex(hex_id)
+    assert database.decode_id(database.encode_id(hex_id)) == hex_id
+    for other_id in (hex_id.upper(), "Semester 1", hex_id[:-2] + "zz", None):
+        assert database.encode_id(other_id) == other_id
+        assert database.decode_id(other_id) == other_id
+
+    db = database.Database(Path(temp_dir.name).joinpath("ids.sqlite3"))
+    profile = db.get_current_profile_data()
+    db.create_new_semester("Semester 1", profile.id)
+    db.create_new_course(course1.id, "Semester 1")
+    assert db.get_courses_data(profile.id) == {
+        "Semester 1": (database.CourseData(course1.id, None, None, None),),
+    }
+    assert (
+        db.get_connection().execute("SELECT typeof(id) FROM profiles;").fetchone()[0]
+        == "blob"
+    )
+
+
+def test_multiple_connections() -> None:
+    """Test waiting for another connection writing, and reading it's changes."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("multiple.sqlite3"),
+        persistent=True,
+        busy_timeout=0,
+    )
+    other_db = database.Database(db.database_file, persistent=True)
+    profile = db.get_current_profile_data()
+    db.create_new_semester(semester1_id, profile.id)
+    db.create_new_course(course1.id, semester1_id)
+    assert db.get_external_changes() is None
+
+    # Our changes aren't external.
+    db.update_course_name(course1.id, course1.name)
+    assert db.get_external_changes() is None
+
+    other_db.update_course_score(course1.id, course1.score)
+    other_db.create_new_semester(semester2_id, profile.id)
+    assert db.get_external_changes() == database.ExternalChanges(
+        frozenset(),
+        frozenset((semester1_id, semester2_id)),
+        frozenset((course1.id,)),
+    )
+    assert db.get_external_changes() is None
+
+    other_db.delete_course(course1.id)
+    other_db.change_point_scale(profile.id, 4)
+    assert db.get_external_changes() == database.ExternalChanges(
+        frozenset((profile.id,)),
+        frozenset(),
+        frozenset((course1.id,)),
+    )
+
+    # A locked database is tried again, until it's unlocked.
+    with other_db.transaction():
+        calls: list[None] = []
+
+        def create_course() -> None:
+            calls.append(None)
+            if len(calls) == 3:
+                other_db.commit()
+            db.create_new_course(course2.id, semester2_id)
+
+        db.call_with_retry(create_course)
+        assert len(calls) == 3
+
+    with other_db.transaction(), pytest.raises(sqlite3.OperationalError):
+        db.call_with_retry(db.create_new_course, course1.id, semester2_id)
+
+    # Other errors are raised at once.
+    calls.clear()
+    with pytest.raises(sqlite3.IntegrityError):
+        db.call_with_retry(create_course)
+    assert len(calls) == 1
+
+    db.close()
+    other_db.close()
+
+
+def test_search_courses() -> None:
+    """Test finding the courses by the words of their names."""
+    db = database.Database(Path(temp_dir.name).joinpath("search.sqlite3"))
+    profile = db.get_current_profile_data()
+    db.create_new_profile(profile2.id, profile2.name, profile2.color)
+    db.create_new_semester(semester1_id, profile.id)
+    db.create_new_semester(semester2_id, profile2.id)
+    db.create_new_course(course1.id, semester1_id)
+    db.create_new_course(course2.id, semester2_id)
+    db.update_course_name(course1.id, "Calculus I Math-111")
+    db.queue_course_update(course2.id, "name", "Math-112")
+
+    assert [
+        (result.course.id, result.semester_id, result.profile_id, result.profile_name)
+        for result in db.search_courses("math")
+    ] == [
+        (course2.id, semester2_id, profile2.id, profile2.name),
+        (course1.id, semester1_id, profile.id, profile.name),
+    ]
+    assert [result.course.name for result in db.search_courses("CALC 11", 1)] == [
+        "Calculus I Math-111",
+    ]
+    assert db.search_courses("Math-112")[0].course.id == course2.id
+    # The query syntax isn't parsed from the text.
+    assert not db.search_courses('"Math OR NEAR(')
+    assert not db.search_courses("-")
+
+    # The index is changed with the courses.
+    db.update_course_name(course1.id, "Physics")
+    assert [result.course.id for result in db.search_courses("math")] == [course2.id]
+    db.delete_semester(semester2_id)
+    assert not db.search_courses("math")
+    assert [result.course.id for result in db.search_courses("phy")] == [course1.id]
+
+
+def test_course_catalog() -> None:
+    """Test keeping the distinct courses names for suggesting them."""
+    db = database.Database(Path(temp_dir.name).joinpath("catalog.sqlite3"))
+    profile = db.get_current_profile_data()
+    db.create_new_semester(semester1_id, profile.id)
+    courses_ids = [uuid4().hex for _ in range(4)]
+    for course_id in courses_ids:
+        db.create_new_course(course_id, semester1_id)
+
+    db.update_course_name(courses_ids[0], "Math-111")
+    db.update_course_credit_units(courses_ids[0], 3)
+    # The same name with another case isn't added again.
+    db.update_course_name(courses_ids[1], "MATH-111")
+    # The name typed letter by letter is only kept with it's last value.
+    for i in range(1, len("Mathematics") + 1):
+        db.update_course_name(courses_ids[2], "Mathematics"[:i])
+    db.update_course_name(courses_ids[3], "Physics")
+
+    assert db.search_course_catalog("ma") == (
+        database.CatalogCourseData("Math-111", 3),
+        database.CatalogCourseData("Mathematics", None),
+    )
+    assert db.search_course_catalog("MATH", 1) == (
+        database.CatalogCourseData("Math-111", 3),
+    )
+    assert not db.search_course_catalog("")
+    assert not db.search_course_catalog("x")
+
+    # A name is dropped when no course has it.
+    db.delete_course(courses_ids[0])
+    assert db.search_course_catalog("math-") == (
+        database.CatalogCourseData("Math-111", 3),
+    )
+    db.delete_semester(semester1_id)
+    assert not db.search_course_catalog("m")
+    assert not db.search_course_catalog("p")
+
+
+def test_profiles_pages() -> None:
+    """Test reading the profiles in pages, after the last profile of a page."""
+    db = database.Database(Path(temp_dir.name).joinpath("profiles_pages.sqlite3"))
+    db.get_current_profile_data()
+    for i in range(6):
+        db.create_new_profile(uuid4().hex, f"Student {i}", "#000000")
+    db.create_new_profile(uuid4().hex, "Student_%", "#000000")
+    db.create_new_profile(uuid4().hex, "Student_x", "#000000")
+    db.update_profile_selected_time(db.get_profiles_data()[-1].id)
+
+    # The pages together are the profiles, in the same order.
+    pages = [db.get_profiles_page(limit=3)]
+    while pages[-1].next_page:
+        pages.append(db.get_profiles_page(after=pages[-1].next_page, limit=3))
+    assert [len(page.profiles) for page in pages] == [3, 3, 3]
+    assert {page.total_count for page in pages} == {9}
+    assert [profile.id for page in pages for profile in page.profiles] == [
+        profile.id for profile in db.get_profiles_data()
+    ]
+
+    # The LIKE wildcards in the name prefix aren't wildcards.
+    page = db.get_profiles_page(name_prefix="student_", limit=1)
+    assert page.total_count == 2
+    assert page.next_page
+    next_page = db.get_profiles_page(
+        name_prefix="student_",
+        after=page.next_page,
+        limit=1,
+    )
+    assert next_page.next_page is None
+    assert {profile.name for profile in (*page.profiles, *next_page.profiles)} == {
+        "Student_%",
+        "Student_x",
+    }
+    assert db.get_profiles_page(name_prefix="Student_%").total_count == 1
+    assert not db.get_profiles_page(name_prefix="%").profiles
+
+
+def test_clone_profile() -> None:
+    """Test copying a profile with it's semesters and courses, with new IDs."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("clone.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    db.change_point_scale(profile.id, 4)
+    semesters_ids = [uuid4().hex for _ in range(5)]
+    courses = [
+        (uuid4().hex, semester_id) for semester_id in semesters_ids for _ in range(20)
+    ]
+    for semester_id in semesters_ids:
+        db.create_new_semester(semester_id, profile.id)
+    db.create_new_courses(courses)
+    db.update_courses_data(
+        database.CourseData(course_id, f"Course {i}", 50.0 + i % 50, 1 + i % 4)
+        for i, (course_id, _) in enumerate(courses)
+    )
+    # The queued changes are copied too.
+    db.update_course_name(courses[0][0], "Physics")
+
+    clone_id = db.clone_profile(profile.id, "Clone")
+    assert db.get_current_profile_data() == database.ProfileData(
+        clone_id,
+        "Clone",
+        profile.color,
+        4,
+    )
+
+    # The same semesters and courses in the same order, with new IDs.
+    courses_data = db.get_courses_data(profile.id)
+    clone_courses_data = db.get_courses_data(clone_id)
+    assert [
+        [course[1:] for course in semester_courses]
+        for semester_courses in clone_courses_data.values()
+    ] == [
+        [course[1:] for course in semester_courses]
+        for semester_courses in courses_data.values()
+    ]
+    assert not set(clone_courses_data) & set(courses_data)
+    assert not {
+        course.id
+        for semester_courses in clone_courses_data.values()
+        for course in semester_courses
+    } & {course_id for course_id, _ in courses}
+
+    # The totals, the search index and the catalog are updated by their triggers.
+    assert db.get_profile_totals(clone_id) == db.get_profile_totals(profile.id)
+    assert {result.profile_id for result in db.search_courses("physics")} == {
+        profile.id,
+        clone_id,
+    }
+
+    # The archived semesters are copied with their kept courses.
+    db.archive_semesters(semesters_ids[:1])
+    db.archive_semesters(semesters_ids[1:2], keep_courses=False)
+    archives_clone_id = db.clone_profile(profile.id, "Archives Clone")
+    assert db.get_profile_totals(archives_clone_id) == db.get_profile_totals(
+        profile.id,
+    )
+    clone_archives = db.get_semester_archives(archives_clone_id)
+    assert [archive[1:] for archive in clone_archives] == [
+        archive[1:] for archive in db.get_semester_archives(profile.id)
+    ]
+    assert not {archive.id for archive in clone_archives} & set(semesters_ids)
+    db.restore_semester_archives([archive.id for archive in clone_archives])
+    assert [
+        course[1:]
+        for course in db.get_courses_data(archives_clone_id)[clone_archives[0].id]
+    ] == [course[1:] for course in courses_data[semesters_ids[0]]]
+    assert clone_archives[1].id not in db.get_courses_data(archives_clone_id)
+    db.delete_profile(profile.id)
+    assert db.search_course_catalog("phy") == (
+        database.CatalogCourseData("Physics", 1),
+    )
+
+
+def test_archive_semesters() -> None:
+    """Test replacing semesters with their totals, then restoring them."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("archives.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    semesters_ids = [uuid4().hex for _ in range(3)]
+    courses = [(uuid4().hex, semester_id) for semester_id in semesters_ids]
+    for semester_id in semesters_ids:
+        db.create_new_semester(semester_id, profile.id)
+    db.create_new_courses(courses)
+    db.update_courses_data(
+        database.CourseData(course_id, f"Course {i}", 80.0 + i, 3)
+        for i, (course_id, _) in enumerate(courses)
+    )
+    totals = db.get_profile_totals(profile.id)
+
+    db.archive_semesters(semesters_ids[:1])
+    db.archive_semesters(semesters_ids[1:2], keep_courses=False)
+    # Only the active semesters are loaded, and the CGPA doesn't change.
+    assert list(db.get_courses_data(profile.id)) == semesters_ids[2:]
+    assert db.get_profile_totals(profile.id) == totals
+    # The summary totals include the archives, but not it's semesters.
+    summary = db.get_profile_summary(profile.id)
+    assert summary is not None
+    assert (summary.points, summary.credit_units) == totals
+    assert [semester.id for semester in summary.semesters] == semesters_ids[2:]
+    assert db.get_semester_archives(profile.id) == (
+        database.SemesterArchiveData(semesters_ids[0], 12.0, 3, 1, restorable=True),
+        database.SemesterArchiveData(semesters_ids[1], 12.0, 3, 1, restorable=False),
+    )
+    assert [result.course.id for result in db.search_courses("course")] == [
+        courses[2][0],
+    ]
+
+    # The archives are exported with their kept courses.
+    export_file = Path(temp_dir.name).joinpath("archives.json")
+    db.export_to_json(export_file)
+    copy_db = database.Database(Path(temp_dir.name).joinpath("archives_copy.sqlite3"))
+    copy_db.import_from_json(export_file)
+    assert copy_db.get_semester_archives(profile.id) == db.get_semester_archives(
+        profile.id,
+    )
+    assert copy_db.get_profile_totals(profile.id) == totals
+
+    # The archived points follow the point scale.
+    db.change_point_scale(profile.id, 4)
+    assert db.get_semester_archives(profile.id)[0].points == 9.0
+
+    # Only the archives with their courses are restored.
+    db.restore_semester_archives(semesters_ids[:2])
+    assert db.get_courses_data(profile.id) == {
+        semesters_ids[2]: (database.CourseData(courses[2][0], "Course 2", 82.0, 3),),
+        semesters_ids[0]: (database.CourseData(courses[0][0], "Course 0", 80.0, 3),),
+    }
+    assert [archive.id for archive in db.get_semester_archives(profile.id)] == [
+        semesters_ids[1],
+    ]
+    db.change_point_scale(profile.id, 5)
+    assert db.get_profile_totals(profile.id) == totals
+
+
+def test_positions() -> None:
+    """Test moving the semesters and courses by changing only their positions."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("positions.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    semesters_ids = [uuid4().hex for _ in range(3)]
+    for semester_id in semesters_ids:
+        db.create_new_semester(semester_id, profile.id)
+    courses_ids = [uuid4().hex for _ in range(4)]
+    db.create_new_courses((course_id, semesters_ids[0]) for course_id in courses_ids)
+
+    def get_order() -> dict[str, list[str]]:
+        return {
+            semester_id: [course.id for course in courses]
+            for semester_id, courses in db.get_courses_data(profile.id).items()
+        }
+
+    # Only the moved rows are changed.
+    (version,) = db.get_connection().execute("SELECT MAX(version) FROM change_log;")
+    db.move_semester(semesters_ids[2], semesters_ids[0])
+    db.move_course(courses_ids[3], semesters_ids[0], courses_ids[1])
+    assert [
+        database.decode_id(row_id)
+        for (row_id,) in db.get_connection().execute(
+            "SELECT row_id FROM change_log WHERE version > ? ORDER BY version;",
+            version,
+        )
+    ] == [semesters_ids[2], courses_ids[3]]
+    db.move_semester(semesters_ids[0])
+    assert get_order() == {
+        semesters_ids[2]: [],
+        semesters_ids[1]: [],
+        semesters_ids[0]: [courses_ids[0], courses_ids[3], *courses_ids[1:3]],
+    }
+
+    # Moving a course to another semester moves it's totals.
+    db.update_course_credit_units(courses_ids[0], 3)
+    db.move_course(courses_ids[0], semesters_ids[1])
+    assert db.get_semester_totals(semesters_ids[1], 5).credit_units == 3
+    assert db.get_semester_totals(semesters_ids[0], 5).credit_units == 0
+
+    # The siblings are numbered again when the numbers between two are used up.
+    for _ in range(60):
+        db.move_course(courses_ids[2], semesters_ids[0], courses_ids[1])
+        db.move_course(courses_ids[1], semesters_ids[0], courses_ids[2])
+    assert get_order()[semesters_ids[0]] == [courses_ids[3], *courses_ids[1:3]]
+
+
+def fill_profile(db: database.Database, profile_id: str, count: int) -> None:
+    """Add a semester with named courses to a profile."""
+    semester_id = uuid4().hex
+    courses = [(uuid4().hex, semester_id) for _ in range(count)]
+    db.create_new_semester(semester_id, profile_id)
+    db.create_new_courses(courses)
+    db.update_courses_data(
+        database.CourseData(course_id, f"Course {i} {'x' * 200}", 90.0, 3)
+        for i, (course_id, _) in enumerate(courses)
+    )
+
+
+def test_maintenance(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test updating the statistics and releasing the empty pages when needed."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("maintenance.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    maintenance_data = db.get_maintenance_data()
+    assert maintenance_data.auto_vacuum == 2
+    assert not maintenance_data.analyzed
+
+    # Nothing to do yet.
+    db.create_new_semester(uuid4().hex, profile.id)
+    assert db.run_maintenance() == 0
+    assert not db.get_maintenance_data().analyzed
+
+    db.create_new_profile(profile2.id, profile2.name, profile2.color)
+    fill_profile(db, profile2.id, 1000)
+    assert db.run_maintenance() == 0
+    assert db.get_maintenance_data().analyzed
+
+    db.delete_profile(profile2.id)
+    freelist_count = db.get_maintenance_data().freelist_count
+    assert freelist_count >= db.vacuum_min_free_pages
+    # Out of time before the first step.
+    assert db.run_maintenance(time_budget=0) == 0
+    assert db.run_maintenance(time_budget=10) == freelist_count
+    assert db.get_maintenance_data().freelist_count == 0
+    db.close()
+
+    # The files created before the incremental auto vacuum are rebuilt once.
+    old_file = Path(temp_dir.name).joinpath("maintenance_old.sqlite3")
+    with sqlite3.connect(old_file) as con:
+        con.execute("CREATE TABLE old_file (id);")
+    db = database.Database(old_file, persistent=True)
+    profile = db.get_current_profile_data()
+    assert db.get_maintenance_data().auto_vacuum == 0
+    fill_profile(db, profile.id, 10)
+    db.create_new_profile(profile2.id, profile2.name, profile2.color)
+    fill_profile(db, profile2.id, 500)
+    db.delete_profile(profile2.id)
+
+    # Only when they fit the time budget, or when they are compacted.
+    monkeypatch.setattr(db, "rebuild_pages_per_second", 0)
+    assert db.run_maintenance(time_budget=10) == 0
+    assert db.get_maintenance_data().auto_vacuum == 0
+    monkeypatch.undo()
+    assert db.run_maintenance(time_budget=10) > 0
+    assert db.compact_database() == 0
+    maintenance_data = db.get_maintenance_data()
+    assert maintenance_data.auto_vacuum == 2
+    assert maintenance_data.freelist_count == 0
+    # The full-text index still finds the courses after rebuilding the file.
+    assert len(db.search_courses("course", 20)) == 10
+    db.close()
@@ -0,0 +1,106 @@
+"""Testing the database service."""
+
+import sqlite3
+import threading
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+import pytest
+
+from moadaly import database, database_service, sharded_database
+
+temp_dir = TemporaryDirectory()
+
+
+def test_database_service() -> None:
+    """Test running database operations in order in the service thread."""
+    errors: list[BaseException] = []
+    service = database_service.DatabaseService(
+        Path(temp_dir.name).joinpath("service.sqlite3"),
+        persistent=True,
+        on_error=errors.append,
+    )
+
+    profile = service.submit(database.Database.get_current_profile_data).result()
+    semester_id = uuid4().hex
+    course_id = uuid4().hex
+
+    # Writes are fired without waiting, and run in the same order.
+    service.submit(database.Database.create_new_semester, semester_id, profile.id)
+    service.submit(database.Database.create_new_course, course_id, semester_id)
+    for i in range(1, 5):
+        service.submit(
+            database.Database.queue_course_update,
+            course_id,
+            "name",
+            "Math"[:i],
+        )
+
+    assert service.submit(database.Database.get_courses_data, profile.id).result() == {
+        semester_id: (database.CourseData(course_id, "Math", None, None),),
+    }
+
+    # Operations run in the service thread, not in the caller thread.
+    assert (
+        service.submit(lambda _database: threading.current_thread()).result()
+        is service.thread
+    )
+
+    # Errors are kept in the futures and reported.
+    future = service.submit(database.Database.create_new_course, course_id, "")
+    with pytest.raises(sqlite3.IntegrityError):
+        future.result()
+    assert errors == [future.exception()]
+
+    # Backups run in their own thread, after the written operations.
+    backup_file = service.backup().result()
+    assert database.Database(backup_file).get_courses_data(profile.id) == {
+        semester_id: (database.CourseData(course_id, "Math", None, None),),
+    }
+    backup_future = service.backup(Path(temp_dir.name).joinpath("service.sqlite3"))
+    with pytest.raises(FileExistsError):
+        backup_future.result()
+    assert errors[-1] is backup_future.exception()
+
+    # The queued updates are written when closing.
+    service.submit(database.Database.queue_course_update, course_id, "score", 99.0)
+    service.close()
+    assert database.Database(
+        Path(temp_dir.name).joinpath("service.sqlite3"),
+    ).get_courses_data(profile.id) == {
+        semester_id: (database.CourseData(course_id, "Math", 99.0, None),),
+    }
+
+    with pytest.raises(database_service.DatabaseClosedError):
+        service.submit(database.Database.get_profiles_data)
+
+
+def test_database_subclass() -> None:
+    """Test calling the methods of a `Database` subclass for the submitted ones."""
+    service = database_service.DatabaseService(
+        Path(temp_dir.name).joinpath("catalog.sqlite3"),
+        persistent=True,
+        database_class=sharded_database.ShardedDatabase,
+    )
+    profile = service.submit(database.Database.get_current_profile_data).result()
+    profile_file = service.submit(
+        sharded_database.ShardedDatabase.get_profile_file,
+        profile.id,
+    ).result()
+    assert profile_file.exists()
+
+    # The backups have the profiles files too.
+    backup_file = service.backup().result()
+    assert (
+        sharded_database.get_profiles_backup_dir(backup_file)
+        .joinpath(
+            profile_file.name,
+        )
+        .exists()
+    )
+
+    # The profile file is only deleted by `ShardedDatabase.delete_profile`.
+    service.submit(database.Database.delete_profile, profile.id).result()
+    assert not profile_file.exists()
+    service.close()
@@ -0,0 +1,115 @@
+"""Testing recording the database calls and statements."""
+
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+import pytest
+
+from moadaly import database, database_stats
+
+temp_dir = TemporaryDirectory()
+
+
+def test_normalize_sql() -> None:
+    """Test replacing the values in the traced statements."""
+    assert (
+        database_stats.normalize_sql(
+            "SELECT * FROM courses\n    WHERE id = X'0A1b' AND score > 50.5"
+            " AND name = 'It''s' LIMIT 10;",
+        )
+        == "SELECT * FROM courses WHERE id = ? AND score > ? AND name = ? LIMIT ?;"
+    )
+
+
+def test_instrumented_database() -> None:
+    """Test recording the calls, statements and returned rows of every method."""
+    db = database.Database(
+        Path(temp_dir.name).joinpath("instrumented.sqlite3"),
+        instrumented=True,
+    )
+    profile = db.get_current_profile_data()
+    semester_id = uuid4().hex
+    db.create_new_semester(semester_id, profile.id)
+    for _ in range(3):
+        db.create_new_course(uuid4().hex, semester_id)
+    db.get_courses_data(profile.id)
+
+    stats = db.stats
+    assert stats is not None
+    methods = stats.methods
+    assert methods["create_new_course"].calls == 3
+    assert sum(methods["create_new_course"].histogram) == 3
+    assert methods["get_current_profile_data"].rows == 1
+    assert methods["get_courses_data"].rows == 1
+
+    # The statements are grouped without their values, by the method executed them.
+    statements = {
+        statement: statement_stats
+        for (method, statement), statement_stats in stats.statements.items()
+        if method == "create_new_course"
+    }
+    insert_statement = next(
+        statement for statement in statements if statement.startswith("INSERT")
+    )
+    assert "?" in insert_statement
+    assert statements[insert_statement].calls == 3
+    # The rows of every statement are the rows it changed or fetched.
+    assert statements[insert_statement].rows == 3
+    assert {
+        statement_stats.rows
+        for (method, statement), statement_stats in stats.statements.items()
+        if method == "iter_semesters_courses" and statement.startswith("SELECT")
+    } == {3}
+
+    # The iterators are timed while they are consumed, and their rows are the items.
+    courses = db.iter_courses_data(profile.id)
+    assert "iter_courses_data" not in stats.methods
+    assert len(list(courses)) == 3
+    assert stats.methods["iter_courses_data"].calls == 1
+    assert stats.methods["iter_courses_data"].rows == 3
+    assert [
+        statement_stats.rows
+        for (method, _), statement_stats in stats.statements.items()
+        if method == "iter_courses_data"
+    ] == [3]
+    assert stats.get_slowest_statements(1)[0][2].total_time >= max(
+        statement_stats.total_time for statement_stats in statements.values()
+    )
+
+    dump_file = Path(temp_dir.name).joinpath("stats.json")
+    stats.dump(dump_file)
+    assert (
+        json.loads(dump_file.read_text(encoding="utf-8"))["methods"][
+            "create_new_course"
+        ]["calls"]
+        == 3
+    )
+
+    # Not instrumented by default.
+    assert (
+        database.Database(
+            Path(temp_dir.name).joinpath("instrumented.sqlite3"),
+        ).stats
+        is None
+    )
+
+
+def test_environment_stats(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test sharing the stats of every database when the variable is set."""
+    monkeypatch.setattr(database_stats, "environment_stats", None)
+    monkeypatch.setattr(database_stats.atexit, "register", lambda *_args: None)
+    monkeypatch.setenv(
+        database_stats.STATS_FILE_VARIABLE,
+        str(Path(temp_dir.name).joinpath("environment_stats.json")),
+    )
+
+    db1 = database.Database(Path(temp_dir.name).joinpath("environment1.sqlite3"))
+    db2 = database.Database(Path(temp_dir.name).joinpath("environment2.sqlite3"))
+    assert db1.stats is db2.stats is database_stats.environment_stats
+    assert db1.stats is not None
+
+    db1.get_profiles_data()
+    db2.get_profiles_data()
+    assert db1.stats.methods["get_profiles_data"].calls == 2
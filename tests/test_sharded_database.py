@@ -0,0 +1,255 @@
+"""Testing keeping every profile in it's own database file."""
+
+import json
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+import pytest
+
+from moadaly import database, sharded_database
+
+temp_dir = TemporaryDirectory()
+
+
+def test_sharded_database() -> None:
+    """Test saving the profiles data in their files, and attaching only one."""
+    db = sharded_database.ShardedDatabase(
+        Path(temp_dir.name).joinpath("catalog.sqlite3"),
+        persistent=True,
+    )
+    profile = db.get_current_profile_data()
+    profile2 = database.ProfileData(uuid4().hex, "Second", "#FFFFFF", 5)
+    db.create_new_profile(profile2.id, profile2.name, profile2.color)
+    semester1_id, semester2_id = uuid4().hex, uuid4().hex
+    course_id = uuid4().hex
+
+    db.create_new_semester(semester1_id, profile.id)
+    db.create_new_course(course_id, semester1_id)
+    db.update_course_score(course_id, 96.0)
+    db.update_course_credit_units(course_id, 3)
+    db.update_course_name(course_id, "Math-111")
+    db.create_new_semester(semester2_id, profile2.id)
+
+    # Only the selected profile file is attached.
+    assert db.profile_id == profile2.id
+    assert [row[1] for row in db.get_connection().execute("PRAGMA database_list;")] == [
+        "main",
+        "profile",
+    ]
+    assert sorted(path.name for path in db.profiles_dir.glob("*.sqlite3")) == sorted(
+        f"{profile_id}.sqlite3" for profile_id in (profile.id, profile2.id)
+    )
+
+    # The catalog has the totals of every profile, without opening their files.
+    assert db.get_profiles_cgpa() == {profile.id: 5.0, profile2.id: 0.0}
+    assert db.get_profile_totals(profile.id) == database.TotalsData(15.0, 3)
+    assert [
+        (summary.id, summary.semesters) for summary in db.get_all_profile_summaries()
+    ] == [
+        (profile2.id, (database.SemesterSummary(semester2_id, 0.0, 0, 0.0),)),
+        (profile.id, (database.SemesterSummary(semester1_id, 15.0, 3, 5.0),)),
+    ]
+    assert db.profile_id == profile2.id
+    assert db.get_courses_data(profile.id) == {
+        semester1_id: (database.CourseData(course_id, "Math-111", 96.0, 3),),
+    }
+    assert db.get_courses_data(profile2.id) == {semester2_id: ()}
+
+    # Searching reads the index of every file.
+    assert [
+        (result.course.id, result.profile_id) for result in db.search_courses("math")
+    ] == [(course_id, profile.id)]
+    assert db.profile_id == profile2.id
+
+    # Exporting reads every file, then the selected profile is attached again.
+    export_file = Path(temp_dir.name).joinpath("export.json")
+    db.export_to_json(export_file)
+    assert db.profile_id == profile2.id
+    assert [
+        len(item["semesters"])
+        for item in json.loads(export_file.read_text(encoding="utf-8"))
+    ] == [1, 1]
+
+    db.delete_profile(profile.id)
+    db.import_from_json(export_file, replace=True)
+    assert db.get_profiles_cgpa() == {profile.id: 5.0, profile2.id: 0.0}
+    assert [course.id for course in db.iter_courses_data(profile.id)] == [course_id]
+
+    # Cloning copies the rows of the profile file to a new file, with new IDs.
+    clone_id = db.clone_profile(profile.id, "Clone")
+    assert db.profile_id == clone_id
+    assert db.get_current_profile_data().name == "Clone"
+    assert db.get_profiles_cgpa()[clone_id] == 5.0
+    (clone_course,) = db.iter_courses_data(clone_id)
+    assert clone_course.id != course_id
+    assert clone_course[1:] == ("Math-111", 96.0, 3)
+    assert [course.id for course in db.iter_courses_data(profile.id)] == [course_id]
+    db.delete_profile(clone_id)
+
+    # The archives are in the profile file, and their totals are in the catalog.
+    # The semesters IDs aren't exported, they are new after the import.
+    (semester_id,) = db.get_courses_data(profile.id)
+    db.archive_semesters((semester_id,))
+    assert db.get_courses_data(profile.id) == {}
+    assert db.get_profiles_cgpa()[profile.id] == 5.0
+    assert db.get_semester_archives(profile.id) == (
+        database.SemesterArchiveData(semester_id, 15.0, 3, 1, restorable=True),
+    )
+    clone_id = db.clone_profile(profile.id, "Clone")
+    assert db.get_profiles_cgpa()[clone_id] == 5.0
+    assert [archive[1:] for archive in db.get_semester_archives(clone_id)] == [
+        (15.0, 3, 1, True),
+    ]
+    db.delete_profile(clone_id)
+    # The changes by IDs are applied to the selected profile.
+    db.select_profile(profile.id)
+    db.export_to_json(export_file)
+    db.import_from_json(export_file, replace=True)
+    assert db.get_profiles_cgpa()[profile.id] == 5.0
+    db.restore_semester_archives((semester_id,))
+    assert [course.id for course in db.iter_courses_data(profile.id)] == [course_id]
+
+    # The file is deleted with it's profile.
+    db.delete_profile(profile2.id)
+    assert not db.get_profile_file(profile2.id).exists()
+    db.close()
+
+    # A new connection only opens the current profile file.
+    db = sharded_database.ShardedDatabase(
+        Path(temp_dir.name).joinpath("catalog.sqlite3"),
+    )
+    assert db.get_current_profile_data().id == profile.id
+    assert db.profile_id == profile.id
+
+    # The catalog and the profile file are tidied.
+    assert db.get_maintenance_schemas() == ("main", "profile")
+    assert db.get_maintenance_data("profile").auto_vacuum == 2
+    db.run_maintenance()
+
+    with pytest.raises(sharded_database.InvalidProfileIDError):
+        db.get_profile_file("../catalog")
+
+
+def test_sharded_cached_reads() -> None:
+    """Test keeping the cached profiles while switching the attached files."""
+    catalog_file = Path(temp_dir.name).joinpath("cache", "catalog.sqlite3")
+    catalog_file.parent.mkdir()
+    db = sharded_database.ShardedDatabase(catalog_file, persistent=True)
+    profile = db.get_current_profile_data()
+    profile2 = database.ProfileData(uuid4().hex, "Second", "#FFFFFF", 5)
+    db.create_new_profile(profile2.id, profile2.name, profile2.color)
+    semester_id = uuid4().hex
+    db.create_new_semester(semester_id, profile.id)
+    db.get_profiles_data()
+
+    # The courses are read again from every attached file, but not the profiles.
+    statements: list[str] = []
+    db.get_connection().set_trace_callback(statements.append)
+    for profile_id in (profile2.id, profile.id):
+        db.get_courses_data(profile_id)
+        assert len(db.get_profiles_data()) == 2
+    db.get_connection().set_trace_callback(None)
+    assert not [
+        statement
+        for statement in statements
+        if "SELECT" in statement and "FROM profiles" in statement
+    ]
+    assert db.get_courses_data(profile.id) == {semester_id: ()}
+
+    # The changes committed to the catalog by another connection are read.
+    con = sqlite3.connect(catalog_file)
+    with con:
+        con.execute("UPDATE profiles SET name = 'Renamed';")
+    con.close()
+    assert {data.name for data in db.get_profiles_data()} == {"Renamed"}
+    db.close()
+
+
+def test_sharded_clone_profile(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test cloning a profile that isn't selected, and cleaning a failed clone."""
+    catalog_file = Path(temp_dir.name).joinpath("clone", "catalog.sqlite3")
+    catalog_file.parent.mkdir()
+    db = sharded_database.ShardedDatabase(catalog_file)
+    profile = db.get_current_profile_data()
+    profile2 = database.ProfileData(uuid4().hex, "Second", "#FFFFFF", 5)
+    db.create_new_profile(profile2.id, profile2.name, profile2.color)
+    db.select_profile(profile.id)
+    # Another profile can't be selected in the middle of a transaction.
+    semester_id = uuid4().hex
+    with db.transaction():
+        db.create_new_semester(semester_id, profile.id)
+        with pytest.raises(sharded_database.ProfileSelectedInTransactionError):
+            db.select_profile(profile2.id)
+        assert db.connection.in_transaction
+    assert db.profile_id == profile.id
+    assert db.get_courses_data(profile.id) == {semester_id: ()}
+    # The second profile file isn't created until it's selected.
+    assert not db.get_profile_file(profile2.id).exists()
+
+    clone_id = db.clone_profile(profile2.id, "Clone")
+    assert db.profile_id == clone_id
+    assert db.get_current_profile_data().color == profile2.color
+    assert db.get_courses_data(clone_id) == {}
+
+    # A failed clone doesn't leave it's file, and the profile is selected again.
+    db.select_profile(profile.id)
+    profiles_files = sorted(db.profiles_dir.iterdir())
+
+    def fail_copy(*_args: object, **_kwargs: object) -> None:
+        raise sqlite3.OperationalError
+
+    monkeypatch.setattr(db, "copy_profile_rows", fail_copy)
+    with pytest.raises(sqlite3.OperationalError):
+        db.clone_profile(profile.id, "Failed Clone")
+    assert sorted(db.profiles_dir.iterdir()) == profiles_files
+    assert db.profile_id == profile.id
+    assert [data.name for data in db.get_profiles_data()].count("Failed Clone") == 0
+    db.close()
+
+
+def test_sharded_backups() -> None:
+    """Test backing up the catalog with the profiles files, then restoring them."""
+    catalog_file = Path(temp_dir.name).joinpath("backups", "catalog.sqlite3")
+    catalog_file.parent.mkdir()
+    db = sharded_database.ShardedDatabase(catalog_file, persistent=True)
+    profile = db.get_current_profile_data()
+    semester_id, course_id = uuid4().hex, uuid4().hex
+    db.create_new_semester(semester_id, profile.id)
+    db.create_new_course(course_id, semester_id)
+    db.queue_course_update(course_id, "name", "Math-111")
+
+    backup_file = db.backup(pages=1, sleep=0)
+    profiles_backup_dir = sharded_database.get_profiles_backup_dir(backup_file)
+    assert database.get_backups(catalog_file) == [backup_file]
+    assert [path.name for path in profiles_backup_dir.iterdir()] == [
+        f"{profile.id}.sqlite3",
+    ]
+
+    # Restoring drops the later changes, and the profiles created after it.
+    profile2 = database.ProfileData(uuid4().hex, "Second", "#FFFFFF", 5)
+    db.create_new_profile(profile2.id, profile2.name, profile2.color)
+    db.create_new_semester(uuid4().hex, profile2.id)
+    db.select_profile(profile.id)
+    db.delete_semester(semester_id)
+    other_db = sharded_database.ShardedDatabase(catalog_file, persistent=True)
+    other_db.select_profile(profile.id)
+    assert not other_db.get_courses_data(profile.id)
+    db.restore_backup(backup_file)
+    # The files are restored in place, so the open connections see the backup too.
+    assert other_db.get_courses_data(profile.id) == {
+        semester_id: (database.CourseData(course_id, "Math-111", None, None),),
+    }
+    other_db.close()
+    assert [data.id for data in db.get_profiles_data()] == [profile.id]
+    assert db.get_courses_data(profile.id) == {
+        semester_id: (database.CourseData(course_id, "Math-111", None, None),),
+    }
+    assert not db.get_profile_file(profile2.id).exists()
+
+    # Only the newest backups are kept, with their profiles files.
+    newer_backups = [db.backup(keep=2) for _ in range(2)]
+    assert database.get_backups(catalog_file) == newer_backups[::-1]
+    assert not profiles_backup_dir.exists()
+    db.close()